@@ -1,29 +1,112 @@
 # backend/app/api/routes.py
-from fastapi import APIRouter, HTTPException
-from ..models.schema import QueryRequest
-from ..services.rag_service import rag_answer
+import json
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from ..models.schema import BatchQueryRequest, QueryRequest
+from ..services.rag_service import rag_answer_async, rag_answer_batch, stream_rag_answer
+from ..services.ingest_worker import get_ingest_worker
 from ..utils.config import get_settings
+from ..utils.tracing import TRACE_HEADER, capture, store_trace, trace_options
 
 router = APIRouter()
 settings = get_settings()
 
-@router.post("/ask")
-def ask(req: QueryRequest):
-    if not req.text or not req.text.strip():
-        raise HTTPException(status_code=400, detail="Query text is required.")
-
-    result = rag_answer(req.text)
-
+def _ui_sources(matches):
     # Extract top 3 sources for the UI
     sources = []
-    for m in result["matches"][:3]:
+    for m in matches[:3]:
         md = m.get("metadata", {}) or {}
         sources.append({
             "title": md.get("title") or "Untitled",
             "url": md.get("source") or "#"
         })
+    return sources
 
-    return {
+@router.post("/ask")
+async def ask(req: QueryRequest, debug_trace: str | None = Header(default=None, alias=TRACE_HEADER)):
+    if not req.text or not req.text.strip():
+        raise HTTPException(status_code=400, detail="Query text is required.")
+
+    # Opt-in span tree / profile (DEBUG_TRACE_ENABLED plus the X-Debug-Trace header)
+    opts = trace_options(debug_trace)
+    if opts is None:
+        result = await rag_answer_async(req.text)
+    else:
+        with capture("ask", profile=opts.profile, question_chars=len(req.text)) as trace:
+            result = await rag_answer_async(req.text)
+
+    response = {
         "answer": result["answer"],
-        "sources": sources
+        "sources": _ui_sources(result["matches"])
     }
+    if opts is not None:
+        if opts.store:
+            response["trace_path"] = store_trace(trace)
+        else:
+            response["trace"] = trace.to_dict()
+    return response
+
+@router.post("/ask/batch")
+async def ask_batch(req: BatchQueryRequest):
+    """
+    Answer a list of questions in one request (evaluation sets, FAQ
+    pre-generation). Results are in input order, each with its own
+    `error` and per-stage timings in ms.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="At least one question is required.")
+    if len(req.questions) > settings.ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.ASK_BATCH_MAX_QUESTIONS} questions per batch.")
+
+    results = await rag_answer_batch(req.questions, concurrency=req.concurrency)
+    return {
+        "results": [
+            {
+                "question": r["question"],
+                "answer": r["answer"],
+                "sources": _ui_sources(r["matches"]),
+                "cached": r["cached"],
+                "error": r["error"],
+                "timings": r["timings"],
+            }
+            for r in results
+        ],
+        "errors": sum(1 for r in results if r["error"]),
+    }
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post("/ask/stream")
+async def ask_stream(req: QueryRequest):
+    """
+    Server-Sent Events: `sources` once retrieval is done, `token` per
+    completion delta, then `done` with usage/timings (or `error`).
+    """
+    if not req.text or not req.text.strip():
+        raise HTTPException(status_code=400, detail="Query text is required.")
+
+    async def events():
+        answer = stream_rag_answer(req.text)
+        try:
+            async for event, payload in answer:
+                if event == "matches":
+                    yield _sse("sources", {"sources": _ui_sources(payload["matches"])})
+                else:
+                    yield _sse(event, payload)
+        except Exception as e:
+            print(f"[ask][stream] {type(e).__name__}: {e}")
+            yield _sse("error", {"detail": "Could not answer this question."})
+        finally:
+            await answer.aclose()  # closes the OpenAI stream if we stopped early
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/ingest/status")
+def ingest_status():
+    """Background Drive sync: leader, state, progress of the current run and the last result."""
+    return get_ingest_worker().status()
@@ -1,10 +1,14 @@
+import asyncio
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from .api.routes import router as api_router
 from .utils.config import get_settings
-from .services.auto_ingest import process_new_drive_files
+from .utils.index_profile import check_index_profile, get_index_profile
+from .services.ingest_worker import get_ingest_worker
+from .services.rag_service import aclose_clients
+from .utils import metrics
 
 settings = get_settings()
 
@@ -32,39 +36,33 @@ app.add_middleware(
 app.include_router(api_router, prefix="/api")
 
 # ------------------------------
-# Serve Frontend (Static Files)
-# ------------------------------
-# Serve React/Vue/HTML from root but after API routes
-app.mount("/", StaticFiles(directory="frontend/src/pages", html=True), name="frontend")
-
+# Index profile check + Background Auto-Ingest (leader-elected; never blocks startup)
 # ------------------------------
-# Scheduler for Auto-Ingest
-# ------------------------------
-scheduler = AsyncIOScheduler()
+def _check_index_profile():
+    get_index_profile()  # an invalid profile setting fails startup here
+    try:
+        report = check_index_profile()
+    except Exception as e:  # index unreachable: serve anyway, queries will report it
+        print(f"[startup][warn] Could not check the index profile: {e}")
+        return
+    for warning in report["warnings"]:
+        print(f"[startup][warn] {warning}")
+    for error in report["errors"]:
+        print(f"[startup][error] Index profile mismatch: {error}")
+    if report["errors"] and settings.INDEX_PROFILE_STRICT:
+        raise RuntimeError("Index profile mismatch (set INDEX_PROFILE_STRICT=false to start anyway)")
 
 @app.on_event("startup")
 async def _startup():
-    try:
-        result = process_new_drive_files()
-        print(f"[ingest@startup] {result}")
-    except FileNotFoundError:
-        print("[ingest@startup][warn] Google service account JSON not found. Skipping ingest.")
-    except Exception as e:
-        print(f"[ingest@startup][error] {e}")
-
-    poll_interval = getattr(settings, "INGEST_POLL_INTERVAL_MINUTES", 10)
-    scheduler.add_job(
-        process_new_drive_files,
-        "interval",
-        minutes=poll_interval,
-        id="drive_ingest_job",
-        replace_existing=True
-    )
-    scheduler.start()
+    await asyncio.to_thread(_check_index_profile)  # Pinecone calls; keep them off the event loop
+    if settings.INGEST_WORKER_ENABLED:
+        get_ingest_worker().start()
 
 @app.on_event("shutdown")
 async def _shutdown():
-    scheduler.shutdown(wait=False)
+    if settings.INGEST_WORKER_ENABLED:
+        get_ingest_worker().shutdown()
+    await aclose_clients()
 
 # ------------------------------
 # Health Check Endpoint
@@ -72,3 +70,17 @@ async def _shutdown():
 @app.get("/health")
 def health_check():
     return {"status": "ok", "app": settings.APP_NAME, "docs": "/docs"}
+
+# ------------------------------
+# Prometheus Metrics (per worker process)
+# ------------------------------
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# ------------------------------
+# Serve Frontend (Static Files)
+# ------------------------------
+# Serve React/Vue/HTML from root; mounted last so it doesn't shadow
+# /health, /metrics or the API routes
+app.mount("/", StaticFiles(directory="frontend/src/pages", html=True), name="frontend")
@@ -1,8 +1,18 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, List, Optional
+
+MAX_QUESTION_CHARS = 4000
 
 class QueryRequest(BaseModel):
-    text: str = Field(..., description="User question")
+    text: str = Field(..., max_length=MAX_QUESTION_CHARS, description="User question")
+
+class BatchQueryRequest(BaseModel):
+    questions: List[Annotated[str, Field(max_length=MAX_QUESTION_CHARS)]] = Field(
+        ..., description="Questions to answer, in order"
+    )
+    concurrency: Optional[int] = Field(
+        None, ge=1, le=256, description="Concurrent chat completions (default and upper bound ASK_BATCH_CONCURRENCY)"
+    )
 
 class MatchChunk(BaseModel):
     score: float
@@ -1,99 +1,433 @@
+import argparse
+import hashlib
+import multiprocessing as mp
 import os
-import uuid
-from typing import Dict, List
+import queue
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Set
 
 from openai import OpenAI
-from pinecone import Pinecone
 from pathlib import Path
-from backend.app.utils.universal_preprocess import process_file_to_chunks
-from backend.app.utils.gdrive_service import list_files_in_folder, download_file
-from backend.app.utils.state_store import load_state, save_state
+from backend.app.utils.universal_preprocess import CHUNK_DIR, INTERIM_DIR, output_stem, process_file_timed
+from backend.app.utils.gdrive_service import (
+    list_files_in_folder, get_file, download_file, get_start_page_token, list_changes,
+)
+from backend.app.utils.state_store import (
+    load_state, known_file_ids, unfinished_file_ids, load_file_record, record_file, forget_file, bump_ingest_version,
+    load_manifest, save_manifest, load_drive_token, save_drive_token, clear_drive_token,
+    mark_for_resync, get_meta, set_meta, INGEST_WRITE_LOCK_PATH, FileLock,
+)
+from backend.app.utils.embed_batcher import embed_texts
+from backend.app.utils.embedding_store import get_embedding_store
+from backend.app.utils.chunk_store import get_chunk_store
+from backend.app.utils.config import get_settings
+from backend.app.utils.index_profile import live_profile
+from backend.app.utils.vector_store import chunk_to_vector, get_vector_store, live_pointer
+from backend.app.utils.metrics import INGEST_STAGE_SECONDS, INGEST_FILES, INGEST_CHUNKS
+from backend.app.utils.tracing import capture, span, store_trace
 
 # -------------------------------
 # 1) Settings & Clients
 # -------------------------------
 GOOGLE_DRIVE_FOLDER_ID = os.getenv("GOOGLE_DRIVE_FOLDER_ID")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME")
-OPENAI_EMBED_MODEL = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-large")
+
+settings = get_settings()
 
 RAW_DIR = Path("backend/data/raw")
 RAW_DIR.mkdir(parents=True, exist_ok=True)
 
 _oai = OpenAI(api_key=OPENAI_API_KEY)
-_pc = Pinecone(api_key=PINECONE_API_KEY)
-_index = _pc.Index(PINECONE_INDEX_NAME)
 
 # -------------------------------
 # 2) Embedding Utility
 # -------------------------------
-def embed_batch(texts: List[str]) -> List[List[float]]:
-    """Generate embeddings for a batch of texts."""
-    if not texts:
-        return []
-    resp = _oai.embeddings.create(
-        model=OPENAI_EMBED_MODEL,
-        input=texts
+def embed_batch(texts: List[str], token_counts: Optional[List[int]] = None) -> List[List[float]]:
+    """
+    Generate embeddings for texts, packed into token-budgeted concurrent
+    requests, with the live index's profile. Texts already in the embedding
+    store are not re-sent.
+    """
+    profile = live_profile()
+    return embed_texts(
+        _oai,
+        profile.model,
+        texts,
+        dimensions=profile.request_dimensions,
+        token_counts=token_counts,
+        max_inputs=settings.EMBED_BATCH_MAX_INPUTS,
+        max_tokens=settings.EMBED_BATCH_MAX_TOKENS,
+        concurrency=settings.EMBED_MAX_CONCURRENCY,
+        store=get_embedding_store(),
     )
-    return [d.embedding for d in resp.data]
 
 # -------------------------------
-# 3) Upsert into Pinecone
+# 3) Upsert into the vector store
 # -------------------------------
 def upsert_chunks(chunks: List[Dict], file_id: str):
-    vectors = []
-    for ch in chunks:
-        vectors.append((
-            ch.get("id", str(uuid.uuid4())),
-            embed_batch([ch["text"]])[0],  # embed single chunk text
-            {
-                "title": ch.get("title"),
-                "source": ch.get("source"),
-                "text": ch.get("text"),
-                "file_id": file_id
-            }
-        ))
-    if vectors:
-        _index.upsert(vectors=vectors)
+    if not chunks:
+        return
+    with INGEST_STAGE_SECONDS.time(stage="embed"), span("embed", inputs=len(chunks)):
+        embeddings = embed_batch(
+            [ch["text"] for ch in chunks],
+            token_counts=[ch.get("tokens") for ch in chunks],
+        )
+
+    chunk_store = get_chunk_store()
+    if chunk_store is not None:
+        chunk_store.put_many(chunks, file_id)
+    vectors = [chunk_to_vector(ch, emb, file_id, include_text=chunk_store is None) for ch, emb in zip(chunks, embeddings)]
+    with INGEST_STAGE_SECONDS.time(stage="upsert"), span("upsert", vectors=len(vectors)):
+        get_vector_store().upsert(vectors)
+
+def sync_file_chunks(chunks: List[Dict], file_id: str) -> Dict[str, int]:
+    """
+    Diff a file's fresh chunks against its manifest: embed and upsert only
+    chunk ids that are new, delete ids that disappeared, refresh the
+    chunk_index of unchanged chunks that moved, record the new set.
+    """
+    old_ids = load_manifest(file_id)
+    if old_ids is None:
+        # First manifest for this file: clear vectors from pre-manifest runs.
+        get_vector_store().delete_by_file(file_id)
+        old_ids = []
+
+    known = set(old_ids)
+    new_chunks = [ch for ch in chunks if ch["id"] not in known]
+    stale_ids = known - {ch["id"] for ch in chunks}
+    # Unchanged chunks keep their vectors, but an edit above them shifts
+    # their position; the manifest is in chunk order, so compare against it.
+    old_index = {cid: i for i, cid in enumerate(old_ids)}
+    moved = [ch for i, ch in enumerate(chunks)
+             if ch["id"] in old_index and old_index[ch["id"]] != ch.get("chunk_index", i)]
+
+    upsert_chunks(new_chunks, file_id)
+    chunk_store = get_chunk_store()
+    if moved:
+        with INGEST_STAGE_SECONDS.time(stage="upsert"):
+            get_vector_store().update_metadata({ch["id"]: {"chunk_index": ch["chunk_index"]} for ch in moved})
+        if chunk_store is not None:
+            chunk_store.put_many(moved, file_id)
+    if stale_ids:
+        with INGEST_STAGE_SECONDS.time(stage="upsert"):
+            get_vector_store().delete(stale_ids)
+        if chunk_store is not None:
+            chunk_store.delete(stale_ids)
+    save_manifest(file_id, [ch["id"] for ch in chunks])
+    diff = {"embedded": len(new_chunks), "deleted": len(stale_ids), "unchanged": len(chunks) - len(new_chunks),
+            "moved": len(moved)}
+    for action, n in diff.items():
+        INGEST_CHUNKS.inc(n, action=action)
+    return diff
 
 # -------------------------------
-# 4) Process a single new file
+# 4) Per-file stages
 # -------------------------------
+def _download_stage(file_id: str, name: str, mime: str, size: Optional[str] = None, md5: Optional[str] = None) -> str:
+    # One directory per Drive file: Drive allows duplicate names, and
+    # concurrent downloads of two "report.pdf"s must not share a path.
+    base_name = name.replace("/", "_").strip()
+    local_path = RAW_DIR / file_id / base_name
+    with INGEST_STAGE_SECONDS.time(stage="download"), span("download", name=name) as sp:
+        path = download_file(file_id, name, mime, str(local_path), size=size, md5=md5)
+        sp.set(bytes=os.path.getsize(path))
+        return path
+
+def _content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _parse_stage(path: str, file_id: str, pool: Optional[ProcessPoolExecutor] = None) -> List[Dict]:
+    with span("parse") as sp:
+        if pool is None:
+            chunks, timings = process_file_timed(path, doc_id=file_id)
+        else:
+            chunks, timings = pool.submit(process_file_timed, path, doc_id=file_id).result()
+        sp.set(chunks=len(chunks), tokens=sum(ch.get("tokens") or 0 for ch in chunks),
+               **{f"{stage}_ms": round(seconds * 1000, 3) for stage, seconds in timings.items()})
+    for stage, seconds in timings.items():
+        INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+    return chunks
+
+def _index_stage(chunks: List[Dict], file_id: str, name: str) -> Dict[str, int]:
+    # Embed & upsert changed chunks, drop stale ones
+    with span("index") as sp:
+        diff = sync_file_chunks(chunks, file_id)
+        sp.set(**diff)
+    if chunks:
+        print(f"[OK] {name}: {len(chunks)} chunks ({diff['embedded']} embedded, {diff['deleted']} removed)")
+    else:
+        print(f"[SKIP] {name}: No chunks found ({diff['deleted']} stale removed)")
+    return diff
+
 def process_single_file(file_id: str, name: str, mime: str, mtime: str):
     print(f"[INFO] Processing new file: {name}")
-    base_name = name.replace("/", "_").strip()
-    local_path = RAW_DIR / base_name
 
     # Download file from Google Drive
-    downloaded_path = download_file(file_id, name, mime, str(local_path))
+    downloaded_path = _download_stage(file_id, name, mime)
 
     # Run universal preprocessing → get chunks
-    chunks = process_file_to_chunks(downloaded_path)
+    chunks = _parse_stage(downloaded_path, file_id)
 
-    # Embed & upsert chunks into Pinecone
-    if chunks:
-        upsert_chunks(chunks, file_id)
-        print(f"[OK] {name}: {len(chunks)} chunks upserted to Pinecone")
+    _index_stage(chunks, file_id, name)
+    return chunks
+
+def trace_single_file(file_id: str, name: str, mime: str, profile: bool = True) -> str:
+    """
+    Run `process_single_file` under a trace (and the sampling profiler) and
+    store it under TRACE_DIR; returns the trace path. For pathological documents.
+    """
+    with capture("process_single_file", profile=profile, file_id=file_id, file_name=name) as trace:
+        process_single_file(file_id, name, mime, mtime="")
+    return store_trace(trace)
+
+# -------------------------------
+# 5) Staged pipeline
+# -------------------------------
+_STOP = object()
+
+def run_ingest_pipeline(files: List[Dict], on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+    """
+    Run download → parse/chunk → embed/upsert for many files with the stages
+    overlapping: a thread pool downloads, a process pool parses, and a set of
+    index workers embed and upsert. Stages are joined by bounded queues so a
+    slow stage applies back-pressure instead of buffering whole files.
+
+    Returns one result per file, in completion order:
+    {"file": <drive file dict>, "chunks": int, "error": str | None,
+     "content_hash": str | None, "unchanged": bool, "timings": {stage: seconds}}.
+    A file whose downloaded bytes hash the same as when it was last indexed
+    is not parsed again ("unchanged"). A failure only affects its own file. `on_result` is called with each
+    result as it lands (from a worker thread, one call at a time).
+    """
+    if not files:
+        return []
+
+    n_download = max(1, settings.INGEST_DOWNLOAD_WORKERS)
+    n_parse = max(0, settings.INGEST_PARSE_WORKERS)
+    n_index = max(1, settings.INGEST_INDEX_WORKERS)
+
+    download_q: "queue.Queue" = queue.Queue()
+    parse_q: "queue.Queue" = queue.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    index_q: "queue.Queue" = queue.Queue(maxsize=settings.INGEST_QUEUE_SIZE)
+    results: List[Dict] = []
+    results_lock = threading.Lock()
+
+    def record(f: Dict, info: Dict, chunks: int = 0, error: Optional[str] = None, unchanged: bool = False):
+        if error:
+            print(f"[ERROR] {f['name']}: {error}")
+        result = {"file": f, "chunks": chunks, "error": error, "unchanged": unchanged, **info}
+        with results_lock:
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+
+    def timed(info: Dict, stage: str, fn, *args):
+        t = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            info["timings"][stage] = round(time.perf_counter() - t, 3)
+
+    def downloader():
+        while (f := download_q.get()) is not _STOP:
+            info = {"content_hash": None, "timings": {}}
+            try:
+                print(f"[INFO] Processing new file: {f['name']}")
+                path = timed(info, "download", _download_stage,
+                             f["id"], f["name"], f["mimeType"], f.get("size"), f.get("md5Checksum"))
+                info["content_hash"] = _content_hash(path)
+                prev = load_file_record(f["id"])
+                if prev and prev["status"] in ("indexed", "empty") and prev["content_hash"] == info["content_hash"]:
+                    print(f"[SKIP] {f['name']}: content unchanged")
+                    record(f, info, chunks=prev["chunks"] or 0, unchanged=True)
+                    continue
+                parse_q.put((f, path, info))
+            except Exception as e:
+                record(f, info, error=f"download failed: {e}")
+
+    def parser(pool: Optional[ProcessPoolExecutor]):
+        while (item := parse_q.get()) is not _STOP:
+            f, path, info = item
+            try:
+                index_q.put((f, timed(info, "parse", _parse_stage, path, f["id"], pool), info))
+            except Exception as e:
+                record(f, info, error=f"parse failed: {e}")
+
+    def indexer():
+        while (item := index_q.get()) is not _STOP:
+            f, chunks, info = item
+            try:
+                timed(info, "index", _index_stage, chunks, f["id"], f["name"])
+                record(f, info, chunks=len(chunks))
+            except Exception as e:
+                record(f, info, error=f"embed/upsert failed: {e}")
+
+    def start(target, count, *args):
+        threads = [threading.Thread(target=target, args=args, daemon=True) for _ in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    # Parsing is CPU-bound (PDF extraction, tokenisation), so it runs in
+    # spawned processes; spawn avoids forking a parent that holds live
+    # HTTP clients and threads.
+    pool = ProcessPoolExecutor(max_workers=n_parse, mp_context=mp.get_context("spawn")) if n_parse else None
+    try:
+        downloaders = start(downloader, n_download)
+        parsers = start(parser, max(1, n_parse), pool)
+        indexers = start(indexer, n_index)
+
+        for f in files:
+            download_q.put(f)
+        for stage_q, workers in ((download_q, downloaders), (parse_q, parsers), (index_q, indexers)):
+            for _ in workers:
+                stage_q.put(_STOP)
+            for t in workers:
+                t.join()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results
+
+# -------------------------------
+# 6) Change detection
+# -------------------------------
+def _detect_drive_changes(known: Set[str]):
+    """
+    Work out which Drive files to look at and which disappeared.
+    Returns (candidate_files, removed_file_ids, page_token_to_save).
+
+    In "changes" mode only the deltas since the saved changes-feed token are
+    fetched, plus the metadata of files whose last sync failed (the cursor
+    moves past their changes regardless, so one file that always fails
+    cannot make every poll replay a growing change list); the first run (no
+    token yet) falls back to a full listing and records a token taken
+    *before* listing so nothing slips through.
+    """
+    def classify(fid: str, f: Optional[Dict], files: List[Dict], removed: List[str]) -> None:
+        f = f or {}
+        in_folder = GOOGLE_DRIVE_FOLDER_ID in (f.get("parents") or [])
+        if not f or f.get("trashed") or not in_folder:
+            if fid in known:
+                removed.append(fid)
+        elif f.get("mimeType") != "application/vnd.google-apps.folder":
+            files.append(f)
+
+    if settings.DRIVE_SYNC_MODE == "changes":
+        token = load_drive_token()
+        if token is not None:
+            changes, new_token = list_changes(token)
+            latest: Dict[str, Dict] = {}
+            for ch in changes:
+                latest[ch["fileId"]] = ch  # later changes win
+
+            files, removed = [], []
+            for fid, ch in latest.items():
+                classify(fid, None if ch.get("removed") else ch.get("file"), files, removed)
+            for fid in sorted(unfinished_file_ids() - set(latest)):
+                classify(fid, get_file(fid), files, removed)
+            return files, removed, new_token
+        new_token = get_start_page_token()
     else:
-        print(f"[SKIP] {name}: No chunks found")
+        new_token = None
 
-    return chunks
+    files = list_files_in_folder(GOOGLE_DRIVE_FOLDER_ID)
+    listed = {f["id"] for f in files}
+    removed = [fid for fid in known if fid not in listed]
+    return files, removed, new_token
+
+def migrate_legacy_vectors() -> int:
+    """
+    Vectors indexed before content-derived chunk ids have uuid ids: no
+    manifest lists them and the `<file_id>#` prefix does not match them, so
+    on serverless Pinecone (no delete by filter) they would outlive every
+    re-ingest as duplicates. Once per live index, find them (ids without a
+    "#"), read their file_id, add them to that file's manifest and mark the
+    file for re-sync; the changes cursor is dropped so the next listing
+    covers every file. That sync embeds the file's content-addressed chunks
+    and deletes the legacy vectors as stale. Returns the legacy vectors found.
+    """
+    pointer = live_pointer()
+    if pointer["generation"] != 0:
+        return 0  # reindexed generations only ever held content-addressed ids
+    marker = f"legacy_vectors_migrated:{pointer['backend']}:{pointer['target']}"
+    if get_meta(marker):
+        return 0
+
+    store = get_vector_store()
+    legacy = [vid for vid in store.list_ids() if "#" not in vid]
+    by_file: Dict[str, List[str]] = {}
+    orphans = []
+    for vid, metadata in store.fetch_metadata(legacy).items():
+        if metadata.get("file_id"):
+            by_file.setdefault(metadata["file_id"], []).append(vid)
+        else:
+            orphans.append(vid)
+    for file_id, ids in by_file.items():
+        mark_for_resync(file_id, ids)
+    if by_file:
+        clear_drive_token()
+    if orphans:
+        print(f"[WARN] {len(orphans)} legacy vectors have no file_id and were left in place")
+    print(f"[INFO] Legacy vector migration: {len(legacy)} found across {len(by_file)} files")
+    set_meta(marker, str(time.time()))
+    return len(legacy)
+
+def _remove_file(file_id: str) -> None:
+    print(f"[INFO] Removing vectors for deleted file: {file_id}")
+    get_vector_store().delete_by_file(file_id)
+    chunk_store = get_chunk_store()
+    if chunk_store is not None:
+        chunk_store.delete_by_file(file_id)
+    local_dir = RAW_DIR / file_id
+    if local_dir.is_dir():
+        for path in local_dir.iterdir():
+            (CHUNK_DIR / f"{output_stem(path)}.jsonl").unlink(missing_ok=True)
+            (INTERIM_DIR / f"{output_stem(path)}.txt").unlink(missing_ok=True)
+        shutil.rmtree(local_dir, ignore_errors=True)
+    forget_file(file_id)
 
 # -------------------------------
-# 5) Main Pipeline
+# 7) Main Pipeline
 # -------------------------------
-def process_new_drive_files() -> Dict:
+def process_new_drive_files(on_progress: Optional[Callable[[Dict], None]] = None) -> Dict:
     """
     Detects new/updated files in Google Drive, downloads them,
-    preprocesses into chunks, generates embeddings, and upserts to Pinecone.
+    preprocesses into chunks, generates embeddings, and upserts to the vector store.
+    `on_progress` receives {"phase", "found", "done", "failed", "removed"} as the sync advances.
     """
+    progress = {"phase": "listing", "found": 0, "done": 0, "failed": 0, "removed": 0}
+
+    def report(**changes):
+        progress.update(changes)
+        if on_progress is not None:
+            on_progress(dict(progress))
+
+    def file_done(res: Dict):
+        # Committed per file, so a crash mid-sync only repeats the files in flight
+        f = res["file"]
+        status = "failed" if res["error"] else ("indexed" if res["chunks"] else "empty")
+        record_file(f["id"], f["name"], f["modifiedTime"], status, content_hash=res["content_hash"],
+                    chunks=res["chunks"], error=res["error"], timings=res["timings"])
+        report(done=progress["done"] + 1, failed=progress["failed"] + bool(res["error"]))
+
     if not GOOGLE_DRIVE_FOLDER_ID:
         print("[WARN] GOOGLE_DRIVE_FOLDER_ID not set. Skipping ingest.")
         return {"processed": 0, "skipped": 0}
 
+    migrate_legacy_vectors()
     state = load_state()  # {file_id: modifiedTime}
-    files = list_files_in_folder(GOOGLE_DRIVE_FOLDER_ID)
+    report()
+    with INGEST_STAGE_SECONDS.time(stage="list"):
+        files, removed_ids, page_token = _detect_drive_changes(known_file_ids())
 
     new_files = []
     for f in files:
@@ -101,20 +435,61 @@ def process_new_drive_files() -> Dict:
         if fid not in state or state[fid] != mtime:
             new_files.append(f)
 
-    processed, skipped = 0, 0
-    for f in new_files:
-        fid = f["id"]
-        name = f["name"]
-        mime = f["mimeType"]
-        mtime = f["modifiedTime"]
+    report(phase="removing", found=len(new_files))
+    for fid in removed_ids:
+        _remove_file(fid)
+        report(removed=progress["removed"] + 1)
 
-        chunks = process_single_file(fid, name, mime, mtime)
-        if chunks:
+    report(phase="ingesting")
+    processed, skipped, unchanged, failed = 0, 0, 0, 0
+    for res in run_ingest_pipeline(new_files, on_result=file_done):
+        if res["error"]:
+            failed += 1  # recorded as failed, so the next poll retries it
+            INGEST_FILES.inc(result="failed")
+        elif res["unchanged"]:
+            unchanged += 1
+            INGEST_FILES.inc(result="unchanged")
+        elif res["chunks"]:
             processed += 1
-            state[fid] = mtime
+            INGEST_FILES.inc(result="processed")
         else:
-            skipped += 1
-            state[fid] = mtime  # Mark even if skipped, so we don't retry endlessly
+            skipped += 1  # recorded as empty, so we don't retry endlessly
+            INGEST_FILES.inc(result="skipped")
+
+    # Failed files are recorded as such and retried from the state store,
+    # so the changes cursor always advances
+    if page_token is not None:
+        save_drive_token(page_token)
+    if processed or removed_ids:
+        bump_ingest_version()  # invalidates cached answers in rag_service
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "unchanged": unchanged,
+        "failed": failed,
+        "removed": len(removed_ids),
+        "found": len(new_files),
+    }
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Drive auto-ingest")
+    parser.add_argument("--trace", nargs=3, metavar=("FILE_ID", "NAME", "MIME_TYPE"),
+                        help="ingest one Drive file under a trace and the sampling profiler")
+    parser.add_argument("--no-profile", action="store_true", help="with --trace: spans only")
+    parser.add_argument("--lock-wait", type=float, default=60.0,
+                        help="seconds to wait for another sync or reindex to release the ingest lock")
+    args = parser.parse_args(argv)
+
+    lock = FileLock(INGEST_WRITE_LOCK_PATH)
+    if not lock.acquire(args.lock_wait):
+        print(f"[FAIL] Another sync or reindex holds {INGEST_WRITE_LOCK_PATH} (pid {lock.holder()}); try again later.")
+        sys.exit(1)
+
+    if args.trace:
+        path = trace_single_file(*args.trace, profile=not args.no_profile)
+        print(f"[TRACE] {path}")
+    else:
+        print(process_new_drive_files())
 
-    save_state(state)
-    return {"processed": processed, "skipped": skipped, "found": len(new_files)}
+if __name__ == "__main__":
+    main()
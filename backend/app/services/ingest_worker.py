@@ -0,0 +1,151 @@
+"""
+Background Drive ingestion for the API processes.
+
+Every worker process (gunicorn runs several) starts an IngestWorker, but
+only the one holding an exclusive lock on INGEST_LOCK_PATH — the leader —
+runs syncs. The others retry the lock on each poll, so when the leader
+exits (the OS drops its lock) another process takes over within one
+interval. Each sync also holds INGEST_WRITE_LOCK_PATH, which the
+auto_ingest and reindex CLIs take too: a CLI run waits for a sync in
+progress, and the leader skips its polls while a CLI run writes. Syncs run
+on a scheduler thread: startup and the event loop
+never wait for Drive. The leader publishes state and progress to
+INGEST_STATUS_PATH so whichever process serves /api/ingest/status can
+answer.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from backend.app.services.auto_ingest import process_new_drive_files
+from backend.app.utils.config import get_settings
+from backend.app.utils.state_store import (
+    INGEST_LOCK_PATH, INGEST_WRITE_LOCK_PATH, FileLock, ingest_state_counts, load_ingest_status, save_ingest_status,
+)
+
+settings = get_settings()
+
+_PROGRESS_WRITE_INTERVAL = 1.0  # seconds between progress writes during a sync
+
+# -------------------------------
+# 1) Leader liveness
+# -------------------------------
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+# -------------------------------
+# 2) Worker
+# -------------------------------
+class IngestWorker:
+    def __init__(self, interval_minutes: int, lock_path: str = INGEST_LOCK_PATH,
+                 write_lock_path: str = INGEST_WRITE_LOCK_PATH):
+        self.interval_minutes = interval_minutes
+        self.lock = FileLock(lock_path)
+        self.write_lock = FileLock(write_lock_path)
+        self.scheduler = BackgroundScheduler(daemon=True)
+        self._status: Dict[str, Any] = {}
+        self._status_lock = threading.Lock()
+        self._last_write = 0.0
+
+    def start(self) -> None:
+        """Schedule the first attempt immediately and return without waiting for it."""
+        self.scheduler.add_job(
+            self.tick,
+            "interval",
+            minutes=self.interval_minutes,
+            id="drive_ingest_job",
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True,
+        )
+        self.scheduler.start()
+
+    def shutdown(self) -> None:
+        # A sync in progress is abandoned with the process; its files stay
+        # out of the state file and are retried by the next leader.
+        self.scheduler.shutdown(wait=False)
+
+    def _publish(self, force: bool = False, **changes: Any) -> None:
+        with self._status_lock:
+            phase = (self._status.get("progress") or {}).get("phase")
+            self._status.update(changes)
+            force = force or (self._status.get("progress") or {}).get("phase") != phase
+            now = time.monotonic()
+            if not force and now - self._last_write < _PROGRESS_WRITE_INTERVAL:
+                return
+            self._last_write = now
+            status = dict(self._status)
+        try:
+            save_ingest_status(status)
+        except OSError as e:
+            print(f"[ingest][warn] Could not write status: {e}")
+
+    def tick(self) -> None:
+        """One scheduled poll: sync if this process is (or just became) the leader and no CLI run is writing."""
+        if not self.lock.try_acquire():
+            return
+        if not self.write_lock.try_acquire():
+            print(f"[ingest] Skipping this poll: pid {self.write_lock.holder()} holds {self.write_lock.path}")
+            return
+        try:
+            self._sync()
+        finally:
+            self.write_lock.release()
+
+    def _sync(self) -> None:
+        started = time.time()
+        self._publish(
+            force=True,
+            leader_pid=os.getpid(),
+            state="running",
+            started_at=started,
+            progress={"phase": "starting"},
+            error=None,
+        )
+        result, error = None, None
+        try:
+            result = process_new_drive_files(on_progress=lambda p: self._publish(progress=p))
+            print(f"[ingest] {result}")
+        except FileNotFoundError:
+            error = "Google service account JSON not found. Skipping ingest."
+            print(f"[ingest][warn] {error}")
+        except Exception as e:
+            error = str(e)
+            print(f"[ingest][error] {e}")
+
+        finished = time.time()
+        self._publish(
+            force=True,
+            state="error" if error else "idle",
+            finished_at=finished,
+            duration_s=round(finished - started, 3),
+            last_result=result,
+            error=error,
+            next_run_at=finished + self.interval_minutes * 60,
+        )
+
+    def status(self) -> Dict[str, Any]:
+        """The leader's published status plus this process's role."""
+        status = load_ingest_status() or {"state": "pending"}
+        status["leader_alive"] = _pid_alive(status.get("leader_pid"))
+        status["files"] = ingest_state_counts()
+        status["this_process"] = {"pid": os.getpid(), "leader": self.lock.held}
+        return status
+
+@lru_cache
+def get_ingest_worker() -> IngestWorker:
+    return IngestWorker(interval_minutes=settings.INGEST_POLL_INTERVAL_MINUTES)
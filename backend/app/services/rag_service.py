@@ -1,39 +1,180 @@
-from typing import List, Dict, Any
-from openai import OpenAI
-from pinecone import Pinecone
+import asyncio
+import time
+from typing import List, Dict, Any, AsyncIterator, Tuple
+from openai import OpenAI, AsyncOpenAI
 from ..utils.config import get_settings
+from ..utils.vector_store import get_vector_store, aclose_vector_stores
+from ..utils.query_cache import QueryEmbeddingCache, normalize_query
+from ..utils.answer_cache import SemanticAnswerCache
+from ..utils.state_store import get_ingest_version
+from ..utils.metrics import RAG_STAGE_SECONDS, RAG_ANSWER_SECONDS, OPENAI_TOKENS, RAG_COALESCED, QUERY_EMBED_BATCH
+from ..utils.tracing import span
+from ..utils.context_packer import PackedContext, encoder_for, pack_context
+from ..utils.chunk_store import backfill, get_chunk_store, hydrate
+from ..utils.coalesce import MicroBatcher, SingleFlight
+from ..utils.embed_batcher import count_tokens, fit_inputs, pack_batches
+from ..utils.index_profile import live_profile
 
 settings = get_settings()
 
 # --- Clients ---
 _oai = OpenAI(api_key=settings.OPENAI_API_KEY)
-_pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-_index = _pc.Index(settings.PINECONE_INDEX_NAME)
+_aoai = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+# --- Query embedding cache ---
+_query_cache = QueryEmbeddingCache(
+    max_entries=settings.QUERY_CACHE_SIZE,
+    ttl_seconds=settings.QUERY_CACHE_TTL_SECONDS,
+    disk_path=settings.QUERY_CACHE_PATH or None,
+    max_disk_entries=settings.QUERY_CACHE_DISK_MAX_ENTRIES,
+)
+
+# --- Semantic answer cache ---
+_answer_cache = SemanticAnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+)
+
+def query_cache_stats() -> Dict[str, int]:
+    return _query_cache.stats()
+
+def answer_cache_stats() -> Dict[str, int]:
+    return _answer_cache.stats()
+
+def coalesce_stats() -> Dict[str, Any]:
+    return {"answers": _inflight_answers.stats(), "query_embeddings": _query_embedder.stats()}
+
+def _count_tokens(model: str, usage: Any, embedding: bool = False, sp=None) -> None:
+    if usage is None:
+        return
+    if embedding:
+        tokens = getattr(usage, "total_tokens", 0) or 0
+        OPENAI_TOKENS.inc(tokens, model=model, kind="embedding")
+        if sp is not None:
+            sp.set(tokens=tokens)
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    OPENAI_TOKENS.inc(prompt, model=model, kind="prompt")
+    OPENAI_TOKENS.inc(completion, model=model, kind="completion")
+    if sp is not None:
+        sp.set(prompt_tokens=prompt, completion_tokens=completion)
 
 # --- Embeddings ---
+# Queries are embedded with the live index's profile (model and dimensions),
+# which follows a reindex switch; the cache key carries the dimensions.
 def _embed(text: str) -> List[float]:
-    emb = _oai.embeddings.create(
-        model=settings.OPENAI_EMBED_MODEL,
-        input=text
-    )
-    return emb.data[0].embedding
+    profile = live_profile()
+    with RAG_STAGE_SECONDS.time(stage="embed"), span("embed", chars=len(text)) as sp:
+        cached = _query_cache.get(text, profile.cache_key)
+        sp.set(cached=cached is not None)
+        if cached is not None:
+            return cached
 
-# --- Retrieval from Pinecone ---
-def retrieve(query: str, top_k: int | None = None) -> List[Dict[str, Any]]:
-    k = top_k or settings.TOP_K
-    qvec = _embed(query)
+        (fitted,), _ = fit_inputs([text], [count_tokens(text)])
+        emb = _oai.embeddings.create(
+            model=profile.model,
+            input=fitted,
+            **profile.embed_kwargs()
+        )
+        _count_tokens(profile.model, emb.usage, embedding=True, sp=sp)
+        vec = emb.data[0].embedding
+        _query_cache.put(text, profile.cache_key, vec)
+        return vec
 
-    res = _index.query(
-        vector=qvec,
-        top_k=k,
-        include_metadata=True
+async def _embed_request(profile, texts: List[str]) -> List[List[float]]:
+    emb = await _aoai.embeddings.create(model=profile.model, input=texts, **profile.embed_kwargs())
+    _count_tokens(profile.model, emb.usage, embedding=True)
+    return [d.embedding for d in sorted(emb.data, key=lambda d: d.index)]
+
+async def _embed_many_async(texts: List[str]) -> List[List[float]]:
+    # Every query gathered in the batching window, in as few embeddings
+    # requests as the limits allow; queries that normalize alike (the query
+    # cache key) are sent once, and oversized ones are truncated rather than
+    # failing the whole window
+    unique: Dict[str, str] = {}
+    for text in texts:
+        unique.setdefault(normalize_query(text), text)
+    QUERY_EMBED_BATCH.observe(len(unique))
+    profile = live_profile()
+    originals = list(unique.values())
+    fitted, counts = fit_inputs(originals, [count_tokens(t) for t in originals])
+    batches = pack_batches(
+        counts,
+        max_inputs=settings.EMBED_BATCH_MAX_INPUTS,
+        max_tokens=settings.EMBED_BATCH_MAX_TOKENS,
     )
+    results = await asyncio.gather(*[_embed_request(profile, [fitted[j] for j in batch]) for batch in batches])
+    embedded: List[List[float]] = [None] * len(originals)
+    for batch, embs in zip(batches, results):
+        for j, vec in zip(batch, embs):
+            embedded[j] = vec
+    vecs = dict(zip(unique, embedded))
+    await _query_cache.aput_many({text: vecs[key] for key, text in unique.items()}, profile.cache_key)
+    return [vecs[normalize_query(text)] for text in texts]
+
+_query_embedder = MicroBatcher(
+    _embed_many_async,
+    window=settings.QUERY_EMBED_BATCH_WINDOW_MS / 1000,
+    max_batch=settings.QUERY_EMBED_BATCH_MAX,
+)
 
-    matches = res.get("matches", []) or []
+async def _embed_async(text: str) -> List[float]:
+    with RAG_STAGE_SECONDS.time(stage="embed"), span("embed", chars=len(text)) as sp:
+        cached = await _query_cache.aget(text, live_profile().cache_key)
+        sp.set(cached=cached is not None)
+        if cached is not None:
+            return cached
+        return await _query_embedder.submit(text)
+
+# --- Retrieval from the live vector store (follows reindex switches) ---
+def _filter_matches(matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if settings.MIN_SCORE > 0:
         matches = [m for m in matches if float(m.get("score", 0)) >= settings.MIN_SCORE]
     return matches
 
+def _hydrate(chunk_store, matches: List[Dict[str, Any]]) -> bool:
+    with RAG_STAGE_SECONDS.time(stage="hydrate"), span("hydrate", ids=len(matches)) as sp:
+        complete = hydrate(chunk_store, matches)
+        sp.set(complete=complete)
+    return complete
+
+def retrieve(query: str, top_k: int | None = None, qvec: List[float] | None = None) -> List[Dict[str, Any]]:
+    k = top_k or settings.TOP_K
+    if qvec is None:
+        qvec = _embed(query)
+
+    chunk_store = get_chunk_store()
+    with RAG_STAGE_SECONDS.time(stage="query"), span("query", top_k=k) as sp:
+        matches = get_vector_store().query(qvec, top_k=k, include_metadata=chunk_store is None)
+        sp.set(matches=len(matches))
+    if chunk_store is not None and not _hydrate(chunk_store, matches):
+        # Vectors indexed before the chunk store existed: their text is still in index metadata
+        with RAG_STAGE_SECONDS.time(stage="query"), span("query", top_k=k, include_metadata=True):
+            matches = get_vector_store().query(qvec, top_k=k, include_metadata=True)
+        backfill(chunk_store, matches)
+    return _filter_matches(matches)
+
+async def retrieve_async(query: str, top_k: int | None = None, qvec: List[float] | None = None) -> List[Dict[str, Any]]:
+    k = top_k or settings.TOP_K
+    if qvec is None:
+        qvec = await _embed_async(query)
+
+    chunk_store = get_chunk_store()
+    with RAG_STAGE_SECONDS.time(stage="query"), span("query", top_k=k) as sp:
+        matches = await get_vector_store().query_async(qvec, top_k=k, include_metadata=chunk_store is None)
+        sp.set(matches=len(matches))
+    # The chunk store is SQLite: read and write it off the event loop
+    if chunk_store is not None and not await asyncio.to_thread(_hydrate, chunk_store, matches):
+        with RAG_STAGE_SECONDS.time(stage="query"), span("query", top_k=k, include_metadata=True):
+            matches = await get_vector_store().query_async(qvec, top_k=k, include_metadata=True)
+        await asyncio.to_thread(backfill, chunk_store, matches)
+    return _filter_matches(matches)
+
+async def aclose_clients() -> None:
+    await aclose_vector_stores()
+    await _aoai.close()
+
 # --- Improved system prompt for better answers ---
 _SYSTEM = """
 You are an AI assistant with access to a knowledge base.
@@ -49,15 +190,24 @@ Follow these rules:
 """
 
 # --- Format context for the LLM ---
+def _context_title(md: Dict[str, Any]) -> str:
+    title = md.get("title") or md.get("source") or "Untitled"
+    return title.replace("_", " ").replace(".txt", "").replace(".pdf", "")
+
+encoder_for(settings.OPENAI_CHAT_MODEL)  # load (or fall back) at startup, not on the first question
+
+def _pack_context(matches: List[Dict[str, Any]]) -> PackedContext:
+    # Merge overlapping neighbours, drop near-duplicates, fit the token budget
+    return pack_context(
+        matches,
+        budget_tokens=settings.CONTEXT_TOKEN_BUDGET,
+        label=_context_title,
+        model=settings.OPENAI_CHAT_MODEL,
+        dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+    )
+
 def _build_context(matches: List[Dict[str, Any]]) -> str:
-    parts = []
-    for m in matches:
-        md = m.get("metadata", {}) or {}
-        title = md.get("title") or md.get("source") or "Untitled"
-        title = title.replace("_", " ").replace(".txt", "").replace(".pdf", "")
-        text = md.get("text") or ""
-        parts.append(f"[{title}]\n{text}")
-    return "\n\n---\n\n".join(parts)
+    return _pack_context(matches).text
 
 # --- Extract top N sources for display ---
 def _get_top_sources(matches: List[Dict[str, Any]], n: int = 3) -> List[str]:
@@ -69,40 +219,252 @@ def _get_top_sources(matches: List[Dict[str, Any]], n: int = 3) -> List[str]:
     return sources
 
 # --- LLM call ---
-def answer_from_context(query: str, matches: List[Dict[str, Any]]) -> str:
-    context = _build_context(matches)
-
-    messages = [
+def _build_messages(query: str, matches: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    with RAG_STAGE_SECONDS.time(stage="context"), span("context", matches=len(matches)) as sp:
+        packed = _pack_context(matches)
+        context = packed.text
+        sp.set(chars=len(context), tokens=packed.tokens, segments=packed.segments, merged=packed.merged,
+               duplicates=packed.duplicates, skipped=packed.skipped, truncated=packed.truncated)
+    return [
         {"role": "system", "content": _SYSTEM},
         {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}\n\nAnswer:"}
     ]
 
-    resp = _oai.chat.completions.create(
-        model=settings.OPENAI_CHAT_MODEL,
-        messages=messages,
-        temperature=0.2,
-        max_tokens=600
-    )
-    return resp.choices[0].message.content.strip()
+def answer_from_context(query: str, matches: List[Dict[str, Any]]) -> str:
+    messages = _build_messages(query, matches)
+    with RAG_STAGE_SECONDS.time(stage="llm"), span("llm", model=settings.OPENAI_CHAT_MODEL) as sp:
+        resp = _oai.chat.completions.create(
+            model=settings.OPENAI_CHAT_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=600
+        )
+        answer = resp.choices[0].message.content.strip()
+        sp.set(prompt_chars=sum(len(m["content"]) for m in messages), answer_chars=len(answer))
+    _count_tokens(settings.OPENAI_CHAT_MODEL, resp.usage, sp=sp)
+    return answer
 
-# --- Main pipeline for end user ---
-def rag_answer(query: str):
-    matches = retrieve(query)
-    answer = answer_from_context(query, matches)
+async def answer_from_context_async(query: str, matches: List[Dict[str, Any]]) -> str:
+    messages = _build_messages(query, matches)
+    with RAG_STAGE_SECONDS.time(stage="llm"), span("llm", model=settings.OPENAI_CHAT_MODEL) as sp:
+        resp = await _aoai.chat.completions.create(
+            model=settings.OPENAI_CHAT_MODEL,
+            messages=messages,
+            temperature=0.2,
+            max_tokens=600
+        )
+        answer = resp.choices[0].message.content.strip()
+        sp.set(prompt_chars=sum(len(m["content"]) for m in messages), answer_chars=len(answer))
+    _count_tokens(settings.OPENAI_CHAT_MODEL, resp.usage, sp=sp)
+    return answer
 
+# --- Main pipeline for end user ---
+def _display_sources(matches: List[Dict[str, Any]]) -> List[str]:
     top_sources = []
     for m in matches[:3]:
         md = m.get("metadata", {}) or {}
         title = md.get("title") or md.get("source") or "Untitled"
         title = title.replace("_", " ").replace(".txt", "")
         top_sources.append(f"📄 {title}")
+    return top_sources
+
+def _cached_answer(query: str, qvec: List[float], version: int) -> Dict[str, Any] | None:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    cached = _answer_cache.lookup(qvec, version)
+    if cached is None:
+        return None
+    return {**cached, "question": query}
 
-    return {
+def _finish(query: str, qvec: List[float], version: int, answer: str, matches: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result = {
         "question": query,
         "answer": answer,
-        "sources": top_sources,
+        "sources": _display_sources(matches),
         "matches": matches   # ✅ put it back so routes.py works
     }
+    if settings.ANSWER_CACHE_ENABLED:
+        _answer_cache.store(qvec, result, version)
+    return result
+
+def _observe_answer(endpoint: str, t0: float, cached: bool) -> None:
+    RAG_ANSWER_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, cached=str(cached).lower())
+
+def rag_answer(query: str):
+    t0 = time.perf_counter()
+    qvec = _embed(query)
+
+    version = get_ingest_version()
+    cached = _cached_answer(query, qvec, version)
+    if cached is not None:
+        _observe_answer("ask", t0, cached=True)
+        return cached
+
+    matches = retrieve(query, qvec=qvec)
+    answer = answer_from_context(query, matches)
+    result = _finish(query, qvec, version, answer, matches)
+    _observe_answer("ask", t0, cached=False)
+    return result
+
+# Concurrent identical (normalized) questions share one in-flight answer
+_inflight_answers = SingleFlight()
+
+async def rag_answer_async(query: str):
+    if not settings.RAG_COALESCE_ENABLED:
+        return await _rag_answer_async(query)
+    with span("coalesce") as sp:
+        result, shared = await _inflight_answers.do(normalize_query(query), lambda: _rag_answer_async(query))
+        sp.set(shared=shared)
+    if shared:
+        RAG_COALESCED.inc()
+    return {**result, "question": query} if shared else result
+
+async def _rag_answer_async(query: str):
+    t0 = time.perf_counter()
+    qvec = await _embed_async(query)
 
+    version = await asyncio.to_thread(get_ingest_version)
+    cached = _cached_answer(query, qvec, version)
+    if cached is not None:
+        _observe_answer("ask", t0, cached=True)
+        return cached
 
+    matches = await retrieve_async(query, qvec=qvec)
+    answer = await answer_from_context_async(query, matches)
+    result = _finish(query, qvec, version, answer, matches)
+    _observe_answer("ask", t0, cached=False)
+    return result
+
+# --- Batch answers (evaluation sets, FAQ pre-generation) ---
+async def _embed_batch_async(queries: List[str]) -> List[List[float]]:
+    # Cache hits first; the misses go out in as few embeddings requests as the limits allow
+    vecs = await _query_cache.aget_many(queries, live_profile().cache_key)
+    missing = [i for i, v in enumerate(vecs) if v is None]
+    if missing:
+        for i, vec in zip(missing, await _embed_many_async([queries[i] for i in missing])):
+            vecs[i] = vec
+    return vecs
+
+async def rag_answer_batch(queries: List[str], concurrency: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Answer many questions at once: one batched embedding pass, concurrent
+    vector queries (ASK_BATCH_QUERY_CONCURRENCY) and at most `concurrency`
+    chat completions in flight; a caller can lower ASK_BATCH_CONCURRENCY but
+    not raise it. Results are in input order; an item that failed has a
+    generic "error" set and no answer, and the detail is only logged.
+    """
+    t0 = time.perf_counter()
+    cap = settings.ASK_BATCH_CONCURRENCY
+    llm_slots = asyncio.Semaphore(min(concurrency, cap) if concurrency else cap)
+    query_slots = asyncio.Semaphore(settings.ASK_BATCH_QUERY_CONCURRENCY)
+
+    def _failed(query: str, error: str, timings: Dict[str, float]) -> Dict[str, Any]:
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000
+        return {"question": query, "answer": None, "sources": [], "matches": [], "cached": False,
+                "error": error, "timings": timings}
+
+    valid = [i for i, q in enumerate(queries) if q and q.strip()]
+    with RAG_STAGE_SECONDS.time(stage="embed"), span("embed", inputs=len(valid)):
+        try:
+            vecs = await _embed_batch_async([queries[i] for i in valid])
+        except Exception as e:
+            print(f"[ask][batch] Embedding failed: {type(e).__name__}: {e}")
+            return [_failed(q, "Embedding failed.", {}) for q in queries]
+    embed_ms = (time.perf_counter() - t0) * 1000
+    version = await asyncio.to_thread(get_ingest_version)
+
+    async def one(i: int, query: str, qvec: List[float]) -> Dict[str, Any]:
+        timings = {"embed_ms": embed_ms}
+        try:
+            cached = _cached_answer(query, qvec, version)
+            if cached is not None:
+                _observe_answer("batch", t0, cached=True)
+                timings["total_ms"] = (time.perf_counter() - t0) * 1000
+                return {**cached, "cached": True, "error": None, "timings": timings}
+
+            async with query_slots:
+                t = time.perf_counter()
+                matches = await retrieve_async(query, qvec=qvec)
+                timings["retrieve_ms"] = (time.perf_counter() - t) * 1000
+            async with llm_slots:
+                t = time.perf_counter()
+                answer = await answer_from_context_async(query, matches)
+                timings["llm_ms"] = (time.perf_counter() - t) * 1000
+            result = _finish(query, qvec, version, answer, matches)
+            _observe_answer("batch", t0, cached=False)
+            timings["total_ms"] = (time.perf_counter() - t0) * 1000
+            return {**result, "cached": False, "error": None, "timings": timings}
+        except Exception as e:
+            print(f"[ask][batch] Question {i} failed: {type(e).__name__}: {e}")
+            return _failed(query, "Could not answer this question.", timings)
+
+    answered = await asyncio.gather(*[one(i, queries[i], vec) for i, vec in zip(valid, vecs)])
+    results = [_failed(q, "Query text is required.", {}) for q in queries]
+    for i, result in zip(valid, answered):
+        results[i] = result
+    return results
+
+async def stream_rag_answer(query: str) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Async generator of (event, payload) pairs: one "matches" event as soon as
+    retrieval finishes, "token" events while the completion streams, then a
+    final "done" event with token usage and per-stage timings in ms.
+    """
+    t0 = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    qvec = await _embed_async(query)
+    timings["embed_ms"] = (time.perf_counter() - t0) * 1000
+
+    version = await asyncio.to_thread(get_ingest_version)
+    cached = _cached_answer(query, qvec, version)
+    if cached is not None:
+        yield "matches", {"matches": cached["matches"]}
+        yield "token", {"text": cached["answer"]}
+        timings["total_ms"] = (time.perf_counter() - t0) * 1000
+        _observe_answer("stream", t0, cached=True)
+        yield "done", {"cached": True, "usage": None, "timings": timings}
+        return
+
+    t = time.perf_counter()
+    matches = await retrieve_async(query, qvec=qvec)
+    timings["retrieve_ms"] = (time.perf_counter() - t) * 1000
+    yield "matches", {"matches": matches}
+
+    messages = _build_messages(query, matches)
+    t = time.perf_counter()
+    stream = await _aoai.chat.completions.create(
+        model=settings.OPENAI_CHAT_MODEL,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=600,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    parts: List[str] = []
+    usage = None
+    try:
+        async for chunk in stream:
+            if chunk.usage is not None:
+                _count_tokens(settings.OPENAI_CHAT_MODEL, chunk.usage)
+                usage = chunk.usage.model_dump()
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if not parts:
+                    timings["first_token_ms"] = (time.perf_counter() - t0) * 1000
+                parts.append(delta)
+                yield "token", {"text": delta}
+    finally:
+        # The client may have gone away (the response task is cancelled or
+        # this generator closed early): stop the generation either way.
+        # Shielded, since a cancelled task would abort the close itself.
+        await asyncio.shield(stream.close())
+    timings["llm_ms"] = (time.perf_counter() - t) * 1000
+    RAG_STAGE_SECONDS.observe(timings["llm_ms"] / 1000, stage="llm")
 
+    _finish(query, qvec, version, "".join(parts).strip(), matches)
+    timings["total_ms"] = (time.perf_counter() - t0) * 1000
+    _observe_answer("stream", t0, cached=False)
+    yield "done", {"cached": False, "usage": usage, "timings": timings}
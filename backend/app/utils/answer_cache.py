@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .metrics import CACHE_LOOKUPS
+
+class SemanticAnswerCache:
+    """
+    Cache of past RAG answers looked up by query-embedding similarity.
+
+    Query embeddings live in a preallocated float32 matrix (one unit-norm row
+    per entry), so a lookup is a single matrix-vector product. Entries are
+    tagged with the ingest version they were produced under and the whole
+    cache is dropped as soon as a newer version is seen.
+    """
+
+    def __init__(self, max_entries: int = 512, threshold: float = 0.92):
+        self.max_entries = max(1, max_entries)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._entries: List[Optional[Dict[str, Any]]] = []
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+        self._version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(embedding: List[float]) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def _sync_version(self, version: int) -> None:
+        if version != self._version:
+            self._matrix = None
+            self._entries = []
+            self._last_used[:] = 0
+            self._version = version
+
+    def lookup(self, embedding: List[float], version: int) -> Optional[Dict[str, Any]]:
+        q = self._unit(embedding)
+        with self._lock:
+            self._sync_version(version)
+            n = len(self._entries)
+            if n == 0 or self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            sims = self._matrix[:n] @ q
+            best = int(np.argmax(sims))
+            if float(sims[best]) < self.threshold:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(cache="answer", result="miss")
+                return None
+            self._last_used[best] = time.monotonic()
+            self.hits += 1
+            CACHE_LOOKUPS.inc(cache="answer", result="hit")
+            return self._entries[best]
+
+    def store(self, embedding: List[float], result: Dict[str, Any], version: int) -> None:
+        q = self._unit(embedding)
+        with self._lock:
+            self._sync_version(version)
+            if self._matrix is None or self._matrix.shape[1] != q.shape[0]:
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._entries = []
+            if len(self._entries) < self.max_entries:
+                row = len(self._entries)
+                self._entries.append(result)
+            else:
+                row = int(np.argmin(self._last_used))
+                self._entries[row] = result
+            self._matrix[row] = q
+            self._last_used[row] = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
@@ -0,0 +1,141 @@
+"""
+Local chunk-text store: chunk text and display metadata by chunk id, so the
+vector index only holds ids, vectors and the small fields deletes filter on.
+
+    python -m backend.app.utils.chunk_store --rebuild
+
+(Re)loads the store from the per-file chunk JSONL in processed/chunks.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from .config import get_settings
+
+_SQL_BATCH = 500  # stay well under SQLite's bound-parameter limit
+FIELDS = ("title", "source", "text", "file_id", "chunk_index")
+
+class ChunkStore:
+    """
+    SQLite (WAL) table of chunks keyed by id. `get_many` returns the same
+    metadata dict `chunk_to_vector` used to put in the index, so hydrated
+    matches look exactly like the old include_metadata ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id TEXT PRIMARY KEY, file_id TEXT, title TEXT, source TEXT, text TEXT NOT NULL, chunk_index INTEGER)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_file_id ON chunks (file_id)")
+        self._db.commit()
+
+    def put_many(self, chunks: Sequence[Dict[str, Any]], file_id: Optional[str] = None) -> None:
+        rows = [
+            (ch["id"], file_id or ch.get("file_id"), ch.get("title"), ch.get("source"), ch.get("text") or "",
+             ch.get("chunk_index"))
+            for ch in chunks if ch.get("id")
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO chunks (id, file_id, title, source, text, chunk_index)"
+                " VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def get_many(self, ids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """id -> {"title", "source", "text", "file_id", "chunk_index"} for the ids present."""
+        found: Dict[str, Dict[str, Any]] = {}
+        ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                rows = self._db.execute(
+                    f"SELECT id, {', '.join(FIELDS)} FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch
+                ).fetchall()
+                for row in rows:
+                    found[row[0]] = dict(zip(FIELDS, row[1:]))
+        return found
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        with self._lock:
+            for i in range(0, len(ids), _SQL_BATCH):
+                batch = ids[i:i + _SQL_BATCH]
+                self._db.execute(f"DELETE FROM chunks WHERE id IN ({','.join('?' * len(batch))})", batch)
+            self._db.commit()
+
+    def delete_by_file(self, file_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM chunks WHERE file_id = ?", (file_id,))
+            self._db.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+def hydrate(store: ChunkStore, matches: List[Dict[str, Any]]) -> bool:
+    """
+    Fill each match's metadata from the store in one batched read.
+    Returns False if any id is missing (vectors written before the store
+    existed still carry their text in index metadata).
+    """
+    found = store.get_many([m["id"] for m in matches])
+    for m in matches:
+        md = found.get(m["id"])
+        if md is not None:
+            m["metadata"] = {**(m.get("metadata") or {}), **md}
+    return len(found) == len({m["id"] for m in matches})
+
+def backfill(store: ChunkStore, matches: List[Dict[str, Any]]) -> None:
+    """Copy chunk text from include_metadata matches into the store."""
+    store.put_many([{**(m.get("metadata") or {}), "id": m["id"]} for m in matches if (m.get("metadata") or {}).get("text")])
+
+@lru_cache
+def get_chunk_store() -> Optional[ChunkStore]:
+    """The configured store, or None when CHUNK_STORE_PATH is empty (text stays in index metadata)."""
+    path = get_settings().CHUNK_STORE_PATH
+    return ChunkStore(path) if path else None
+
+def rebuild(store: ChunkStore, chunk_dir: Path) -> int:
+    """Load every per-file chunk JSONL into the store. Returns chunks loaded."""
+    total = 0
+    for path in sorted(chunk_dir.glob("*.jsonl")):
+        if path.name == "all_chunks.jsonl":
+            continue  # only a concatenation of the per-file ones
+        with path.open("r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f if line.strip()]
+        store.put_many(chunks)
+        total += len(chunks)
+    return total
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rebuild", action="store_true", help="load processed/chunks/*.jsonl into the store")
+    args = parser.parse_args(argv)
+
+    store = get_chunk_store()
+    if store is None:
+        print("[WARN] CHUNK_STORE_PATH is empty; the chunk store is disabled.")
+        return
+    if args.rebuild:
+        from backend.app.utils.universal_preprocess import CHUNK_DIR
+
+        print(f"[OK] Loaded {rebuild(store, CHUNK_DIR)} chunks into {store.path}")
+    print(f"[INFO] {store.count()} chunks in {store.path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# -------------------------------
+# 1) Single-flight
+# -------------------------------
+class SingleFlight:
+    """
+    Concurrent `do` calls with the same key await one shared task instead of
+    each running `fn`. The task is shielded, so a caller that goes away
+    (client disconnect) does not cancel it for the others. Nothing is kept
+    once the task finishes: this coalesces, it does not cache.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """Returns (result, shared) where `shared` is True if another call ran `fn`."""
+        loop = asyncio.get_running_loop()
+        fut = self._inflight.get(key)
+        if fut is not None and not fut.done() and fut.get_loop() is loop:
+            self.joined += 1
+            return await asyncio.shield(fut), True
+
+        fut = asyncio.ensure_future(fn())
+        self._inflight[key] = fut
+        self.started += 1
+
+        def _forget(done: asyncio.Future) -> None:
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            if not done.cancelled():
+                done.exception()  # mark retrieved when every caller has gone
+
+        fut.add_done_callback(_forget)
+        return await asyncio.shield(fut), False
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "started": self.started, "joined": self.joined}
+
+# -------------------------------
+# 2) Micro-batching
+# -------------------------------
+class MicroBatcher(Generic[T, R]):
+    """
+    Gathers items submitted within `window` seconds of the first one (or
+    until `max_batch` are waiting) and resolves them all with one
+    `fn(items) -> results` call, results in item order. A zero window calls
+    `fn` per item.
+    """
+
+    def __init__(self, fn: Callable[[List[T]], Awaitable[List[R]]], window: float, max_batch: int = 64):
+        self.fn = fn
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        if self.window <= 0:
+            self.batches += 1
+            self.items += 1
+            return (await self.fn([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._flush()  # never mix futures from two event loops in one batch
+            self._loop = loop
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            batch[0][1].get_loop().create_task(self._run(batch))
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            results = await self.fn([item for item, _ in batch])
+        except BaseException as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for (_, fut), result in zip(batch, results):
+            if not fut.done():
+                fut.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
@@ -12,15 +12,78 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     OPENAI_CHAT_MODEL: str = os.getenv("OPENAI_CHAT_MODEL", "gpt-4o-mini")
     OPENAI_EMBED_MODEL: str = os.getenv("OPENAI_EMBED_MODEL", "text-embedding-3-large")
+    # Index profile (see utils/index_profile.py): 0 = the model's native size,
+    # otherwise shortened embeddings via the API's `dimensions` parameter
+    EMBED_DIMENSIONS: int = int(os.getenv("EMBED_DIMENSIONS", "0"))
+    VECTOR_METRIC: str = os.getenv("VECTOR_METRIC", "cosine")
+    INDEX_PROFILE_STRICT: bool = os.getenv("INDEX_PROFILE_STRICT", "true").lower() == "true"  # refuse to start on mismatch
 
     # Pinecone
     PINECONE_API_KEY: str = os.getenv("PINECONE_API_KEY", "")
     PINECONE_INDEX_NAME: str = os.getenv("PINECONE_INDEX_NAME", "")
+    PINECONE_INDEX_HOST: str = os.getenv("PINECONE_INDEX_HOST", "")  # skips describe_index when set
+    PINECONE_REGION: str = os.getenv("PINECONE_REGION", "us-east-1")
+
+    # Vector store backend: "pinecone" or "local" (memory-mapped NumPy matrix)
+    VECTOR_STORE_BACKEND: str = os.getenv("VECTOR_STORE_BACKEND", "pinecone")
+    LOCAL_VECTOR_DIR: str = os.getenv("LOCAL_VECTOR_DIR", "backend/data/vectors")
+    LOCAL_VECTOR_DTYPE: str = os.getenv("LOCAL_VECTOR_DTYPE", "float32")  # float32 | float16 | int8 (part of the index profile)
 
     # Retrieval settings
     TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "5"))
     MIN_SCORE: float = float(os.getenv("RETRIEVAL_MIN_SCORE", "0.0"))
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))  # prompt context, in tokens
+    CONTEXT_DEDUP_THRESHOLD: float = float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.9"))
     INGEST_POLL_INTERVAL_MINUTES: int = 5  # default 5 min interval
+    # Background Drive sync in the API processes (one lock-elected leader runs it)
+    INGEST_WORKER_ENABLED: bool = os.getenv("INGEST_WORKER_ENABLED", "true").lower() == "true"
+    DRIVE_SYNC_MODE: str = os.getenv("DRIVE_SYNC_MODE", "changes")  # "changes" (incremental) | "full"
+
+    # Ingestion batching (OpenAI caps a request at 2048 inputs / 300k tokens)
+    EMBED_BATCH_MAX_INPUTS: int = int(os.getenv("EMBED_BATCH_MAX_INPUTS", "2048"))
+    EMBED_BATCH_MAX_TOKENS: int = int(os.getenv("EMBED_BATCH_MAX_TOKENS", "250000"))
+    EMBED_MAX_CONCURRENCY: int = int(os.getenv("EMBED_MAX_CONCURRENCY", "4"))
+    PINECONE_UPSERT_BATCH_SIZE: int = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "50"))
+
+    # Ingestion pipeline concurrency (INGEST_PARSE_WORKERS=0 parses in-thread)
+    INGEST_DOWNLOAD_WORKERS: int = int(os.getenv("INGEST_DOWNLOAD_WORKERS", "4"))
+    INGEST_PARSE_WORKERS: int = int(os.getenv("INGEST_PARSE_WORKERS", "2"))
+    INGEST_INDEX_WORKERS: int = int(os.getenv("INGEST_INDEX_WORKERS", "2"))
+    INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+
+    # Content-addressed chunk embedding store (empty path disables it)
+    EMBED_STORE_PATH: str = os.getenv("EMBED_STORE_PATH", "backend/data/cache/embeddings.sqlite")
+    EMBED_STORE_MAX_MB: int = int(os.getenv("EMBED_STORE_MAX_MB", "2048"))
+
+    # Local chunk-text store; the vector index then holds ids only (empty path keeps text in index metadata)
+    CHUNK_STORE_PATH: str = os.getenv("CHUNK_STORE_PATH", "backend/data/processed/chunk_store.sqlite")
+
+    # Query embedding cache (empty path disables the on-disk tier)
+    QUERY_CACHE_SIZE: int = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+    QUERY_CACHE_TTL_SECONDS: int = int(os.getenv("QUERY_CACHE_TTL_SECONDS", "86400"))
+    QUERY_CACHE_PATH: str = os.getenv("QUERY_CACHE_PATH", "backend/data/cache/query_embeddings.sqlite")
+    QUERY_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("QUERY_CACHE_DISK_MAX_ENTRIES", "100000"))
+
+    # Request coalescing: identical in-flight questions share one answer, and
+    # query embeddings arriving within the window go out as one request (0 disables batching)
+    RAG_COALESCE_ENABLED: bool = os.getenv("RAG_COALESCE_ENABLED", "true").lower() == "true"
+    QUERY_EMBED_BATCH_WINDOW_MS: float = float(os.getenv("QUERY_EMBED_BATCH_WINDOW_MS", "5"))
+    QUERY_EMBED_BATCH_MAX: int = int(os.getenv("QUERY_EMBED_BATCH_MAX", "64"))
+
+    # /ask/batch: max questions per request, concurrent chat completions and vector queries
+    ASK_BATCH_MAX_QUESTIONS: int = int(os.getenv("ASK_BATCH_MAX_QUESTIONS", "1000"))
+    ASK_BATCH_CONCURRENCY: int = int(os.getenv("ASK_BATCH_CONCURRENCY", "8"))
+    ASK_BATCH_QUERY_CONCURRENCY: int = int(os.getenv("ASK_BATCH_QUERY_CONCURRENCY", "32"))
+
+    # Semantic answer cache
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+    ANSWER_CACHE_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.92"))
+
+    # Opt-in request tracing (a request also needs the X-Debug-Trace header)
+    DEBUG_TRACE_ENABLED: bool = os.getenv("DEBUG_TRACE_ENABLED", "false").lower() == "true"
+    TRACE_DIR: str = os.getenv("TRACE_DIR", "backend/data/traces")
+    TRACE_PROFILE_INTERVAL_MS: float = float(os.getenv("TRACE_PROFILE_INTERVAL_MS", "5"))
 
     # CORS
     CORS_ALLOW_ORIGINS: str = os.getenv("CORS_ALLOW_ORIGINS", "*")
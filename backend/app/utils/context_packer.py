@@ -0,0 +1,155 @@
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import tiktoken
+
+SEPARATOR = "\n\n---\n\n"
+MIN_PARTIAL_TOKENS = 64  # don't bother squeezing in a tail shorter than this
+_OVERLAP_PROBE = 24      # characters of the next chunk used to find the seam
+_SHINGLE = 5             # tokens per shingle for near-duplicate detection
+
+@lru_cache
+def encoder_for(model: str):
+    """The model's tiktoken encoding, or cl100k_base if it is unknown or cannot be loaded."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except Exception as e:  # unknown model, or its BPE file could not be fetched
+        print(f"[packer][warn] Could not load the tiktoken encoding for {model} ({type(e).__name__}); "
+              "counting with cl100k_base")
+        return tiktoken.get_encoding("cl100k_base")
+
+@dataclass
+class _Segment:
+    key: str
+    metadata: Dict[str, Any]
+    text: str
+    score: float
+    first: Optional[int]
+    last: Optional[int]
+    merged: int = 1
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    segments: int
+    merged: int = 0       # chunks folded into a neighbour from the same source
+    duplicates: int = 0   # segments dropped as near-duplicates
+    skipped: int = 0      # segments that did not fit the budget
+    truncated: bool = False
+    sources: List[str] = field(default_factory=list)
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b` (0 if shorter than the probe)."""
+    if len(b) < _OVERLAP_PROBE:
+        return len(b) if a.endswith(b) else 0
+    probe = b[:_OVERLAP_PROBE]
+    pos = a.find(probe, max(0, len(a) - len(b)))
+    while pos != -1:
+        if b.startswith(a[pos:]):
+            return len(a) - pos
+        pos = a.find(probe, pos + 1)
+    return 0
+
+def _shingles(tokens: List[int]) -> set:
+    """Token `_SHINGLE`-grams; a text shorter than that is a single shingle."""
+    if len(tokens) <= _SHINGLE:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + _SHINGLE]) for i in range(len(tokens) - _SHINGLE + 1)}
+
+def _merge_group(segments: List[_Segment]) -> List[_Segment]:
+    """Fold chunks of one source that are adjacent or overlap into single segments."""
+    segments.sort(key=lambda s: (s.first is None, s.first or 0))
+    out = [segments[0]]
+    for seg in segments[1:]:
+        cur = out[-1]
+        if seg.text in cur.text:
+            cur.score = max(cur.score, seg.score)
+            cur.merged += seg.merged
+            continue
+        overlap = _overlap(cur.text, seg.text)
+        adjacent = cur.last is not None and seg.first is not None and seg.first - cur.last == 1
+        if overlap or adjacent:
+            cur.text = cur.text + seg.text[overlap:] if overlap else cur.text + "\n" + seg.text
+            cur.score = max(cur.score, seg.score)
+            cur.last = seg.last if seg.last is not None else cur.last
+            cur.merged += seg.merged
+        else:
+            out.append(seg)
+    return out
+
+def pack_context(
+    matches: List[Dict[str, Any]],
+    budget_tokens: int,
+    label: Callable[[Dict[str, Any]], str],
+    model: str = "gpt-4o-mini",
+    dedup_threshold: float = 0.9,
+) -> PackedContext:
+    """
+    Build the LLM context from retrieval matches within `budget_tokens`
+    (counted with the chat model's tiktoken encoding).
+
+    Chunks from the same source that are adjacent (consecutive
+    `chunk_index`) or share overlapping text are merged, so the overlap
+    `chunk_text` adds between windows is sent once. A segment whose own
+    token 5-gram shingles are mostly (`dedup_threshold`) contained in a
+    better-scoring one is dropped, as it adds nothing new; a longer segment
+    that contains a kept one is not. Shingles keep word order, so short
+    segments that merely share vocabulary are not dropped either. What is left is added
+    best score first, each as "[label]\\ntext"; the first segment that does
+    not fit is cut at a token boundary if enough budget remains, otherwise
+    smaller ones are tried.
+    """
+    enc = encoder_for(model)
+
+    groups: Dict[str, List[_Segment]] = {}
+    for m in matches:
+        md = m.get("metadata", {}) or {}
+        text = (md.get("text") or "").strip()
+        if not text:
+            continue
+        key = md.get("file_id") or md.get("source") or label(md)
+        idx = md.get("chunk_index")
+        idx = int(idx) if idx is not None else None
+        groups.setdefault(key, []).append(
+            _Segment(key, md, text, float(m.get("score", 0.0)), idx, idx))
+
+    segments = [seg for group in groups.values() for seg in _merge_group(group)]
+    segments.sort(key=lambda s: -s.score)
+    packed = PackedContext(text="", tokens=0, segments=0)
+    packed.merged = sum(s.merged - 1 for s in segments)
+
+    kept_shingles: List[set] = []
+    parts: List[str] = []
+    sep_tokens = len(enc.encode(SEPARATOR))
+    for seg in segments:
+        header = f"[{label(seg.metadata)}]\n"
+        body = enc.encode(seg.text)
+        shingles = _shingles(body)
+        if any(len(shingles & prev) >= dedup_threshold * len(shingles) for prev in kept_shingles):
+            packed.duplicates += 1
+            continue
+
+        cost = len(enc.encode(header)) + len(body) + (sep_tokens if parts else 0)
+        remaining = budget_tokens - packed.tokens
+        if cost > remaining:
+            room = remaining - (cost - len(body))
+            if packed.truncated or room < MIN_PARTIAL_TOKENS:
+                packed.skipped += 1
+                continue
+            body = body[:room]
+            cost = remaining
+            packed.truncated = True
+            text = enc.decode(body)
+        else:
+            text = seg.text
+
+        parts.append(header + text)
+        kept_shingles.append(shingles)
+        packed.tokens += cost
+        packed.sources.append(label(seg.metadata))
+
+    packed.text = SEPARATOR.join(parts)
+    packed.segments = len(parts)
+    return packed
@@ -1,25 +1,28 @@
-from pinecone import Pinecone, ServerlessSpec
-import os
-from dotenv import load_dotenv
+import sys
 
-load_dotenv()
-PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
-PINECONE_INDEX = os.getenv("PINECONE_INDEX_NAME")
-PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
+from backend.app.utils.vector_store import get_vector_store, live_pointer
+from backend.app.utils.index_profile import get_index_profile, live_profile
+from backend.app.utils.state_store import INGEST_WRITE_LOCK_PATH, FileLock, bump_ingest_version, forget_all_files
 
-pc = Pinecone(api_key=PINECONE_API_KEY)
+# --- Nothing else may write the index or the ingest state meanwhile ---
+lock = FileLock(INGEST_WRITE_LOCK_PATH)
+if not lock.acquire(60):
+    print(f"[FAIL] Another sync or reindex holds {INGEST_WRITE_LOCK_PATH} (pid {lock.holder()}); try again later.")
+    sys.exit(1)
 
-# --- Delete existing index if it exists ---
-if PINECONE_INDEX in pc.list_indexes().names():
-    print(f"🗑️ Deleting old index: {PINECONE_INDEX}")
-    pc.delete_index(PINECONE_INDEX)
+store = get_vector_store()
+profile = live_profile()
 
-# --- Recreate index with same config ---
-pc.create_index(
-    name=PINECONE_INDEX,
-    dimension=1536,
-    metric="cosine",
-    spec=ServerlessSpec(cloud="aws", region=PINECONE_REGION)
-)
+# --- Delete the live index and recreate it with the live index profile ---
+# get_vector_store() is the live generation and queries embed with live_profile(),
+# so recreating it with a configured profile that differs would break both.
+store.reset(dimension=profile.dimension, metric=profile.metric)
 
-print(f"✅ Created fresh index: {PINECONE_INDEX}")
+# --- Forget what was indexed, so the next sync re-indexes every file ---
+forget_all_files()
+bump_ingest_version()  # cached answers cite the deleted vectors
+
+print(f"✅ Created fresh index: {live_pointer()['target']}")
+print("ℹ️ Ingest state cleared; the next Drive sync re-indexes every file.")
+if get_index_profile() != profile:
+    print(f"ℹ️ The configured index profile differs from the live one ({profile}); run the reindex to switch.")
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+from .metrics import OPENAI_TOKENS
+
+# -------------------------------
+# 1) OpenAI embedding endpoint limits
+# -------------------------------
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 300_000
+MAX_TOKENS_PER_INPUT = 8191
+
+@lru_cache
+def _encoder(encoding_name: str = "cl100k_base"):
+    return tiktoken.get_encoding(encoding_name)
+
+def count_tokens(text: str) -> int:
+    return len(_encoder().encode(text or ""))
+
+def truncate_tokens(text: str, max_tokens: int = MAX_TOKENS_PER_INPUT) -> str:
+    """The first `max_tokens` tokens of `text` (all of it if it already fits)."""
+    ids = _encoder().encode(text or "")
+    return text if len(ids) <= max_tokens else _encoder().decode(ids[:max_tokens])
+
+def fit_inputs(texts: Sequence[str], counts: Sequence[int]) -> Tuple[List[str], List[int]]:
+    """
+    Truncate inputs over MAX_TOKENS_PER_INPUT: the endpoint rejects the whole
+    request for one oversized input, so without this a single long chunk
+    fails every chunk batched with it. The input's head is embedded instead.
+    """
+    texts, counts = list(texts), list(counts)
+    for i, n in enumerate(counts):
+        if n > MAX_TOKENS_PER_INPUT:
+            print(f"[embed][warn] Input {i} has {n} tokens; truncated to {MAX_TOKENS_PER_INPUT}")
+            texts[i] = truncate_tokens(texts[i])
+            counts[i] = MAX_TOKENS_PER_INPUT
+    return texts, counts
+
+# -------------------------------
+# 2) Packing
+# -------------------------------
+def pack_batches(
+    token_counts: Sequence[int],
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+) -> List[List[int]]:
+    """
+    Group item indices into consecutive batches that stay under both the
+    per-request input count and token budget. Order is preserved. Counts
+    over MAX_TOKENS_PER_INPUT are rejected; `fit_inputs` truncates them.
+    """
+    too_long = [i for i, n in enumerate(token_counts) if n > MAX_TOKENS_PER_INPUT]
+    if too_long:
+        raise ValueError(f"Inputs {too_long[:5]} exceed {MAX_TOKENS_PER_INPUT} tokens; truncate them with fit_inputs")
+    max_inputs = max(1, min(max_inputs, MAX_INPUTS_PER_REQUEST))
+    max_tokens = max(1, min(max_tokens, MAX_TOKENS_PER_REQUEST))
+
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, n in enumerate(token_counts):
+        if current and (len(current) >= max_inputs or current_tokens + n > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+# -------------------------------
+# 3) Batched embedding
+# -------------------------------
+def embed_texts(
+    client,
+    model: str,
+    texts: Sequence[str],
+    token_counts: Optional[Sequence[Optional[int]]] = None,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    concurrency: int = 4,
+    dimensions: Optional[int] = None,
+    store=None,
+) -> List[List[float]]:
+    """
+    Embed `texts` with as few requests as the limits allow, running up to
+    `concurrency` requests at once. Results come back in input order.
+
+    `token_counts` lets callers pass the counts `chunk_text` already recorded;
+    missing entries are counted with tiktoken. Inputs over the per-input
+    limit are truncated (see `fit_inputs`). With an `EmbeddingStore`,
+    texts already embedded by this model are served from it and only the
+    misses are sent (once per distinct text).
+    """
+    if not texts:
+        return []
+
+    embeddings: List[List[float]] = [None] * len(texts)  # type: ignore[list-item]
+    if store is not None:
+        embeddings = store.get_many(model, texts, dimensions)
+    todo: Dict[str, List[int]] = {}
+    for i, (text, vec) in enumerate(zip(texts, embeddings)):
+        if vec is None:
+            todo.setdefault(text, []).append(i)
+    if not todo:
+        return embeddings
+
+    pending = list(todo)
+    counts = []
+    for text in pending:
+        i = todo[text][0]
+        n = token_counts[i] if token_counts is not None and i < len(token_counts) else None
+        counts.append(int(n) if n is not None else count_tokens(text))
+
+    sent, counts = fit_inputs(pending, counts)
+    batches = pack_batches(counts, max_inputs=max_inputs, max_tokens=max_tokens)
+    extra = {"dimensions": dimensions} if dimensions else {}
+
+    def _create(indices: List[int]) -> List[List[float]]:
+        batch = [pending[i] for i in indices]
+        resp = client.embeddings.create(model=model, input=[sent[i] for i in indices], **extra)
+        if getattr(resp, "usage", None) is not None:
+            OPENAI_TOKENS.inc(resp.usage.total_tokens, model=model, kind="embedding")
+        vectors = [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+        if store is not None:
+            # store per batch so a later failure doesn't waste finished ones
+            store.put_many(model, batch, vectors, dimensions)
+        return vectors
+
+    if len(batches) == 1 or concurrency <= 1:
+        results = [_create(b) for b in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(batches))) as pool:
+            results = list(pool.map(_create, batches))
+
+    for indices, vectors in zip(batches, results):
+        for i, vec in zip(indices, vectors):
+            for j in todo[pending[i]]:
+                embeddings[j] = vec
+    return embeddings
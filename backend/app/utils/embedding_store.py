@@ -0,0 +1,165 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+from .config import get_settings
+from .metrics import CACHE_LOOKUPS
+
+_SQL_BATCH = 500  # stay well under SQLite's bound-parameter limit
+_TOUCH_FLUSH = 5000  # pending recency updates held before they are written
+
+def content_key(model: str, text: str, dimensions: Optional[int] = None) -> bytes:
+    """SHA-256 of (model, dimensions, text): identical chunks share one entry."""
+    return hashlib.sha256(f"{model}\x00{dimensions or 0}\x00{text}".encode("utf-8")).digest()
+
+class EmbeddingStore:
+    """
+    Content-addressed embedding cache in a SQLite file, shared by every
+    ingestion path (and by separate processes, via WAL).
+
+    Vectors are stored as float32 blobs. When the file's payload grows past
+    `max_bytes`, the least recently used entries are evicted down to 90%.
+    Reads only record recency in memory; it is written with the next
+    `put_many`, before an eviction, every `_TOUCH_FLUSH` hits, or on exit,
+    so a cache hit costs one SELECT and no write transaction.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 2 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._touched: Dict[bytes, float] = {}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self._bytes = self._total_bytes()
+        atexit.register(self.flush)
+
+    def _total_bytes(self) -> int:
+        return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, texts: Sequence[str], dimensions: Optional[int] = None) -> List[Optional[List[float]]]:
+        """Cached vectors in input order, None where missing."""
+        keys = [content_key(model, t, dimensions) for t in texts]
+        found: Dict[bytes, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = list(set(keys[i:i + _SQL_BATCH]))
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({marks})", batch).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            now = time.time()
+            self._touched.update((key, now) for key in found)
+            if len(self._touched) >= _TOUCH_FLUSH:
+                self._write_touches()
+                self._db.commit()
+
+            result = [found.get(k) for k in keys]
+            n_hits = sum(v is not None for v in result)
+            self.hits += n_hits
+            self.misses += len(result) - n_hits
+        CACHE_LOOKUPS.inc(n_hits, cache="embedding_store", result="hit")
+        CACHE_LOOKUPS.inc(len(result) - n_hits, cache="embedding_store", result="miss")
+        return result
+
+    def put_many(
+        self,
+        model: str,
+        texts: Sequence[str],
+        vectors: Sequence[Optional[List[float]]],
+        dimensions: Optional[int] = None,
+    ) -> None:
+        now = time.time()
+        rows = []
+        for text, vec in zip(texts, vectors):
+            if vec is None:
+                continue
+            blob = array("f", vec).tobytes()
+            rows.append((content_key(model, text, dimensions), blob, len(blob), now))
+        if not rows:
+            return
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, size, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._write_touches()
+            self._db.commit()
+            self._bytes += sum(r[2] for r in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _write_touches(self) -> None:
+        """Apply pending recency updates in the current transaction (caller holds the lock)."""
+        if not self._touched:
+            return
+        self._db.executemany(
+            "UPDATE embeddings SET last_used = MAX(last_used, ?) WHERE key = ?",
+            [(ts, key) for key, ts in self._touched.items()],
+        )
+        self._touched.clear()
+
+    def flush(self) -> None:
+        """Write any recency updates still held in memory."""
+        with self._lock:
+            self._write_touches()
+            self._db.commit()
+
+    def _evict(self) -> None:
+        self._write_touches()
+        # Other processes write too, so recount before deciding
+        self._bytes = self._total_bytes()
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._db.execute(
+                "SELECT key, size FROM embeddings ORDER BY last_used LIMIT ?", (_SQL_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append(key)
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            self._db.execute(f"DELETE FROM embeddings WHERE key IN ({','.join('?' * len(victims))})", victims)
+            self.evicted += len(victims)
+        self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self._bytes,
+                "evicted": self.evicted,
+            }
+
+@lru_cache
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """The configured store, or None when EMBED_STORE_PATH is empty."""
+    s = get_settings()
+    if not s.EMBED_STORE_PATH:
+        return None
+    return EmbeddingStore(s.EMBED_STORE_PATH, max_bytes=s.EMBED_STORE_MAX_MB * 1024 * 1024)
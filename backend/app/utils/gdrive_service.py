@@ -1,47 +1,174 @@
 import os
-import io
-from typing import List, Dict
+import hashlib
+import threading
+from typing import List, Dict, Optional, Tuple
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
+from googleapiclient.errors import HttpError
 
 # Load environment variables
 GOOGLE_SERVICE_ACCOUNT_JSON = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
+DOWNLOAD_CHUNK_BYTES = int(os.getenv("DRIVE_DOWNLOAD_CHUNK_BYTES", str(8 * 1024 * 1024)))
 
-def _get_drive_service():
-    """Authenticate with Google Drive API using service account JSON."""
-    if not GOOGLE_SERVICE_ACCOUNT_JSON or not os.path.exists(GOOGLE_SERVICE_ACCOUNT_JSON):
-        raise FileNotFoundError(f"Google service account JSON not found: {GOOGLE_SERVICE_ACCOUNT_JSON}")
+FILE_FIELDS = "id, name, mimeType, modifiedTime, size, md5Checksum, parents, trashed"
+
+_creds = None
+_creds_lock = threading.Lock()
+_local = threading.local()
 
-    creds = service_account.Credentials.from_service_account_file(
-        GOOGLE_SERVICE_ACCOUNT_JSON, scopes=SCOPES
-    )
-    return build("drive", "v3", credentials=creds)
+def _get_credentials():
+    global _creds
+    with _creds_lock:
+        if _creds is None:
+            if not GOOGLE_SERVICE_ACCOUNT_JSON or not os.path.exists(GOOGLE_SERVICE_ACCOUNT_JSON):
+                raise FileNotFoundError(f"Google service account JSON not found: {GOOGLE_SERVICE_ACCOUNT_JSON}")
+            _creds = service_account.Credentials.from_service_account_file(
+                GOOGLE_SERVICE_ACCOUNT_JSON, scopes=SCOPES
+            )
+        return _creds
+
+def _get_drive_service():
+    """
+    Authenticated Drive API client. Credentials are loaded once per process;
+    the client is built once per thread because httplib2 is not thread-safe.
+    """
+    service = getattr(_local, "service", None)
+    if service is None:
+        service = build("drive", "v3", credentials=_get_credentials(), cache_discovery=False)
+        _local.service = service
+    return service
 
 def list_files_in_folder(folder_id: str) -> List[Dict]:
-    """List all files in the specified Google Drive folder."""
+    """List all files in the specified Google Drive folder, following every page."""
+    service = _get_drive_service()
+    files: List[Dict] = []
+    page_token: Optional[str] = None
+    while True:
+        results = service.files().list(
+            q=f"'{folder_id}' in parents and trashed=false",
+            pageSize=1000,
+            pageToken=page_token,
+            fields=f"nextPageToken, files({FILE_FIELDS})"
+        ).execute()
+        files.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return files
+
+def get_file(file_id: str) -> Optional[Dict]:
+    """One file's metadata, or None if it no longer exists."""
+    service = _get_drive_service()
+    try:
+        return service.files().get(fileId=file_id, fields=FILE_FIELDS).execute()
+    except HttpError as e:
+        if e.resp.status == 404:
+            return None
+        raise
+
+def get_start_page_token() -> str:
+    """Changes-feed cursor for "now"; pass it to `list_changes` on the next poll."""
     service = _get_drive_service()
-    results = service.files().list(
-        q=f"'{folder_id}' in parents and trashed=false",
-        pageSize=1000,
-        fields="files(id, name, mimeType, modifiedTime)"
-    ).execute()
-    return results.get("files", [])
-
-def download_file(file_id: str, name: str, mime_type: str, dest_path: str) -> str:
-    """Download a file from Google Drive to local destination."""
+    return service.changes().getStartPageToken().execute()["startPageToken"]
+
+def list_changes(page_token: str) -> Tuple[List[Dict], str]:
+    """
+    Fetch every change since `page_token`.
+    Returns (changes, new_start_page_token); each change has `fileId`,
+    `removed` and, unless removed, the `file` resource.
+    """
     service = _get_drive_service()
+    changes: List[Dict] = []
+    while True:
+        results = service.changes().list(
+            pageToken=page_token,
+            pageSize=1000,
+            includeRemoved=True,
+            spaces="drive",
+            fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))"
+        ).execute()
+        changes.extend(results.get("changes", []))
+        if "newStartPageToken" in results:
+            return changes, results["newStartPageToken"]
+        page_token = results["nextPageToken"]
+
+def _md5_of(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _fetch_range(service, file_id: str, start: int, end: int) -> bytes:
+    """Bytes `start`..`end` (inclusive) of a file's content; empty past the end."""
     request = service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
+    request.headers["range"] = f"bytes={start}-{end}"
+    try:
+        data = request.execute(num_retries=3)
+    except HttpError as e:
+        if e.resp.status == 416:  # range starts at or past the end
+            return b""
+        raise
+    if len(data) > end - start + 1:
+        raise IOError(f"Drive ignored the Range header for {file_id}")
+    return data
 
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
+def download_file(
+    file_id: str,
+    name: str,
+    mime_type: str,
+    dest_path: str,
+    size: Optional[str | int] = None,
+    md5: Optional[str] = None,
+) -> str:
+    """
+    Stream a file from Google Drive to local destination in
+    DOWNLOAD_CHUNK_BYTES pieces, so memory stays flat regardless of size.
 
+    Bytes go to `<dest>.part` and are renamed into place only once complete
+    (and, when Drive reports an md5, verified). A `.part` left by an
+    interrupted run is resumed, with an explicit Range request, if it
+    belongs to the same remote checksum.
+    A destination that already matches `size` and `md5` is not re-downloaded.
+    """
     os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    with open(dest_path, "wb") as f:
-        f.write(fh.getvalue())
+    size = int(size) if size is not None else None
+
+    if md5 and os.path.exists(dest_path):
+        if (size is None or os.path.getsize(dest_path) == size) and _md5_of(dest_path) == md5:
+            return dest_path
+
+    part_path = f"{dest_path}.part"
+    marker_path = f"{part_path}.md5"  # remote checksum the partial bytes belong to
+    offset = 0
+    if os.path.exists(part_path):
+        previous = ""
+        if os.path.exists(marker_path):
+            with open(marker_path) as f:
+                previous = f.read().strip()
+        if md5 and previous == md5:
+            offset = os.path.getsize(part_path)
+        else:
+            os.remove(part_path)
+    with open(marker_path, "w") as f:
+        f.write(md5 or "")
+
+    service = _get_drive_service()
+    with open(part_path, "ab" if offset else "wb") as fh:
+        while size is None or offset < size:
+            data = _fetch_range(service, file_id, offset, offset + DOWNLOAD_CHUNK_BYTES - 1)
+            fh.write(data)
+            offset += len(data)
+            if len(data) < DOWNLOAD_CHUNK_BYTES:
+                break  # short read: end of file
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    if md5 and _md5_of(part_path) != md5:
+        os.remove(part_path)
+        os.remove(marker_path)
+        raise IOError(f"Checksum mismatch downloading {name} ({file_id})")
 
+    os.replace(part_path, dest_path)
+    os.remove(marker_path)
     return dest_path
@@ -0,0 +1,154 @@
+"""
+Index profile: the embedding model, output dimensions, similarity metric and
+local storage dtype every vector in an index was made with. Ingestion,
+retrieval, reindexing and index creation all read it from here, so query
+vectors and stored vectors cannot drift apart.
+
+    python -m backend.app.utils.index_profile
+
+prints the configured and live profiles and any mismatch with the index.
+"""
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from .config import get_settings
+
+# Output size of each model when no `dimensions` is requested
+NATIVE_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+# Models that accept the API's `dimensions` parameter (shortened embeddings)
+SHORTENABLE = {"text-embedding-3-large", "text-embedding-3-small"}
+METRICS = {"cosine", "dotproduct", "euclidean"}
+# What each vector store backend can score with (LocalVectorStore has no euclidean)
+BACKEND_METRICS = {"pinecone": METRICS, "local": {"cosine", "dotproduct"}}
+DTYPES = {"float32", "float16", "int8"}
+
+@dataclass(frozen=True)
+class IndexProfile:
+    model: str
+    dimension: int
+    metric: str = "cosine"
+    dtype: str = "float32"  # local backend storage; Pinecone always stores float32
+
+    @property
+    def request_dimensions(self) -> Optional[int]:
+        """The `dimensions` to send to the embeddings API (None for the model's native size)."""
+        return None if self.dimension == NATIVE_DIMENSIONS.get(self.model) else self.dimension
+
+    @property
+    def cache_key(self) -> str:
+        """Model name qualified by dimensions, for caches keyed by model."""
+        dims = self.request_dimensions
+        return f"{self.model}@{dims}" if dims else self.model
+
+    def embed_kwargs(self) -> Dict[str, Any]:
+        dims = self.request_dimensions
+        return {"dimensions": dims} if dims else {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def make_profile(
+    model: str,
+    dimensions: int = 0,
+    metric: str = "cosine",
+    dtype: str = "float32",
+    backend: Optional[str] = None,
+) -> IndexProfile:
+    """
+    Validate a profile; `dimensions=0` means the model's native size. With a
+    `backend`, the metric must also be one that backend supports.
+    """
+    native = NATIVE_DIMENSIONS.get(model)
+    if dimensions:
+        if model not in SHORTENABLE:
+            raise ValueError(f"{model} does not support shortened embeddings (EMBED_DIMENSIONS)")
+        if dimensions > native:
+            raise ValueError(f"EMBED_DIMENSIONS={dimensions} exceeds {model}'s {native} dimensions")
+    elif native is None:
+        raise ValueError(f"Unknown embedding model {model}; set EMBED_DIMENSIONS to its output size")
+    if metric not in METRICS:
+        raise ValueError(f"Unsupported VECTOR_METRIC: {metric}")
+    if backend is not None and metric not in BACKEND_METRICS.get(backend, METRICS):
+        raise ValueError(f"VECTOR_METRIC={metric} is not supported by the {backend} vector store")
+    if dtype not in DTYPES:
+        raise ValueError(f"Unsupported LOCAL_VECTOR_DTYPE: {dtype}")
+    if dtype == "int8" and metric != "cosine":
+        raise ValueError("int8 quantization requires the cosine metric")
+    return IndexProfile(model=model, dimension=dimensions or native, metric=metric, dtype=dtype)
+
+@lru_cache
+def get_index_profile() -> IndexProfile:
+    """The configured profile: what new indexes (reindex, index creation) are built with."""
+    s = get_settings()
+    return make_profile(s.OPENAI_EMBED_MODEL, s.EMBED_DIMENSIONS, s.VECTOR_METRIC, s.LOCAL_VECTOR_DTYPE,
+                        backend=s.VECTOR_STORE_BACKEND)
+
+def _profile_of(pointer: Dict[str, Any]) -> Optional[IndexProfile]:
+    if not pointer.get("model") or not pointer.get("dimension"):
+        return None
+    configured = get_index_profile()
+    native = NATIVE_DIMENSIONS.get(pointer["model"])
+    return make_profile(
+        pointer["model"],
+        0 if pointer["dimension"] == native else pointer["dimension"],
+        pointer.get("metric", configured.metric),
+        pointer.get("dtype", configured.dtype),
+    )
+
+def live_profile() -> IndexProfile:
+    """
+    The profile of the live index, as recorded by the reindex that built it
+    (the configured one before any reindex). Query and ingest embeddings use
+    this, so a reindex to a new profile switches them along with the index.
+    """
+    from .vector_store import live_pointer
+
+    return _profile_of(live_pointer()) or get_index_profile()
+
+def check_index_profile() -> Dict[str, List[str]]:
+    """
+    Compare the profiles with the live index. "errors": the index itself
+    reports a dimension or metric other than the live profile, so queries
+    and upserts would fail or mis-rank. "warnings": the configured profile
+    differs from the live one (a reindex is pending, or the config is
+    stale), or a local index is stored in another dtype than the profile
+    says (its header wins, so this only costs the expected savings).
+    """
+    from .vector_store import get_vector_store, live_pointer
+
+    configured, live = get_index_profile(), live_profile()
+    target = live_pointer()["target"]
+    errors: List[str] = []
+    warnings: List[str] = []
+
+    shape = get_vector_store().describe()
+    if shape is not None:
+        for key in ("dimension", "metric"):
+            if shape[key] != getattr(live, key):
+                errors.append(f"index {target} has {key}={shape[key]}, but embeddings use {key}={getattr(live, key)}")
+        if shape.get("dtype", live.dtype) != live.dtype:
+            warnings.append(f"index {target} stores {shape['dtype']} vectors, profile has {live.dtype}")
+    for key in ("model", "dimension", "metric", "dtype"):
+        if getattr(configured, key) != getattr(live, key):
+            warnings.append(f"configured {key}={getattr(configured, key)} differs from the live index's "
+                            f"{getattr(live, key)}; run the reindex to switch")
+    return {"errors": errors, "warnings": warnings}
+
+def main():
+    print(f"[INFO] Configured profile: {get_index_profile().to_dict()}")
+    print(f"[INFO] Live profile:       {live_profile().to_dict()}")
+    report = check_index_profile()
+    for warning in report["warnings"]:
+        print(f"[WARN] {warning}")
+    for error in report["errors"]:
+        print(f"[FAIL] {error}")
+    if not report["errors"]:
+        print("[OK] Live index matches its profile")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from .metrics import CACHE_LOOKUPS
+
+_WS = re.compile(r"\s+")
+
+def normalize_query(text: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WS.sub(" ", (text or "").casefold()).strip().rstrip("?!. ")
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings keyed by (model, normalized text).
+
+    Tier 1 is a bounded in-memory LRU; tier 2 is an optional SQLite file so
+    warm entries survive restarts. Both tiers honour the same TTL; the disk
+    tier drops expired rows and keeps at most `max_disk_entries` (newest
+    first), pruned on open and every `_PRUNE_EVERY` writes.
+    """
+
+    _PRUNE_EVERY = 256
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 86400,
+        disk_path: Optional[str] = None,
+        max_disk_entries: int = 100_000,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.max_disk_entries = max(1, max_disk_entries)
+        self._writes = 0
+        self._mem: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()  # memory tier and counters
+        self._db_lock = threading.Lock()  # the SQLite connection
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY, embedding BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS query_embeddings_created ON query_embeddings (created_at)")
+            self._db.commit()
+            with self._db_lock:
+                self._prune()
+
+    @staticmethod
+    def _key(text: str, model: str) -> str:
+        return f"{model}\x00{normalize_query(text)}"
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _mem_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            embedding, created_at = entry
+            if self._expired(created_at):
+                del self._mem[key]
+                return None
+            self._mem.move_to_end(key)
+            self.hits += 1
+        CACHE_LOOKUPS.inc(cache="query_embedding", result="hit")
+        return embedding
+
+    def _disk_get(self, key: str) -> Optional[List[float]]:
+        if self._db is not None:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT embedding, created_at FROM query_embeddings WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and not self._expired(row[1]):
+                embedding = array("f", row[0]).tolist()
+                with self._lock:
+                    self._remember(key, embedding, row[1])
+                    self.disk_hits += 1
+                CACHE_LOOKUPS.inc(cache="query_embedding", result="disk_hit")
+                return embedding
+        with self._lock:
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache="query_embedding", result="miss")
+        return None
+
+    def _disk_put(self, rows: List[tuple]) -> None:
+        """rows: (key, embedding, created_at), written in one transaction."""
+        if self._db is None or not rows:
+            return
+        with self._db_lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, embedding, created_at) VALUES (?, ?, ?)",
+                [(key, array("f", embedding).tobytes(), created_at) for key, embedding, created_at in rows],
+            )
+            self._db.commit()
+            before, self._writes = self._writes, self._writes + len(rows)
+            if before // self._PRUNE_EVERY != self._writes // self._PRUNE_EVERY:
+                self._prune()
+
+    def _remember_many(self, items: Dict[str, List[float]], model: str) -> List[tuple]:
+        now = time.time()
+        rows = [(self._key(text, model), embedding, now) for text, embedding in items.items()]
+        with self._lock:
+            for key, embedding, created_at in rows:
+                self._remember(key, embedding, created_at)
+        return rows
+
+    def get(self, text: str, model: str) -> Optional[List[float]]:
+        key = self._key(text, model)
+        cached = self._mem_get(key)
+        return cached if cached is not None else self._disk_get(key)
+
+    def put(self, text: str, model: str, embedding: List[float]) -> None:
+        self._disk_put(self._remember_many({text: embedding}, model))
+
+    # Event-loop variants: the memory tier is answered inline, the SQLite
+    # tier runs in a worker thread so disk I/O never blocks the loop.
+    async def aget(self, text: str, model: str) -> Optional[List[float]]:
+        key = self._key(text, model)
+        cached = self._mem_get(key)
+        if cached is not None:
+            return cached
+        if self._db is None:
+            return self._disk_get(key)  # counts the miss; no I/O
+        return await asyncio.to_thread(self._disk_get, key)
+
+    async def aget_many(self, texts: List[str], model: str) -> List[Optional[List[float]]]:
+        """`aget` for many texts, with one worker-thread hop for all the memory misses."""
+        keys = [self._key(text, model) for text in texts]
+        found = [self._mem_get(key) for key in keys]
+        missing = [i for i, vec in enumerate(found) if vec is None]
+        if missing:
+            def lookup() -> List[Optional[List[float]]]:
+                return [self._disk_get(keys[i]) for i in missing]
+
+            disk = await asyncio.to_thread(lookup) if self._db is not None else lookup()
+            for i, vec in zip(missing, disk):
+                found[i] = vec
+        return found
+
+    async def aput_many(self, items: Dict[str, List[float]], model: str) -> None:
+        """Cache {text: embedding} for `model`; one disk transaction off the loop."""
+        rows = self._remember_many(items, model)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_put, rows)
+
+    def _prune(self) -> None:
+        """Delete expired rows, then the oldest beyond `max_disk_entries`. Caller holds the db lock."""
+        if self.ttl_seconds > 0:
+            self._db.execute("DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM query_embeddings WHERE key IN ("
+            " SELECT key FROM query_embeddings ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        self._db.commit()
+
+    def _remember(self, key: str, embedding: List[float], created_at: float) -> None:
+        self._mem[key] = (embedding, created_at)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "entries": len(self._mem),
+            }
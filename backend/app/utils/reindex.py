@@ -0,0 +1,255 @@
+"""
+Blue/green reindex of the processed chunks.
+
+    python -m backend.app.utils.reindex [--batch-size 256] [--restart] [--keep-old]
+
+Builds the next index generation next to the live one while queries keep
+hitting the live index, checkpointing after every batch of files so a crash
+resumes where it stopped. Once built (and caught up with files that changed
+meanwhile) the vector count is verified, the index pointer is switched
+atomically and the previous generation is deleted.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from openai import OpenAI
+
+from backend.app.utils.config import get_settings
+from backend.app.utils.embed_batcher import embed_texts
+from backend.app.utils.embedding_store import get_embedding_store
+from backend.app.utils.index_profile import get_index_profile
+from backend.app.utils.chunk_store import get_chunk_store
+from backend.app.utils.state_store import (
+    INGEST_WRITE_LOCK_PATH, FileLock, load_state, bump_ingest_version, save_index_pointer,
+    load_reindex_checkpoint, save_reindex_checkpoint, clear_reindex_checkpoint,
+)
+from backend.app.utils.universal_preprocess import AGGREGATE_FILE, CHUNK_DIR
+from backend.app.utils.vector_store import chunk_to_vector, generation_target, live_pointer, open_vector_store
+
+# -------------------------------
+# 1) Settings & Clients
+# -------------------------------
+settings = get_settings()
+_oai = OpenAI(api_key=settings.OPENAI_API_KEY)
+
+MAX_CATCH_UP_PASSES = 3
+
+# -------------------------------
+# 2) Source: per-file chunk JSONL
+# -------------------------------
+def _source_files() -> Dict[str, Path]:
+    # all_chunks.jsonl is only a concatenation of these
+    return {str(p): p for p in sorted(CHUNK_DIR.glob("*.jsonl")) if p != AGGREGATE_FILE}
+
+def _fingerprint(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_size, st.st_mtime_ns]
+
+def _read_chunks(path: Path) -> List[Dict]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def _file_id(path: Path, chunks: List[Dict]) -> str | None:
+    """The Drive file id the chunks were written for; None when they carry none."""
+    if not chunks:
+        return path.stem
+    return chunks[0].get("file_id")
+
+# -------------------------------
+# 3) Build
+# -------------------------------
+def _new_checkpoint(live: Dict[str, Any]) -> Dict[str, Any]:
+    generation = live["generation"] + 1
+    return {
+        "backend": live["backend"],
+        "generation": generation,
+        "target": generation_target(generation),
+        "previous": live,
+        "profile": get_index_profile().to_dict(),
+        "model": get_index_profile().model,
+        "metric": get_index_profile().metric,
+        "dimension": None,  # set once the first batch is embedded and the index created
+        "files": {},        # path -> {"fingerprint", "file_id", "chunks"}
+    }
+
+def _build_pass(cp: Dict[str, Any], batch_size: int) -> int:
+    """Index every source file not yet in the checkpoint (or changed since). Returns files touched."""
+    store = open_vector_store(cp["target"])
+    sources = _source_files()
+    drive_ids = set(load_state())
+    touched = 0
+
+    def forget(key: str) -> None:
+        rec = cp["files"].pop(key)
+        if rec["chunks"] and cp["dimension"] is not None:
+            store.delete_by_file(rec["file_id"])
+
+    # Files deleted since they were indexed
+    for key in [k for k in cp["files"] if k not in sources]:
+        forget(key)
+        touched += 1
+    if touched:
+        save_reindex_checkpoint(cp)
+
+    batch: List[tuple] = []  # (key, fingerprint, file_id, chunks)
+
+    def flush() -> None:
+        if not batch:
+            return
+        chunks = [ch for _, _, _, file_chunks in batch for ch in file_chunks]
+        if chunks:
+            profile = get_index_profile()
+            embeddings = embed_texts(
+                _oai,
+                profile.model,
+                [ch["text"] for ch in chunks],
+                token_counts=[ch.get("tokens") for ch in chunks],
+                max_inputs=settings.EMBED_BATCH_MAX_INPUTS,
+                max_tokens=settings.EMBED_BATCH_MAX_TOKENS,
+                concurrency=settings.EMBED_MAX_CONCURRENCY,
+                dimensions=profile.request_dimensions,
+                store=get_embedding_store(),
+            )
+            if len(embeddings[0]) != profile.dimension:
+                raise RuntimeError(f"{profile.model} returned {len(embeddings[0])}-d vectors, profile expects {profile.dimension}")
+            if cp["dimension"] is None:
+                cp["dimension"] = profile.dimension
+                store.reset(dimension=cp["dimension"], metric=cp["metric"])
+                save_reindex_checkpoint(cp)
+            chunk_store = get_chunk_store()
+            vectors = []
+            i = 0
+            for _, _, file_id, file_chunks in batch:
+                if chunk_store is not None:
+                    chunk_store.put_many(file_chunks, file_id)
+                for ch in file_chunks:
+                    vectors.append(chunk_to_vector(ch, embeddings[i], file_id, include_text=chunk_store is None))
+                    i += 1
+            store.upsert(vectors)
+        for key, fingerprint, file_id, file_chunks in batch:
+            cp["files"][key] = {
+                "fingerprint": fingerprint,
+                "file_id": file_id,
+                "chunks": len({ch["id"] for ch in file_chunks}),
+            }
+        save_reindex_checkpoint(cp)
+        print(f"[OK] {len(cp['files'])}/{len(sources)} files indexed into {cp['target']}")
+        batch.clear()
+
+    for key, path in sources.items():
+        fingerprint = _fingerprint(path)  # taken before reading: a concurrent rewrite shows up next pass
+        if cp["files"].get(key, {}).get("fingerprint") == fingerprint:
+            continue
+        if key in cp["files"]:
+            forget(key)  # changed since it was indexed
+        chunks = _read_chunks(path)
+        file_id = _file_id(path, chunks)
+        if file_id is None:
+            # Not written by a Drive sync: delete_by_file and the sync's
+            # manifests could never match these vectors, so they would go stale
+            print(f"[SKIP] {path.name}: chunks have no file_id; run the Drive sync to index this file")
+            file_id, chunks = path.stem, []
+        elif chunks and file_id not in drive_ids:
+            chunks = []  # removed from Drive; its chunk file is left behind
+        batch.append((key, fingerprint, file_id, chunks))
+        touched += 1
+        if sum(len(b[3]) for b in batch) >= batch_size:
+            flush()
+    flush()
+    return touched
+
+# -------------------------------
+# 4) Verify, switch, collect
+# -------------------------------
+def _verify(cp: Dict[str, Any], timeout: float) -> int:
+    """Wait for the new index to report the expected vector count (Pinecone stats lag writes)."""
+    expected = sum(rec["chunks"] for rec in cp["files"].values())
+    store = open_vector_store(cp["target"])
+    deadline = time.monotonic() + timeout
+    while True:
+        actual = store.count()
+        if actual == expected:
+            return actual
+        if time.monotonic() >= deadline:
+            raise RuntimeError(f"{cp['target']} holds {actual} vectors, expected {expected}; not switching")
+        time.sleep(2)
+
+def run_reindex(
+    batch_size: int = 256,
+    restart: bool = False,
+    keep_old: bool = False,
+    verify_timeout: float = 120.0,
+    gc_delay: float = 5.0,
+) -> Dict[str, Any]:
+    live = live_pointer()
+    cp = None if restart else load_reindex_checkpoint()
+    if cp is not None and (cp["backend"] != live["backend"] or cp["previous"]["target"] != live["target"]):
+        print(f"[WARN] Discarding checkpoint for {cp['target']}: the live index changed since it was written")
+        cp = None
+    if cp is not None and cp.get("profile") != get_index_profile().to_dict():
+        print(f"[WARN] Discarding checkpoint for {cp['target']}: the index profile changed since it was written")
+        cp = None
+
+    if cp is None:
+        cp = _new_checkpoint(live)
+        open_vector_store(cp["target"]).drop()  # leftovers of an abandoned run
+        save_reindex_checkpoint(cp)
+        print(f"[INFO] Building {cp['target']} (generation {cp['generation']}); live index stays {live['target']}")
+    else:
+        print(f"[INFO] Resuming {cp['target']}: {len(cp['files'])} files already indexed")
+
+    # First pass builds; later passes catch up with files changed meanwhile
+    for _ in range(MAX_CATCH_UP_PASSES):
+        if not _build_pass(cp, batch_size):
+            break
+    if cp["dimension"] is None:
+        raise RuntimeError(f"No chunks found under {CHUNK_DIR}; run universal_preprocess first")
+
+    count = _verify(cp, verify_timeout)
+    save_index_pointer({
+        "backend": cp["backend"],
+        "target": cp["target"],
+        "generation": cp["generation"],
+        "model": cp["model"],
+        "dimension": cp["dimension"],
+        "metric": cp["metric"],
+        "dtype": cp["profile"]["dtype"],
+        "switched_at": time.time(),
+    })
+    bump_ingest_version()  # cached answers came from the old index
+    clear_reindex_checkpoint()
+    print(f"[OK] Switched live index to {cp['target']} ({count} vectors)")
+
+    previous = cp["previous"]["target"]
+    if not keep_old and previous != cp["target"]:
+        time.sleep(gc_delay)  # let requests already routed to the old index finish
+        open_vector_store(previous).drop()
+        print(f"[OK] Deleted previous index {previous}")
+    return {"target": cp["target"], "generation": cp["generation"], "vectors": count, "previous": previous}
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Rebuild the vector index without downtime.")
+    parser.add_argument("--batch-size", type=int, default=256, help="chunks embedded and upserted per checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint and start over")
+    parser.add_argument("--keep-old", action="store_true", help="keep the previous index after switching")
+    parser.add_argument("--verify-timeout", type=float, default=120.0, help="seconds to wait for the vector count")
+    parser.add_argument("--lock-wait", type=float, default=60.0,
+                        help="seconds to wait for a running sync to release the ingest lock")
+    args = parser.parse_args(argv)
+
+    lock = FileLock(INGEST_WRITE_LOCK_PATH)
+    if not lock.acquire(args.lock_wait):
+        print(f"[FAIL] Another sync or reindex holds {INGEST_WRITE_LOCK_PATH} (pid {lock.holder()}); try again later.")
+        sys.exit(1)
+    try:
+        run_reindex(args.batch_size, args.restart, args.keep_old, args.verify_timeout)
+    except RuntimeError as e:
+        print(f"[FAIL] {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,330 @@
 import json
 import os
-from typing import Dict
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
 
-STATE_PATH = "backend/data/processed/processed_files.json"
+try:
+    import fcntl
+except ImportError:  # Windows dev server: one process, nothing to elect
+    fcntl = None
+
+INGEST_DB_PATH = "backend/data/processed/ingest_state.sqlite"
+STATE_PATH = "backend/data/processed/processed_files.json"  # legacy, imported once into INGEST_DB_PATH
+VERSION_PATH = "backend/data/processed/ingest_version"
+MANIFEST_DIR = "backend/data/processed/manifests"  # legacy, imported once into INGEST_DB_PATH
+DRIVE_TOKEN_PATH = "backend/data/processed/drive_changes_token"
+INDEX_POINTER_PATH = "backend/data/processed/index_pointer.json"
+REINDEX_CHECKPOINT_PATH = "backend/data/processed/reindex_checkpoint.json"
+INGEST_LOCK_PATH = "backend/data/processed/ingest.lock"  # held by the API's ingest leader for its lifetime
+INGEST_WRITE_LOCK_PATH = "backend/data/processed/ingest_write.lock"  # held only while a sync or reindex writes
+INGEST_STATUS_PATH = "backend/data/processed/ingest_status.json"
+
+# -------------------------------
+# Per-file ingest state (SQLite, WAL)
+# -------------------------------
+# One row per Drive file, committed as soon as that file finishes, so a
+# crash loses at most the files in flight. status is "indexed", "empty"
+# (no chunks), "failed" (retried next sync) or "pending" (chunks indexed,
+# file not finished). chunk_ids is the manifest of what is in the index.
+_db_lock = threading.RLock()  # _db() takes it while importing legacy state
+
+@lru_cache
+def _db() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(INGEST_DB_PATH), exist_ok=True)
+    db = sqlite3.connect(INGEST_DB_PATH, check_same_thread=False, timeout=30)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS files ("
+        " file_id TEXT PRIMARY KEY, name TEXT, modified_time TEXT, status TEXT NOT NULL,"
+        " content_hash TEXT, chunk_ids TEXT, chunks INTEGER, error TEXT, timings TEXT, updated_at REAL)"
+    )
+    db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+    db.commit()
+    with _db_lock:
+        _import_legacy(db)
+    return db
+
+def _import_legacy(db: sqlite3.Connection) -> None:
+    """One-time import of processed_files.json and the per-file manifest JSONs."""
+    if db.execute("SELECT 1 FROM meta WHERE key = 'legacy_imported'").fetchone():
+        return
+    state: Dict[str, str] = {}
+    if os.path.exists(STATE_PATH):
+        try:
+            with open(STATE_PATH, "r") as f:
+                state = json.load(f)
+        except json.JSONDecodeError:
+            print(f"[WARN] {STATE_PATH} is corrupt; files in it will be re-synced.")
+    rows = {fid: [fid, mtime, "indexed", None] for fid, mtime in state.items()}
+    if os.path.isdir(MANIFEST_DIR):
+        for name in os.listdir(MANIFEST_DIR):
+            if not name.endswith(".json"):
+                continue
+            with open(os.path.join(MANIFEST_DIR, name), "r") as f:
+                chunk_ids = json.load(f)
+            fid = name[:-len(".json")]
+            rows.setdefault(fid, [fid, None, "pending", None])[3] = json.dumps(chunk_ids)
+    with db:
+        db.executemany(
+            "INSERT OR IGNORE INTO files (file_id, modified_time, status, chunk_ids, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            [(*row, time.time()) for row in rows.values()],
+        )
+        # another process may have imported between our check and here; its marker stands
+        db.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('legacy_imported', ?)", (str(time.time()),))
 
 def load_state() -> Dict[str, str]:
-    if not os.path.exists(STATE_PATH):
-        return {}
-    with open(STATE_PATH, "r") as f:
+    """{file_id: modifiedTime} of files finished (indexed or empty); failed and pending ones are retried."""
+    with _db_lock:
+        rows = _db().execute("SELECT file_id, modified_time FROM files WHERE status IN ('indexed', 'empty')").fetchall()
+    return dict(rows)
+
+def known_file_ids() -> set:
+    """Every file with a row, finished or not (what removal detection must clean up)."""
+    with _db_lock:
+        return {row[0] for row in _db().execute("SELECT file_id FROM files")}
+
+def unfinished_file_ids() -> set:
+    """Files whose last sync failed or did not finish; the changes feed will not list them again."""
+    with _db_lock:
+        return {row[0] for row in _db().execute("SELECT file_id FROM files WHERE status IN ('failed', 'pending')")}
+
+def load_file_record(file_id: str) -> Dict[str, Any] | None:
+    with _db_lock:
+        cur = _db().execute("SELECT * FROM files WHERE file_id = ?", (file_id,))
+        row = cur.fetchone()
+        names = [c[0] for c in cur.description]
+    if row is None:
+        return None
+    record = dict(zip(names, row))
+    for key in ("chunk_ids", "timings"):
+        if record[key] is not None:
+            record[key] = json.loads(record[key])
+    return record
+
+def record_file(
+    file_id: str,
+    name: str | None,
+    modified_time: str | None,
+    status: str,
+    content_hash: str | None = None,
+    chunks: int = 0,
+    error: str | None = None,
+    timings: Dict[str, float] | None = None,
+) -> None:
+    """Commit one file's outcome; its chunk-id manifest is left as is."""
+    with _db_lock, _db() as db:
+        db.execute(
+            "INSERT INTO files (file_id, name, modified_time, status, content_hash, chunks, error, timings, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (file_id) DO UPDATE SET name = excluded.name, modified_time = excluded.modified_time,"
+            " status = excluded.status, content_hash = COALESCE(excluded.content_hash, files.content_hash),"
+            " chunks = excluded.chunks, error = excluded.error, timings = excluded.timings, updated_at = excluded.updated_at",
+            (file_id, name, modified_time, status, content_hash, chunks, error,
+             json.dumps(timings) if timings is not None else None, time.time()),
+        )
+
+def forget_file(file_id: str) -> None:
+    """Drop a file's row (and manifest) once it has been removed from the index."""
+    with _db_lock, _db() as db:
+        db.execute("DELETE FROM files WHERE file_id = ?", (file_id,))
+
+def forget_all_files() -> None:
+    """
+    Drop every file's row and manifest and the changes cursor, after the
+    index was emptied: the next sync then lists and re-indexes every file.
+    """
+    with _db_lock, _db() as db:
+        db.execute("DELETE FROM files")
+    clear_drive_token()
+
+def mark_for_resync(file_id: str, stale_chunk_ids: List[str]) -> None:
+    """
+    Add ids to a file's manifest and mark it "pending", so its next sync
+    re-chunks it and deletes those ids as stale.
+    """
+    with _db_lock:
+        chunk_ids = list(dict.fromkeys((load_manifest(file_id) or []) + list(stale_chunk_ids)))
+        with _db() as db:
+            db.execute(
+                "INSERT INTO files (file_id, status, chunk_ids, updated_at) VALUES (?, 'pending', ?, ?)"
+                " ON CONFLICT (file_id) DO UPDATE SET status = 'pending', chunk_ids = excluded.chunk_ids,"
+                " updated_at = excluded.updated_at",
+                (file_id, json.dumps(chunk_ids), time.time()),
+            )
+
+def get_meta(key: str) -> str | None:
+    with _db_lock:
+        row = _db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def set_meta(key: str, value: str) -> None:
+    with _db_lock, _db() as db:
+        db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def ingest_state_counts() -> Dict[str, int]:
+    with _db_lock:
+        return dict(_db().execute("SELECT status, COUNT(*) FROM files GROUP BY status").fetchall())
+
+def get_ingest_version() -> int:
+    """Monotonic counter bumped whenever ingestion changes the index contents."""
+    try:
+        with open(VERSION_PATH, "r") as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+def bump_ingest_version() -> int:
+    version = get_ingest_version() + 1
+    os.makedirs(os.path.dirname(VERSION_PATH), exist_ok=True)
+    tmp_path = f"{VERSION_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(str(version))
+    os.replace(tmp_path, VERSION_PATH)
+    return version
+
+def load_drive_token() -> str | None:
+    """Drive changes-feed page token saved by the last successful incremental sync."""
+    if not os.path.exists(DRIVE_TOKEN_PATH):
+        return None
+    with open(DRIVE_TOKEN_PATH, "r") as f:
+        return f.read().strip() or None
+
+def clear_drive_token() -> None:
+    """Forget the changes-feed cursor, so the next sync lists the whole folder."""
+    if os.path.exists(DRIVE_TOKEN_PATH):
+        os.remove(DRIVE_TOKEN_PATH)
+
+def save_drive_token(token: str) -> None:
+    os.makedirs(os.path.dirname(DRIVE_TOKEN_PATH), exist_ok=True)
+    tmp_path = f"{DRIVE_TOKEN_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(token)
+    os.replace(tmp_path, DRIVE_TOKEN_PATH)
+
+def load_manifest(file_id: str) -> List[str] | None:
+    """Chunk ids last indexed for a file, or None if it was never indexed with a manifest."""
+    with _db_lock:
+        row = _db().execute("SELECT chunk_ids FROM files WHERE file_id = ?", (file_id,)).fetchone()
+    if row is None or row[0] is None:
+        return None
+    return json.loads(row[0])
+
+def save_manifest(file_id: str, chunk_ids: List[str]) -> None:
+    with _db_lock, _db() as db:
+        db.execute(
+            "INSERT INTO files (file_id, status, chunk_ids, updated_at) VALUES (?, 'pending', ?, ?)"
+            " ON CONFLICT (file_id) DO UPDATE SET chunk_ids = excluded.chunk_ids, updated_at = excluded.updated_at",
+            (file_id, json.dumps(chunk_ids), time.time()),
+        )
+
+def _write_json_atomic(path: str, data: Any) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def load_index_pointer() -> Dict[str, Any] | None:
+    """
+    The live index generation: {"backend", "target", "generation"}. None
+    until the first reindex switches away from the configured index.
+    """
+    if not os.path.exists(INDEX_POINTER_PATH):
+        return None
+    with open(INDEX_POINTER_PATH, "r") as f:
         return json.load(f)
 
-def save_state(state: Dict[str, str]) -> None:
-    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH, "w") as f:
-        json.dump(state, f, indent=2, ensure_ascii=False)
+def save_index_pointer(pointer: Dict[str, Any]) -> None:
+    _write_json_atomic(INDEX_POINTER_PATH, pointer)
+
+def load_reindex_checkpoint() -> Dict[str, Any] | None:
+    if not os.path.exists(REINDEX_CHECKPOINT_PATH):
+        return None
+    with open(REINDEX_CHECKPOINT_PATH, "r") as f:
+        return json.load(f)
+
+def save_reindex_checkpoint(checkpoint: Dict[str, Any]) -> None:
+    _write_json_atomic(REINDEX_CHECKPOINT_PATH, checkpoint)
+
+def clear_reindex_checkpoint() -> None:
+    if os.path.exists(REINDEX_CHECKPOINT_PATH):
+        os.remove(REINDEX_CHECKPOINT_PATH)
+
+def load_ingest_status() -> Dict[str, Any] | None:
+    """Last status the ingest leader published (state, progress, last result)."""
+    try:
+        with open(INGEST_STATUS_PATH, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def save_ingest_status(status: Dict[str, Any]) -> None:
+    _write_json_atomic(INGEST_STATUS_PATH, status)
+
+# -------------------------------
+# Ingest locks
+# -------------------------------
+# INGEST_LOCK_PATH elects which API process runs the scheduled syncs.
+# INGEST_WRITE_LOCK_PATH is taken around each sync, by the leader or a CLI
+# sync or reindex, so only one of them writes the index and this state at
+# a time; between the leader's syncs a CLI can run.
+class FileLock:
+    """
+    Non-blocking exclusive flock on a file, held until `release()` or until
+    the process exits, however it exits (the OS drops it).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
+
+    def try_acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fh = open(self.path, "a+")
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(f"{os.getpid()}\n")
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def acquire(self, wait: float) -> bool:
+        """Retry for up to `wait` seconds; False if another process still holds the lock."""
+        deadline = time.monotonic() + wait
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.5)
+        return True
+
+    def holder(self) -> Optional[int]:
+        """Pid the current holder wrote into the lock file, if any."""
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self) -> None:
+        if self._fh is not None:
+            self._fh.close()  # closing the descriptor drops the flock
+            self._fh = None
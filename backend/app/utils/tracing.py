@@ -0,0 +1,195 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Counts
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import get_settings
+
+# -------------------------------
+# 1) Span tree
+# -------------------------------
+class Span:
+    """A timed step with attributes (payload sizes, counts) and child spans."""
+
+    __slots__ = ("name", "attrs", "children", "start", "end")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.children: List["Span"] = []
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attrs": self.attrs,
+            "children": [c.to_dict(origin) for c in self.children],
+        }
+
+class _NullSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+_NULL_SPAN = _NullSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+@contextmanager
+def span(name: str, /, **attrs: Any) -> Iterator[Span]:
+    """
+    Child span of the active trace. When nothing is being traced this costs
+    one ContextVar lookup and yields a span whose `set` does nothing, so
+    call sites can stay in place.
+    """
+    parent = _current.get()
+    if parent is None:
+        yield _NULL_SPAN
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    token = _current.set(child)
+    try:
+        yield child
+    finally:
+        child.end = time.perf_counter()
+        _current.reset(token)
+
+# -------------------------------
+# 2) Sampling profiler
+# -------------------------------
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    if "site-packages/" in filename:
+        filename = filename.split("site-packages/", 1)[1]
+    elif "/lib/python" in filename:
+        filename = filename.split("/lib/python", 1)[1].split("/", 1)[-1]
+    elif "/backend/" in filename:
+        filename = "backend/" + filename.split("/backend/", 1)[1]
+    return f"{filename}:{code.co_name}"
+
+class SamplingProfiler:
+    """
+    Samples one thread's stack every `interval` seconds from a background
+    thread and counts identical stacks. For an async request that thread is
+    the event loop, so samples include anything else the loop ran meanwhile.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks: "_Counts[str]" = _Counts()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                names.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def start(self) -> "SamplingProfiler":
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def to_dict(self, top: int = 200) -> Dict[str, Any]:
+        """Collapsed stacks ("outer;...;inner" -> samples), ready for flamegraph tools."""
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "stacks": [{"stack": s, "count": n} for s, n in self.stacks.most_common(top)],
+        }
+
+# -------------------------------
+# 3) Capturing a trace
+# -------------------------------
+class Trace:
+    def __init__(self, name: str, **attrs: Any):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.started_at = time.time()
+        self.root = Span(name, attrs)
+        self.profile: Optional[SamplingProfiler] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "spans": self.root.to_dict(self.root.start),
+            "profile": self.profile.to_dict() if self.profile is not None else None,
+        }
+
+@contextmanager
+def capture(name: str, /, profile: bool = False, **attrs: Any) -> Iterator[Trace]:
+    """
+    Trace everything run inside the block (in this thread / task) under a
+    root span `name`; with `profile`, also sample this thread's stacks.
+    """
+    trace = Trace(name, **attrs)
+    if profile:
+        interval = get_settings().TRACE_PROFILE_INTERVAL_MS / 1000
+        trace.profile = SamplingProfiler(interval=interval).start()
+    token = _current.set(trace.root)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+        trace.root.end = time.perf_counter()
+        if trace.profile is not None:
+            trace.profile.stop()
+
+def store_trace(trace: Trace) -> str:
+    """Write the trace to TRACE_DIR/<id>.json and return the path."""
+    trace_dir = get_settings().TRACE_DIR
+    os.makedirs(trace_dir, exist_ok=True)
+    path = os.path.join(trace_dir, f"{trace.id}.json")
+    with open(path, "w") as f:
+        json.dump(trace.to_dict(), f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+# -------------------------------
+# 4) Request opt-in
+# -------------------------------
+TRACE_HEADER = "X-Debug-Trace"
+
+@dataclass
+class TraceOptions:
+    profile: bool = False
+    store: bool = False
+
+def trace_options(header: Optional[str]) -> Optional[TraceOptions]:
+    """
+    Parse the `X-Debug-Trace` header: any non-empty value turns tracing on
+    for that request, and the comma-separated words `profile` and `store`
+    add the sampling profiler and save the trace instead of returning it.
+    None unless DEBUG_TRACE_ENABLED is set.
+    """
+    if not header or not get_settings().DEBUG_TRACE_ENABLED:
+        return None
+    words = {w.strip().lower() for w in header.split(",")}
+    return TraceOptions(profile="profile" in words, store="store" in words)
@@ -1,14 +1,24 @@
+import argparse
+import hashlib
 import json
+import multiprocessing as mp
+import os
 import re
-import uuid
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Iterable
+from typing import List, Dict, Iterable, Iterator, Tuple
 
+import numpy as np
 from bs4 import BeautifulSoup
 from pypdf import PdfReader
 from markdown import markdown
 import tiktoken
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from backend.app.utils.state_store import known_file_ids
 
 # -------------------------------
 # 1) Directory Paths
@@ -24,13 +34,67 @@ INTERIM_DIR.mkdir(parents=True, exist_ok=True)
 # -------------------------------
 # 2) Loaders for different file types
 # -------------------------------
-def load_pdf(path: Path) -> str:
+# Pages per worker task when a PDF is extracted across processes, and the
+# page count below which a pool is not worth its startup cost.
+PDF_PAGE_WORKERS = int(os.getenv("PDF_PAGE_WORKERS", "0"))
+PDF_PAGES_PER_TASK = 16
+PDF_PARALLEL_MIN_PAGES = 64
+
+_worker_reader = None
+
+def _init_pdf_worker(path: str) -> None:
+    global _worker_reader
+    _worker_reader = PdfReader(path)
+
+def _extract_page_range(start: int, stop: int) -> List[str]:
+    texts = []
+    for i in range(start, stop):
+        try:
+            texts.append(_worker_reader.pages[i].extract_text() or "")
+        except Exception as e:
+            print(f"[WARN] Failed to read page {i + 1}: {e}")
+            texts.append("")
+    return texts
+
+def iter_pdf_pages(path: Path, workers: int | None = None) -> Iterator[str]:
+    """
+    Yield the text of each page in order. With `workers` > 1 and a long
+    enough document, page ranges are extracted in a process pool with at
+    most two ranges per worker in flight, so memory stays bounded.
+    """
+    workers = PDF_PAGE_WORKERS if workers is None else workers
     try:
         reader = PdfReader(str(path))
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
+        n_pages = len(reader.pages)
     except Exception as e:
         print(f"[WARN] Failed to read PDF {path}: {e}")
-        return ""
+        return
+
+    if workers <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        for i, page in enumerate(reader.pages):
+            try:
+                yield page.extract_text() or ""
+            except Exception as e:
+                print(f"[WARN] Failed to read page {i + 1} of {path}: {e}")
+                yield ""
+        return
+
+    del reader  # each worker opens its own
+    ranges = deque((i, min(i + PDF_PAGES_PER_TASK, n_pages)) for i in range(0, n_pages, PDF_PAGES_PER_TASK))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_pdf_worker,
+        initargs=(str(path),),
+    ) as pool:
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < workers * 2:
+                pending.append(pool.submit(_extract_page_range, *ranges.popleft()))
+            yield from pending.popleft().result()
+
+def load_pdf(path: Path) -> str:
+    return "\n".join(iter_pdf_pages(path))
 
 def load_text(path: Path) -> str:
     return path.read_text(encoding="utf-8", errors="ignore")
@@ -48,6 +112,13 @@ def load_html(path: Path) -> str:
         tag.extract()
     return soup.get_text(separator="\n")
 
+def iter_text(path: Path, pdf_workers: int | None = None) -> Iterator[str]:
+    """Yield a file's text in pieces: page by page for PDFs, whole otherwise."""
+    if path.suffix.lower() == ".pdf":
+        yield from iter_pdf_pages(path, workers=pdf_workers)
+    else:
+        yield load_any(path)
+
 def load_any(path: Path) -> str:
     suffix = path.suffix.lower()
     if suffix == ".pdf":
@@ -63,72 +134,235 @@ def load_any(path: Path) -> str:
 # -------------------------------
 # 3) Cleaning text
 # -------------------------------
+_STRIP_CHARS = str.maketrans("", "", "\ufeff\u200b")
+_SPACES = re.compile(r"[ \t]{2,}")
+_NOISE_LINE = re.compile(r"https?://\S+|share|login|sign in|subscribe", re.IGNORECASE)
+
+class TextCleaner:
+    """
+    Incremental cleaner: `feed` takes successive pieces of a document (each
+    ending at a line break, e.g. PDF pages) and returns their cleaned text.
+    Concatenating the outputs gives the cleaned document: zero-width
+    characters removed, runs of spaces/tabs collapsed, bare URLs and
+    share/login lines dropped, at most one blank line in a row, and no
+    leading or trailing blank lines.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._blank = False
+
+    def feed(self, text: str) -> str:
+        out = []
+        for line in _SPACES.sub(" ", text.translate(_STRIP_CHARS)).splitlines():
+            stripped = line.strip()
+            if not stripped:
+                self._blank = self._started
+                continue
+            if _NOISE_LINE.fullmatch(stripped):
+                continue
+            if self._started:
+                out.append("\n\n" if self._blank else "\n")
+            out.append(line)
+            self._started, self._blank = True, False
+        return "".join(out)
+
 def clean_text(text: str) -> str:
-    text = text.replace("\ufeff", "").replace("\u200b", "")
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"[ \t]{2,}", " ", text)
-
-    lines = []
-    for line in text.splitlines():
-        if re.fullmatch(r"https?://\S+", line.strip()):
-            continue
-        if line.strip().lower() in {"share", "login", "sign in", "subscribe"}:
-            continue
-        lines.append(line)
-    return "\n".join(lines).strip()
+    return TextCleaner().feed(text).strip()
 
 # -------------------------------
-# 4) Chunking with LangChain
+# 4) Token-native chunking
 # -------------------------------
+# Preferred cut points, strongest first. Patterns run over UTF-8 bytes so
+# their positions line up with token byte offsets directly.
+_BOUNDARIES = (
+    re.compile(rb"\n[ \t]*\n"),             # paragraph break
+    re.compile(rb"\n"),                      # line break
+    re.compile(rb"[.!?][\"')\]]?(?=\s)"),    # sentence end
+)
+
+@lru_cache
+def get_encoder(encoding_name: str = "cl100k_base"):
+    return tiktoken.get_encoding(encoding_name)
+
+@lru_cache
+def _token_byte_lengths(enc) -> np.ndarray:
+    """Byte length of every token id, built once per encoder."""
+    lengths = np.zeros(enc.n_vocab, dtype=np.int64)
+    for token in range(enc.n_vocab):
+        try:
+            lengths[token] = len(enc.decode_single_token_bytes(token))
+        except KeyError:
+            pass  # unused ids between the BPE ranks and special tokens
+    return lengths
+
+def split_token_windows(
+    data: bytes,
+    tokens: List[int],
+    enc,
+    chunk_tokens: int = 350,
+    overlap: int = 50,
+) -> List[Tuple[int, int, int]]:
+    """
+    Choose chunk windows over an already-encoded document.
+    Returns (start_byte, end_byte, n_tokens) per window.
+
+    Each window holds at most `chunk_tokens` tokens. It ends at the last
+    paragraph break inside the budget, else the last line break, else the
+    last sentence end, else the hard token limit; only boundaries in the
+    back half of the window count, so chunks stay at least half full.
+    Consecutive windows share `overlap` tokens.
+    """
+    n = len(tokens)
+    if n == 0:
+        return []
+    if n <= chunk_tokens:
+        return [(0, len(data), n)]
+
+    # Byte offset where each token starts (plus end sentinel)
+    starts = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(_token_byte_lengths(enc)[np.fromiter(tokens, dtype=np.int64, count=n)], out=starts[1:])
+
+    windows = []
+    start = 0
+    min_len = max(1, chunk_tokens // 2)
+    while True:
+        hard_end = start + chunk_tokens
+        if hard_end >= n:
+            windows.append((int(starts[start]), int(starts[n]), n - start))
+            return windows
+
+        # Last boundary of the strongest kind in the back half of the window
+        cut = hard_end
+        lo, hi = int(starts[start + min_len]), int(starts[hard_end])
+        for pattern in _BOUNDARIES:
+            last = None
+            for last in pattern.finditer(data, lo, hi):
+                pass
+            if last is not None:
+                # first token starting at/after the boundary, so it stays in this chunk
+                cut = int(starts[:hard_end + 1].searchsorted(last.end(), side="left"))
+                break
+        windows.append((int(starts[start]), int(starts[cut]), cut - start))
+        start = max(cut - overlap, start + 1)
+
+def make_chunk_id(doc_id: str, text: str, occurrence: int = 0) -> str:
+    """
+    Content-derived chunk id: `<doc_id>#<hash>`. `occurrence` counts earlier
+    chunks of the same document with identical text, so ids stay unique
+    without depending on where the chunk sits in the document.
+    """
+    digest = hashlib.sha1(f"{doc_id}\x00{occurrence}\x00{text}".encode("utf-8")).hexdigest()[:24]
+    return f"{doc_id}#{digest}"
+
+class TokenChunker:
+    """
+    Incremental form of `chunk_text`: `feed` cleaned text as it arrives and
+    collect the chunks it returns, then `close` for the rest. Only the
+    unfinished tail (at most about one window) is re-encoded between feeds,
+    so the whole document never has to be held as one string.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        title: str,
+        chunk_tokens: int = 350,
+        overlap: int = 50,
+        encoding_name: str = "cl100k_base",
+        doc_id: str | None = None,
+    ):
+        self.source = source
+        self.title = title
+        self.chunk_tokens = chunk_tokens
+        self.overlap = overlap
+        self.doc_id = doc_id
+        self._enc = get_encoder(encoding_name)
+        self._id_prefix = doc_id or source
+        self._flush_chars = chunk_tokens * 64  # ~16 windows of English text per encode
+        self._parts: List[str] = []
+        self._size = 0
+        self._seen: Dict[str, int] = {}
+        self._index = 0
+
+    def feed(self, text: str) -> List[Dict]:
+        if text:
+            self._parts.append(text)
+            self._size += len(text)
+        if self._size < self._flush_chars:
+            return []
+        return self._flush(final=False)
+
+    def close(self) -> List[Dict]:
+        return self._flush(final=True)
+
+    def _flush(self, final: bool) -> List[Dict]:
+        text = "".join(self._parts)
+        self._parts, self._size = [], 0
+        data = text.encode("utf-8")
+        tokens = self._enc.encode_ordinary(text)  # special-token text is treated as plain text
+        windows = split_token_windows(data, tokens, self._enc, self.chunk_tokens, self.overlap)
+
+        if not final and windows:
+            # The last window may still grow; carry it into the next feed
+            tail = data[windows.pop()[0]:].decode("utf-8", errors="ignore")
+            self._parts, self._size = [tail], len(tail)
+
+        chunks = []
+        for start, end, n_tokens in windows:
+            piece = data[start:end].decode("utf-8", errors="ignore").strip()
+            if piece:
+                chunks.append(self._make_chunk(piece, n_tokens))
+        return chunks
+
+    def _make_chunk(self, piece: str, n_tokens: int) -> Dict:
+        occurrence = self._seen.get(piece, 0)
+        self._seen[piece] = occurrence + 1
+        ch = {
+            "text": piece,
+            "source": self.source,
+            "title": self.title,
+            "tokens": n_tokens,
+            "id": make_chunk_id(self._id_prefix, piece, occurrence),
+            "chunk_index": self._index,
+        }
+        if self.doc_id is not None:
+            ch["file_id"] = self.doc_id
+        self._index += 1
+        return ch
+
 def chunk_text(
     text: str,
     source: str,
     title: str,
     chunk_tokens: int = 350,
     overlap: int = 50,
-    encoding_name: str = "cl100k_base"
+    encoding_name: str = "cl100k_base",
+    doc_id: str | None = None,
 ) -> List[Dict]:
-    """Split text into smaller chunks with metadata."""
-    enc = tiktoken.get_encoding(encoding_name)
-
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,        # max characters before splitting
-        chunk_overlap=200,      # ensures some context overlap
-        separators=["\n\n", "\n", " ", ""]
-    )
-    rough_chunks = splitter.split_text(text)
-
-    final_chunks = []
-    for ch in rough_chunks:
-        tokens = enc.encode(ch)
-        if len(tokens) <= chunk_tokens:
-            final_chunks.append({
-                "id": str(uuid.uuid4()),
-                "text": ch.strip(),
-                "source": source,
-                "title": title,
-                "tokens": len(tokens)
-            })
-        else:
-            start = 0
-            step = chunk_tokens - overlap
-            while start < len(tokens):
-                window = tokens[start:start + chunk_tokens]
-                piece = enc.decode(window).strip()
-                final_chunks.append({
-                    "id": str(uuid.uuid4()),
-                    "text": piece,
-                    "source": source,
-                    "title": title,
-                    "tokens": len(window)
-                })
-                start += step
-    return final_chunks
+    """
+    Split text into token-bounded chunks with metadata and deterministic ids.
+    The document is encoded once and chunk text is sliced from its bytes.
+    """
+    chunker = TokenChunker(source, title, chunk_tokens, overlap, encoding_name, doc_id)
+    return chunker.feed(text) + chunker.close()
 
 # -------------------------------
 # 5) Iterator for batch processing
 # -------------------------------
+def output_stem(path: Path) -> str:
+    """
+    Name of a raw file's interim text and chunk JSONL: its stem plus a short
+    hash of its path under RAW_DIR, so `a/notes.pdf` and `b/notes.txt` (or
+    two Drive files with one name) never write or reuse the same outputs.
+    """
+    resolved = Path(path).resolve()
+    try:
+        key = resolved.relative_to(RAW_DIR.resolve()).as_posix()
+    except ValueError:
+        key = resolved.as_posix()
+    return f"{Path(path).stem}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
 def iter_files() -> Iterable[Path]:
     for f in RAW_DIR.rglob("*"):
         if f.is_file():
@@ -138,64 +372,219 @@ def iter_files() -> Iterable[Path]:
 # -------------------------------
 # 6) Reusable function for single file
 # -------------------------------
-def process_file_to_chunks(file_path: str, chunk_tokens: int = 350, overlap: int = 50) -> List[Dict]:
+def process_file_to_chunks(
+    file_path: str,
+    chunk_tokens: int = 350,
+    overlap: int = 50,
+    doc_id: str | None = None,
+    pdf_workers: int | None = None,
+    timings: Dict[str, float] | None = None,
+) -> List[Dict]:
     """
     Process a single file: load, clean, chunk, and return chunks as a list of dicts.
     Saves interim text and per-file chunk JSONL for consistency.
+    `doc_id` (e.g. the Drive file id) seeds the chunk ids; defaults to the path.
+    PDFs are streamed page by page (`pdf_workers` > 1 extracts pages in a
+    process pool; defaults to PDF_PAGE_WORKERS).
+    If `timings` is given, seconds spent parsing (load + clean) and
+    chunking are added to its "parse" and "chunk" keys.
     """
     path = Path(file_path)
     if not path.exists() or not path.is_file():
         print(f"[SKIP] {file_path}: File not found")
         return []
 
-    raw_text = load_any(path)
-    if not raw_text.strip():
-        print(f"[SKIP] {file_path}: No extractable text")
-        return []
+    title = path.stem
+    cleaner = TextCleaner()
+    chunker = TokenChunker(
+        source=str(path), title=title,
+        chunk_tokens=chunk_tokens, overlap=overlap, doc_id=doc_id,
+    )
 
-    cleaned = clean_text(raw_text)
+    # Stream pages through cleaning and chunking; interim text (for
+    # reference/debugging) and per-file chunks JSONL are written as we go.
+    interim_path = INTERIM_DIR / f"{output_stem(path)}.txt"
+    out_file = CHUNK_DIR / f"{output_stem(path)}.jsonl"
+    chunks: List[Dict] = []
+    with interim_path.open("w", encoding="utf-8") as interim, out_file.open("w", encoding="utf-8") as f:
+        def emit(new_chunks: List[Dict]):
+            for ch in new_chunks:
+                f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+            chunks.extend(new_chunks)
 
-    # Save interim text for reference/debugging
-    interim_path = INTERIM_DIR / f"{path.stem}.txt"
-    interim_path.write_text(cleaned, encoding="utf-8")
+        parse_s = chunk_s = 0.0
+        pieces = iter_text(path, pdf_workers)
+        while True:
+            t = time.perf_counter()
+            piece = next(pieces, None)
+            if piece is None:
+                break
+            cleaned = cleaner.feed(piece)
+            interim.write(cleaned)
+            t_chunk = time.perf_counter()
+            parse_s += t_chunk - t
+            emit(chunker.feed(cleaned))
+            chunk_s += time.perf_counter() - t_chunk
+        t = time.perf_counter()
+        emit(chunker.close())
+        chunk_s += time.perf_counter() - t
 
-    title = path.stem
-    chunks = chunk_text(cleaned, source=str(path), title=title, chunk_tokens=chunk_tokens, overlap=overlap)
+    if timings is not None:
+        timings["parse"] = timings.get("parse", 0.0) + parse_s
+        timings["chunk"] = timings.get("chunk", 0.0) + chunk_s
 
-    # Save per-file chunks JSONL
-    out_file = CHUNK_DIR / f"{path.stem}.jsonl"
-    with out_file.open("w", encoding="utf-8") as f:
-        for ch in chunks:
-            f.write(json.dumps(ch, ensure_ascii=False) + "\n")
+    if not chunks:
+        interim_path.unlink(missing_ok=True)
+        out_file.unlink(missing_ok=True)
+        print(f"[SKIP] {file_path}: No extractable text")
+        return []
 
     return chunks
 
+def process_file_timed(file_path: str, **kwargs) -> Tuple[List[Dict], Dict[str, float]]:
+    """`process_file_to_chunks` plus its stage timings, for callers in another process."""
+    timings: Dict[str, float] = {}
+    return process_file_to_chunks(file_path, timings=timings, **kwargs), timings
+
 # -------------------------------
 # 7) Batch processing entry point
 # -------------------------------
-def main():
-    all_chunks = []
-    file_count = 0
-
-    print(f"\n[INFO] Starting preprocessing from: {RAW_DIR}\n")
-
-    for path in iter_files():
-        file_count += 1
-        print(f"[LOAD] {path.name}")
-        chunks = process_file_to_chunks(str(path))
-        all_chunks.extend(chunks)
-        print(f"[OK] {path.name}: {len(chunks)} chunks")
-
-    # Save all chunks in one aggregate file
-    agg_file = CHUNK_DIR / "all_chunks.jsonl"
-    with agg_file.open("w", encoding="utf-8") as f:
-        for ch in all_chunks:
-            f.write(json.dumps(ch, ensure_ascii=False) + "\n")
-
-    print(f"\n[DONE] Processed {file_count} files")
-    print(f"[RESULT] Total chunks: {len(all_chunks)}")
+HASH_INDEX = CHUNK_DIR / "_content_hashes.json"
+AGGREGATE_FILE = CHUNK_DIR / "all_chunks.jsonl"
+
+def file_sha1(path: Path, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _load_hash_index() -> Dict[str, Dict]:
+    if HASH_INDEX.exists():
+        try:
+            return json.loads(HASH_INDEX.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            print(f"[WARN] Ignoring unreadable {HASH_INDEX}")
+    return {}
+
+def _save_hash_index(index: Dict[str, Dict]) -> None:
+    tmp = HASH_INDEX.with_suffix(".json.tmp")
+    tmp.write_text(json.dumps(index, indent=2), encoding="utf-8")
+    os.replace(tmp, HASH_INDEX)
+
+def _prune_outputs(current: set) -> int:
+    """
+    Delete per-file outputs no file under RAW_DIR maps to any more: deleted
+    files and names from before `output_stem`. The reindex reads every
+    per-file JSONL, so leftovers would come back as duplicate vectors.
+    """
+    removed = 0
+    for directory, suffix in ((CHUNK_DIR, ".jsonl"), (INTERIM_DIR, ".txt")):
+        for p in directory.glob(f"*{suffix}"):
+            if p != AGGREGATE_FILE and p.stem not in current:
+                p.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+def _drive_doc_id(path: Path, drive_ids: set) -> str | None:
+    """
+    The Drive file id of a file auto_ingest downloaded to RAW_DIR/<file_id>/,
+    so reprocessing keeps its chunk ids and file_id; None for other files.
+    """
+    try:
+        parts = path.resolve().relative_to(RAW_DIR.resolve()).parts
+    except ValueError:
+        return None
+    return parts[0] if len(parts) == 2 and parts[0] in drive_ids else None
+
+def _process_for_cli(file_path: str, doc_id: str | None = None) -> int:
+    # Runs in a worker: chunks stay in the worker and reach the aggregate
+    # through the per-file JSONL, so only the count crosses processes.
+    return len(process_file_to_chunks(file_path, doc_id=doc_id))
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Chunk every file under backend/data/raw into JSONL.")
+    parser.add_argument("--workers", type=int, default=1, help="files processed in parallel (process pool)")
+    parser.add_argument("--force", action="store_true", help="reprocess files whose content hash is unchanged")
+    args = parser.parse_args(argv)
+
+    print(f"\n[INFO] Starting preprocessing from: {RAW_DIR} (workers={args.workers})\n")
+    t0 = time.perf_counter()
+
+    previous = {} if args.force else _load_hash_index()
+    drive_ids = known_file_ids()
+    index: Dict[str, Dict] = {}
+    todo: Dict[str, Tuple[Path, str]] = {}
+    counts = {"processed": 0, "skipped": 0, "failed": 0, "chunks": 0, "new_chunks": 0, "bytes": 0}
+
+    tmp_agg = AGGREGATE_FILE.with_suffix(".jsonl.tmp")
+    with tmp_agg.open("wb") as agg:
+        def append(path: Path, n_chunks: int, digest: str):
+            out_file = CHUNK_DIR / f"{output_stem(path)}.jsonl"
+            if n_chunks and out_file.exists():
+                with out_file.open("rb") as f:
+                    shutil.copyfileobj(f, agg)
+            index[str(path)] = {"sha1": digest, "chunks": n_chunks}
+            counts["chunks"] += n_chunks
+
+        # Unchanged files go straight from their previous JSONL to the aggregate
+        current = set()
+        for path in iter_files():
+            current.add(output_stem(path))
+            digest = file_sha1(path)
+            prev = previous.get(str(path))
+            if prev and prev.get("sha1") == digest and (
+                prev.get("chunks") == 0 or (CHUNK_DIR / f"{output_stem(path)}.jsonl").exists()
+            ):
+                append(path, prev.get("chunks", 0), digest)
+                counts["skipped"] += 1
+                print(f"[SKIP] {path.name}: unchanged")
+            else:
+                todo[str(path)] = (path, digest)
+
+        def done(file_path: str, n_chunks: int | None, error: Exception | None = None):
+            path, digest = todo[file_path]
+            if error is not None:
+                counts["failed"] += 1
+                print(f"[FAIL] {path.name}: {error}")
+                return
+            append(path, n_chunks, digest)
+            counts["processed"] += 1
+            counts["new_chunks"] += n_chunks
+            counts["bytes"] += path.stat().st_size
+            print(f"[OK] {path.name}: {n_chunks} chunks")
+
+        if args.workers <= 1:
+            for file_path in todo:
+                print(f"[LOAD] {Path(file_path).name}")
+                try:
+                    done(file_path, _process_for_cli(file_path, _drive_doc_id(Path(file_path), drive_ids)))
+                except Exception as e:
+                    done(file_path, None, e)
+        else:
+            with ProcessPoolExecutor(max_workers=args.workers, mp_context=mp.get_context("spawn")) as pool:
+                futures = {pool.submit(_process_for_cli, fp, _drive_doc_id(Path(fp), drive_ids)): fp for fp in todo}
+                for fut in as_completed(futures):
+                    try:
+                        done(futures[fut], fut.result())
+                    except Exception as e:
+                        done(futures[fut], None, e)
+
+    os.replace(tmp_agg, AGGREGATE_FILE)
+    _save_hash_index(index)
+    pruned = _prune_outputs(current)
+
+    elapsed = max(time.perf_counter() - t0, 1e-9)
+    print(f"\n[DONE] Processed {counts['processed']} files, skipped {counts['skipped']} unchanged, {counts['failed']} failed")
+    print(f"[RESULT] Total chunks: {counts['chunks']}")
+    if pruned:
+        print(f"[CLEAN] Removed {pruned} outputs of files no longer under {RAW_DIR}")
+    print(
+        f"[RATE] {elapsed:.2f}s: {counts['processed'] / elapsed:.2f} files/s, "
+        f"{counts['new_chunks'] / elapsed:.1f} chunks/s, {counts['bytes'] / 1e6 / elapsed:.2f} MB/s"
+    )
     print(f"[OUT] Per-file: {CHUNK_DIR}/*.jsonl")
-    print(f"[OUT] Aggregate: {agg_file}")
+    print(f"[OUT] Aggregate: {AGGREGATE_FILE}")
 
 if __name__ == "__main__":
     main()
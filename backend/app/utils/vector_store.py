@@ -0,0 +1,653 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import get_settings
+from .index_profile import get_index_profile
+from .state_store import INDEX_POINTER_PATH, load_index_pointer
+
+# (id, values, metadata) — the same tuple shape Pinecone's upsert accepts
+Vector = Tuple[str, List[float], Dict[str, Any]]
+
+def chunk_to_vector(ch: Dict[str, Any], embedding: List[float], file_id: str, include_text: bool = True) -> Vector:
+    """
+    The vector (and metadata) every ingestion path stores for a chunk.
+    With `include_text=False` the text lives in the local chunk store only.
+    """
+    metadata = {
+        "title": ch.get("title"),
+        "source": ch.get("source"),
+        "file_id": file_id,
+        "chunk_index": ch.get("chunk_index"),
+    }
+    if include_text:
+        metadata["text"] = ch.get("text")
+    return (ch.get("id", str(uuid.uuid4())), embedding, metadata)
+
+# -------------------------------
+# 1) Interface
+# -------------------------------
+class VectorStore(ABC):
+    """
+    Operations the RAG and ingest code need from a vector index.
+
+    `query` returns plain dicts shaped like Pinecone matches:
+    {"id": ..., "score": ..., "metadata": {...}}.
+    """
+
+    @abstractmethod
+    def upsert(self, vectors: Sequence[Vector]) -> None:
+        ...
+
+    @abstractmethod
+    def query(self, vector: List[float], top_k: int, include_metadata: bool = True) -> List[Dict[str, Any]]:
+        ...
+
+    async def query_async(self, vector: List[float], top_k: int, include_metadata: bool = True) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.query, vector, top_k, include_metadata)
+
+    @abstractmethod
+    def delete(self, ids: Iterable[str]) -> None:
+        ...
+
+    @abstractmethod
+    def delete_by_file(self, file_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    @abstractmethod
+    def list_ids(self, prefix: str = "") -> Iterator[str]:
+        """Every vector id (starting with `prefix`)."""
+
+    @abstractmethod
+    def fetch_metadata(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """{id: metadata} for the ids that exist."""
+
+    @abstractmethod
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        """Merge {id: fields} into existing vectors' metadata, leaving their values alone."""
+
+    @abstractmethod
+    def describe(self) -> Optional[Dict[str, Any]]:
+        """{"dimension", "metric"[, "dtype"]} of the index, or None if it does not exist yet."""
+
+    @abstractmethod
+    def reset(self, dimension: int, metric: str = "cosine") -> None:
+        """Drop every vector and (re)create the index with the given shape."""
+
+    @abstractmethod
+    def drop(self) -> None:
+        """Delete the index itself (used to garbage-collect old generations)."""
+
+    async def aclose(self) -> None:
+        pass
+
+# -------------------------------
+# 2) Pinecone backend
+# -------------------------------
+class PineconeVectorStore(VectorStore):
+    # pinecone-client 5.x only ships a blocking client, so async queries go
+    # straight to the index's REST data plane.
+    API_VERSION = "2024-07"
+
+    def __init__(
+        self,
+        api_key: str,
+        index_name: str,
+        host: Optional[str] = None,
+        namespace: Optional[str] = None,
+        region: str = "us-east-1",
+        upsert_batch_size: int = 50,
+    ):
+        from pinecone import Pinecone
+
+        self.api_key = api_key
+        self.index_name = index_name
+        self.namespace = namespace or ""
+        self.region = region
+        self.upsert_batch_size = max(1, upsert_batch_size)
+        self._pc = Pinecone(api_key=api_key)
+        self._host = host or None
+        self._host_url: Optional[str] = None
+        self._index = None
+        self._ahttp = None
+        self._lock = threading.Lock()
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._pc.Index(self.index_name, host=self._host) if self._host else self._pc.Index(self.index_name)
+            return self._index
+
+    def _resolve_host(self) -> str:
+        if self._host is None:
+            self._host = self._pc.describe_index(self.index_name).host
+        return self._host if self._host.startswith("http") else f"https://{self._host}"
+
+    @staticmethod
+    def _to_dict(match) -> Dict[str, Any]:
+        return {
+            "id": match.get("id"),
+            "score": float(match.get("score", 0.0)),
+            "metadata": dict(match.get("metadata") or {}),
+        }
+
+    def upsert(self, vectors: Sequence[Vector]) -> None:
+        vectors = list(vectors)
+        for i in range(0, len(vectors), self.upsert_batch_size):
+            self.index.upsert(vectors=vectors[i:i + self.upsert_batch_size], namespace=self.namespace)
+
+    def query(self, vector: List[float], top_k: int, include_metadata: bool = True) -> List[Dict[str, Any]]:
+        res = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            namespace=self.namespace,
+        )
+        return [self._to_dict(m) for m in (res.get("matches", []) or [])]
+
+    async def query_async(self, vector: List[float], top_k: int, include_metadata: bool = True) -> List[Dict[str, Any]]:
+        import httpx
+
+        if self._host_url is None:
+            self._host_url = await asyncio.to_thread(self._resolve_host)
+        if self._ahttp is None:
+            self._ahttp = httpx.AsyncClient(
+                timeout=30.0,
+                limits=httpx.Limits(max_connections=256, max_keepalive_connections=64),
+            )
+
+        resp = await self._ahttp.post(
+            f"{self._host_url}/query",
+            headers={"Api-Key": self.api_key, "X-Pinecone-API-Version": self.API_VERSION},
+            json={
+                "vector": vector,
+                "topK": top_k,
+                "includeMetadata": include_metadata,
+                "namespace": self.namespace,
+            },
+        )
+        resp.raise_for_status()
+        return [self._to_dict(m) for m in (resp.json().get("matches", []) or [])]
+
+    def delete(self, ids: Iterable[str]) -> None:
+        ids = list(ids)
+        for i in range(0, len(ids), 1000):
+            self.index.delete(ids=ids[i:i + 1000], namespace=self.namespace)
+
+    def delete_by_file(self, file_id: str) -> None:
+        from pinecone.exceptions import PineconeApiException
+
+        try:
+            self.index.delete(filter={"file_id": {"$eq": file_id}}, namespace=self.namespace)
+            return
+        except PineconeApiException as e:
+            if e.status != 400:
+                raise
+            # Serverless and starter indexes reject deletes by metadata filter
+            # (400); chunk ids carry a `<file_id>#` prefix instead. Vectors from
+            # before content-derived ids are handled by migrate_legacy_vectors.
+        self.delete(list(self.list_ids(prefix=f"{file_id}#")))
+
+    def list_ids(self, prefix: str = "") -> Iterator[str]:
+        kwargs = {"prefix": prefix} if prefix else {}
+        for page in self.index.list(namespace=self.namespace, **kwargs):
+            yield from page
+
+    def fetch_metadata(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        ids = list(ids)
+        found: Dict[str, Dict[str, Any]] = {}
+        for i in range(0, len(ids), 100):
+            resp = self.index.fetch(ids=ids[i:i + 100], namespace=self.namespace)
+            for vid, vec in (resp.vectors or {}).items():
+                found[vid] = dict(vec.metadata or {})
+        return found
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        # The data plane updates one vector per call
+        for vid, fields in updates.items():
+            self.index.update(id=vid, set_metadata=fields, namespace=self.namespace)
+
+    def count(self) -> int:
+        stats = self.index.describe_index_stats()
+        if self.namespace:
+            ns = (stats.get("namespaces") or {}).get(self.namespace)
+            return int(ns.get("vector_count", 0)) if ns else 0
+        return int(stats.get("total_vector_count", 0))
+
+    def describe(self) -> Optional[Dict[str, Any]]:
+        if self.index_name not in self._pc.list_indexes().names():
+            return None
+        desc = self._pc.describe_index(self.index_name)
+        return {"dimension": int(desc.dimension), "metric": desc.metric}
+
+    def reset(self, dimension: int, metric: str = "cosine") -> None:
+        from pinecone import ServerlessSpec
+
+        if self.index_name in self._pc.list_indexes().names():
+            print(f"🗑️ Deleting old index: {self.index_name}")
+            self._pc.delete_index(self.index_name)
+
+        print(f"🆕 Creating new index: {self.index_name}")
+        self._pc.create_index(
+            name=self.index_name,
+            dimension=dimension,
+            metric=metric,
+            spec=ServerlessSpec(cloud="aws", region=self.region),
+        )
+        with self._lock:
+            self._index = None
+            self._host = None
+            self._host_url = None
+
+    def drop(self) -> None:
+        if self.index_name in self._pc.list_indexes().names():
+            print(f"🗑️ Deleting index: {self.index_name}")
+            self._pc.delete_index(self.index_name)
+        with self._lock:
+            self._index = None
+
+    async def aclose(self) -> None:
+        if self._ahttp is not None:
+            await self._ahttp.aclose()
+            self._ahttp = None
+
+# -------------------------------
+# 3) Local memory-mapped backend
+# -------------------------------
+class LocalVectorStore(VectorStore):
+    """
+    Exact top-k search over a memory-mapped matrix on local disk.
+
+    Layout of `path/`:
+      store.json  — dimension, dtype, metric and row capacity
+      vectors.bin — row-major matrix of `capacity x dimension` values
+      rows.jsonl  — append-only log of {"row", "id", "metadata"} records;
+                    a record with "id": null frees the row
+
+    Vectors are stored as float32, float16 or int8. With the cosine metric
+    rows are unit-normalised on write, which is what makes the fixed int8
+    scale of 127 lossless enough for ranking. Other processes pick up
+    writes by tailing rows.jsonl; a single writer is assumed.
+    """
+
+    DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+    _INT8_SCALE = 127.0
+    _BLOCK_ROWS = 8192
+
+    def __init__(self, path: str, dtype: str = "float32", metric: str = "cosine"):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported local vector dtype: {dtype}")
+        if metric not in {"cosine", "dotproduct"}:
+            raise ValueError(f"Unsupported local vector metric: {metric}")
+        if dtype == "int8" and metric != "cosine":
+            raise ValueError("int8 quantization requires the cosine metric")
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._default_dtype = dtype
+        self._default_metric = metric
+        self._load()
+
+    # --- file helpers ---
+    @property
+    def _header_path(self) -> Path:
+        return self.path / "store.json"
+
+    @property
+    def _matrix_path(self) -> Path:
+        return self.path / "vectors.bin"
+
+    @property
+    def _log_path(self) -> Path:
+        return self.path / "rows.jsonl"
+
+    def _write_header(self) -> None:
+        tmp = self._header_path.with_suffix(".json.tmp")
+        tmp.write_text(json.dumps({
+            "dimension": self.dimension,
+            "dtype": self.dtype,
+            "metric": self.metric,
+            "capacity": self.capacity,
+        }))
+        os.replace(tmp, self._header_path)
+
+    def _load(self) -> None:
+        header = json.loads(self._header_path.read_text()) if self._header_path.exists() else {}
+        self.dimension: Optional[int] = header.get("dimension")
+        self.dtype: str = header.get("dtype", self._default_dtype)
+        self.metric: str = header.get("metric", self._default_metric)
+        self.capacity: int = header.get("capacity", 0)
+
+        self._ids: List[Optional[str]] = [None] * self.capacity
+        self._meta: List[Optional[Dict[str, Any]]] = [None] * self.capacity
+        self._row: Dict[str, int] = {}
+        self._alive = np.zeros(self.capacity, dtype=bool)
+        self._log_offset = 0
+        self._log_lines = 0
+        self._mmap = None
+        if self.dimension and self.capacity:
+            self._map()
+        self._replay()
+
+    def _map(self) -> None:
+        self._mmap = np.memmap(
+            self._matrix_path,
+            dtype=self.DTYPES[self.dtype],
+            mode="r+",
+            shape=(self.capacity, self.dimension),
+        )
+
+    def _replay(self) -> None:
+        if not self._log_path.exists():
+            return
+        with self._log_path.open("r", encoding="utf-8") as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # partially written record; picked up on the next refresh
+                self._log_offset += len(line.encode("utf-8"))
+                self._log_lines += 1
+                rec = json.loads(line)
+                self._apply(rec["row"], rec.get("id"), rec.get("metadata"))
+
+    def _apply(self, row: int, vid: Optional[str], metadata: Optional[Dict[str, Any]]) -> None:
+        if row >= self.capacity:
+            return
+        old = self._ids[row]
+        if old is not None and self._row.get(old) == row:
+            del self._row[old]
+        self._ids[row] = vid
+        self._meta[row] = metadata if vid is not None else None
+        self._alive[row] = vid is not None
+        if vid is not None:
+            self._row[vid] = row
+
+    def _refresh(self) -> None:
+        """Pick up rows written by another process since the last call."""
+        try:
+            size = self._log_path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        header_capacity = self.capacity
+        if self._header_path.exists():
+            header_capacity = json.loads(self._header_path.read_text()).get("capacity", 0)
+        if size < self._log_offset or header_capacity != self.capacity:
+            self._load()  # compacted or grown elsewhere
+        elif size > self._log_offset:
+            self._replay()
+
+    def _append_log(self, records: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with self._log_path.open("a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_offset += len(data.encode("utf-8"))
+        self._log_lines += len(records)
+
+    def _compact_log(self) -> None:
+        tmp = self._log_path.with_suffix(".jsonl.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for row, vid in enumerate(self._ids):
+                if vid is not None:
+                    f.write(json.dumps({"row": row, "id": vid, "metadata": self._meta[row]}, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._log_path)
+        self._log_offset = self._log_path.stat().st_size
+        self._log_lines = len(self._row)
+
+    def _grow(self, needed: int) -> None:
+        new_capacity = max(needed, self.capacity * 2, 1024)
+        itemsize = np.dtype(self.DTYPES[self.dtype]).itemsize
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap = None
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(new_capacity * self.dimension * itemsize)
+        self._ids.extend([None] * (new_capacity - self.capacity))
+        self._meta.extend([None] * (new_capacity - self.capacity))
+        self._alive = np.concatenate([self._alive, np.zeros(new_capacity - self.capacity, dtype=bool)])
+        self.capacity = new_capacity
+        self._map()
+        self._write_header()
+
+    def _encode(self, values: np.ndarray) -> np.ndarray:
+        if self.metric == "cosine":
+            norms = np.linalg.norm(values, axis=1, keepdims=True)
+            values = values / np.where(norms == 0, 1, norms)
+        if self.dtype == "int8":
+            return np.clip(np.rint(values * self._INT8_SCALE), -127, 127).astype(np.int8)
+        return values.astype(self.DTYPES[self.dtype])
+
+    # --- VectorStore API ---
+    def upsert(self, vectors: Sequence[Vector]) -> None:
+        vectors = list(vectors)
+        if not vectors:
+            return
+        with self._lock:
+            self._refresh()
+            values = np.asarray([v[1] for v in vectors], dtype=np.float32)
+            if self.dimension is None:
+                self.dimension = int(values.shape[1])
+                self._write_header()
+            if values.shape[1] != self.dimension:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match store dimension {self.dimension}")
+
+            free_rows = iter(np.flatnonzero(~self._alive).tolist())
+            next_new = self.capacity
+            batch_rows: Dict[str, int] = {}
+            rows: List[int] = []
+            for vid, _, _ in vectors:
+                row = batch_rows.get(vid)
+                if row is None:
+                    row = self._row.get(vid)
+                if row is None:
+                    row = next(free_rows, None)
+                if row is None:
+                    row, next_new = next_new, next_new + 1
+                batch_rows[vid] = row
+                rows.append(row)
+            if next_new > self.capacity:
+                self._grow(next_new)
+
+            encoded = self._encode(values)
+            for row, vec in zip(rows, encoded):
+                self._mmap[row] = vec
+            self._mmap.flush()
+
+            records = []
+            for row, (vid, _, metadata) in zip(rows, vectors):
+                self._apply(row, vid, dict(metadata or {}))
+                records.append({"row": row, "id": vid, "metadata": self._meta[row]})
+            self._append_log(records)
+
+    def query(self, vector: List[float], top_k: int, include_metadata: bool = True) -> List[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            if self._mmap is None or not self._row:
+                return []
+            q = np.asarray(vector, dtype=np.float32)
+            if self.metric == "cosine":
+                norm = float(np.linalg.norm(q))
+                q = q / norm if norm else q
+
+            n = int(np.flatnonzero(self._alive)[-1]) + 1
+            scores = np.empty(n, dtype=np.float32)
+            for start in range(0, n, self._BLOCK_ROWS):
+                block = self._mmap[start:min(n, start + self._BLOCK_ROWS)]
+                if block.dtype != np.float32:
+                    block = block.astype(np.float32)
+                scores[start:start + len(block)] = block @ q
+            if self.dtype == "int8":
+                scores /= self._INT8_SCALE
+            scores[~self._alive[:n]] = -np.inf
+
+            k = min(top_k, len(self._row))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self._ids[r],
+                    "score": float(scores[r]),
+                    "metadata": dict(self._meta[r] or {}) if include_metadata else {},
+                }
+                for r in top
+            ]
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            self._refresh()
+            records = []
+            for vid in ids:
+                row = self._row.get(vid)
+                if row is not None:
+                    self._apply(row, None, None)
+                    records.append({"row": row, "id": None})
+            if records:
+                self._append_log(records)
+            if self._log_lines > 4 * len(self._row) + 1000:
+                self._compact_log()
+
+    def delete_by_file(self, file_id: str) -> None:
+        with self._lock:
+            self._refresh()
+            ids = [vid for row, vid in enumerate(self._ids)
+                   if vid is not None and (self._meta[row] or {}).get("file_id") == file_id]
+        self.delete(ids)
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row)
+
+    def list_ids(self, prefix: str = "") -> Iterator[str]:
+        with self._lock:
+            self._refresh()
+            ids = [vid for vid in self._row if vid.startswith(prefix)]
+        return iter(ids)
+
+    def fetch_metadata(self, ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            return {vid: dict(self._meta[self._row[vid]] or {}) for vid in ids if vid in self._row}
+
+    def update_metadata(self, updates: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            self._refresh()
+            records = []
+            for vid, fields in updates.items():
+                row = self._row.get(vid)
+                if row is not None:
+                    self._apply(row, vid, {**(self._meta[row] or {}), **fields})
+                    records.append({"row": row, "id": vid, "metadata": self._meta[row]})
+            if records:
+                self._append_log(records)
+
+    def describe(self) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._refresh()
+            if self.dimension is None:
+                return None
+            return {"dimension": self.dimension, "metric": self.metric, "dtype": self.dtype}
+
+    def reset(self, dimension: int, metric: str = "cosine") -> None:
+        with self._lock:
+            self._mmap = None
+            self.path.mkdir(parents=True, exist_ok=True)
+            for p in (self._matrix_path, self._log_path, self._header_path):
+                if p.exists():
+                    p.unlink()
+            self._default_metric = metric
+            self._load()
+            self.dimension = dimension
+            self._write_header()
+
+    def drop(self) -> None:
+        with self._lock:
+            self._mmap = None
+            shutil.rmtree(self.path, ignore_errors=True)
+            self._load()
+
+# -------------------------------
+# 4) Factory
+# -------------------------------
+# The live index is a "target": an index name for Pinecone, a directory for
+# the local backend. Reindexing builds the next generation under a new
+# target and switches the pointer file, so every caller that goes through
+# get_vector_store() follows the switch without a restart.
+_stores: Dict[Tuple[str, str], VectorStore] = {}
+_stores_lock = threading.Lock()
+_pointer_cache: Dict[str, Any] = {"mtime": None, "pointer": None}
+
+def default_target() -> str:
+    settings = get_settings()
+    return settings.LOCAL_VECTOR_DIR if settings.VECTOR_STORE_BACKEND == "local" else settings.PINECONE_INDEX_NAME
+
+def generation_target(generation: int) -> str:
+    """Target name for a reindex generation (generation 0 is the configured index)."""
+    base = default_target()
+    return base if generation == 0 else f"{base}-g{generation}"
+
+def live_pointer() -> Dict[str, Any]:
+    """{"backend", "target", "generation"} of the index queries should use."""
+    backend = get_settings().VECTOR_STORE_BACKEND
+    try:
+        mtime = os.stat(INDEX_POINTER_PATH).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != _pointer_cache["mtime"]:
+        _pointer_cache["pointer"] = load_index_pointer() if mtime is not None else None
+        _pointer_cache["mtime"] = mtime
+    pointer = _pointer_cache["pointer"]
+    if not pointer or pointer.get("backend") != backend:
+        return {"backend": backend, "target": default_target(), "generation": 0}
+    return pointer
+
+def open_vector_store(target: Optional[str] = None) -> VectorStore:
+    """The store for `target` (default: the live one), opened once per process."""
+    settings = get_settings()
+    backend = settings.VECTOR_STORE_BACKEND
+    target = target or live_pointer()["target"]
+    with _stores_lock:
+        store = _stores.get((backend, target))
+        if store is not None:
+            return store
+        if backend == "local":
+            profile = get_index_profile()
+            store = LocalVectorStore(target, dtype=profile.dtype, metric=profile.metric)
+        elif backend == "pinecone":
+            store = PineconeVectorStore(
+                api_key=settings.PINECONE_API_KEY,
+                index_name=target,
+                # the configured host only belongs to the configured index
+                host=(settings.PINECONE_INDEX_HOST or None) if target == settings.PINECONE_INDEX_NAME else None,
+                region=settings.PINECONE_REGION,
+                upsert_batch_size=settings.PINECONE_UPSERT_BATCH_SIZE,
+            )
+        else:
+            raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
+        _stores[(backend, target)] = store
+        return store
+
+def get_vector_store() -> VectorStore:
+    """The live store. Cheap enough to call per request: one stat() of the pointer file."""
+    return open_vector_store()
+
+async def aclose_vector_stores() -> None:
+    with _stores_lock:
+        stores = list(_stores.values())
+    for store in stores:
+        await store.aclose()
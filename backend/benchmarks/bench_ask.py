@@ -0,0 +1,184 @@
+"""
+Load-test /api/ask (or /api/ask/stream) against local OpenAI and Pinecone
+stand-ins, so results depend only on our code and the configured latencies.
+
+    python -m backend.benchmarks.bench_ask --concurrency 1 8 32 --requests 200 --out ask.json
+
+Reports p50/p95/p99 latency and requests/s per concurrency level as JSON
+(for the stream endpoint also time to the first token). Failed requests are
+counted with the first error's message, and the run exits non-zero when any
+level's error rate is above --max-error-rate.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from backend.benchmarks.fakes import FakeOpenAI, FakePinecone, _Server, fake_embedding, offline_env
+
+def summarize(latencies_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies_s) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2),
+            "mean_ms": round(float(ms.mean()), 2), "max_ms": round(float(ms.max()), 2)}
+
+def seed_index(pinecone: FakePinecone, chunks: int, dim: int) -> None:
+    from backend.benchmarks.bench_chunker import synthetic_text
+
+    texts = [p for p in synthetic_text(chunks * 600 / (1024 * 1024)).split("\n\n") if p.strip()][:chunks]
+    vectors = [
+        (f"bench-{i // 20}#{i}", fake_embedding(t, dim).tolist(),
+         {"title": f"doc_{i // 20}", "source": f"doc_{i // 20}.txt", "text": t, "file_id": f"bench-{i // 20}"})
+        for i, t in enumerate(texts)
+    ]
+    pinecone.load(vectors)
+
+    from backend.app.utils.chunk_store import get_chunk_store
+
+    chunk_store = get_chunk_store()
+    if chunk_store is not None:
+        chunk_store.put_many([{**md, "id": vid} for vid, _, md in vectors])
+
+async def _one(client: httpx.AsyncClient, path: str, question: str, stream: bool) -> Dict[str, float]:
+    t0 = time.perf_counter()
+    if not stream:
+        resp = await client.post(path, json={"text": question})
+        resp.raise_for_status()
+        return {"total": time.perf_counter() - t0}
+
+    first = None
+    async with client.stream("POST", path, json={"text": question}) as resp:
+        resp.raise_for_status()
+        async for line in resp.aiter_lines():
+            if line == "event: error":
+                raise RuntimeError("stream reported an error")
+            if first is None and line == "event: token":
+                first = time.perf_counter() - t0
+    return {"total": time.perf_counter() - t0, "first_token": first}
+
+async def run_level(base_url: str, path: str, concurrency: int, requests: int, questions: List[str],
+                    stream: bool) -> Dict:
+    samples: List[Dict[str, float]] = []
+    errors = 0
+    first_error: Optional[str] = None
+    cursor = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors, first_error
+        for i in cursor:
+            try:
+                samples.append(await _one(client, path, questions[i % len(questions)], stream))
+            except Exception as e:
+                errors += 1
+                if first_error is None:
+                    first_error = f"{type(e).__name__}: {e}"
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - t0
+
+    result = {"requests": requests, "errors": errors, "error_rate": round(errors / requests, 4) if requests else 0.0,
+              "seconds": round(wall, 3), "rps": round(len(samples) / wall, 2) if wall else None}
+    if first_error is not None:
+        result["first_error"] = first_error
+    if samples:
+        result["latency"] = summarize([s["total"] for s in samples])
+        if stream:
+            firsts = [s["first_token"] for s in samples if s["first_token"] is not None]
+            result["first_token"] = summarize(firsts) if firsts else None
+    return result
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--stream", action="store_true", help="hit /api/ask/stream instead of /api/ask")
+    parser.add_argument("--distinct", type=int, default=0,
+                        help="distinct questions to cycle through (default: every request is new)")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--corpus-chunks", type=int, default=2000, help="vectors seeded into the fake index")
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0)
+    parser.add_argument("--query-latency-ms", type=float, default=10.0)
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0, help="time before the first token")
+    parser.add_argument("--token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--max-error-rate", type=float, default=0.0,
+                        help="exit non-zero when any level's error rate is above this (0 to 1)")
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    openai = FakeOpenAI(dim=args.dim, embed_latency_ms=args.embed_latency_ms, chat_latency_ms=args.chat_latency_ms,
+                        token_delay_ms=args.token_delay_ms, answer_tokens=args.answer_tokens).start()
+    pinecone = FakePinecone(latency_ms=args.query_latency_ms).start()
+    out = Path(args.out).resolve() if args.out else None
+    with tempfile.TemporaryDirectory(prefix="bench_ask_") as tmp:
+        offline_env(openai, pinecone, Path(tmp),
+                    ANSWER_CACHE_ENABLED="true" if args.answer_cache else "false")
+
+        from fastapi import FastAPI
+        from backend.app.api.routes import router
+
+        seed_index(pinecone, args.corpus_chunks, args.dim)
+        app = FastAPI()
+        app.include_router(router, prefix="/api")
+        server = _Server(app).start()
+
+        path = "/api/ask/stream" if args.stream else "/api/ask"
+        total = args.warmup + args.requests * len(args.concurrency)
+        n_questions = args.distinct or total
+        questions = [f"What did Haseeb build in project {i}?" for i in range(n_questions)]
+
+        async def run() -> Dict:
+            results = {}
+            if args.warmup:
+                await run_level(server.url, path, 1, args.warmup, questions, args.stream)
+            offset = args.warmup
+            for c in args.concurrency:
+                # rotate so each level starts on questions it has not seen (unless --distinct)
+                level_q = questions[offset % n_questions:] + questions[:offset % n_questions]
+                results[f"c{c}"] = await run_level(server.url, path, c, args.requests, level_q, args.stream)
+                offset += args.requests
+            return results
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            server.stop()
+            openai.stop()
+            pinecone.stop()
+
+    report = {
+        "benchmark": "ask",
+        "endpoint": path,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+        "fakes": {"openai": openai.counters, "pinecone": pinecone.counters},
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if out:
+        out.write_text(text + "\n")
+
+    failed = {level: r for level, r in results.items() if r["error_rate"] > args.max_error_rate}
+    if failed:
+        for level, r in failed.items():
+            print(f"[bench_ask] {level}: {r['errors']}/{r['requests']} requests failed; first: {r['first_error']}",
+                  file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare the token-native `chunk_text` with the previous LangChain-based
+chunker on a synthetic large text and, optionally, real PDFs.
+
+    python -m backend.benchmarks.bench_chunker --mb 5 --pdf backend/data/raw/resume.pdf
+
+Reports chunks/s, MB/s and peak Python heap (tracemalloc) per fixture as JSON.
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from backend.app.utils.universal_preprocess import chunk_text, clean_text, load_pdf
+
+def legacy_chunk_text(text: str, source: str, title: str, chunk_tokens: int = 350, overlap: int = 50) -> List[Dict]:
+    """The chunker as it was before the token-native rewrite (ids omitted)."""
+    import tiktoken
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    enc = tiktoken.get_encoding("cl100k_base")
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200, separators=["\n\n", "\n", " ", ""])
+    final_chunks = []
+    for ch in splitter.split_text(text):
+        tokens = enc.encode(ch)
+        if len(tokens) <= chunk_tokens:
+            final_chunks.append({"text": ch.strip(), "source": source, "title": title, "tokens": len(tokens)})
+        else:
+            start = 0
+            while start < len(tokens):
+                window = tokens[start:start + chunk_tokens]
+                final_chunks.append({"text": enc.decode(window).strip(), "source": source, "title": title, "tokens": len(window)})
+                start += chunk_tokens - overlap
+    return final_chunks
+
+def synthetic_text(megabytes: float, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    words = ("data science model pipeline python retrieval vector embedding project experience "
+             "research deployment latency throughput analysis learning system design api").split()
+    target = int(megabytes * 1024 * 1024)
+    parts, size = [], 0
+    while size < target:
+        sentences = [" ".join(rng.choice(words) for _ in range(rng.randint(6, 24))).capitalize() + "."
+                     for _ in range(rng.randint(2, 9))]
+        para = ("\n" if rng.random() < 0.3 else " ").join(sentences)
+        parts.append(para)
+        size += len(para) + 2
+    return "\n\n".join(parts)
+
+def measure(fn: Callable[[str], List[Dict]], text: str, repeat: int) -> Dict:
+    fn(text[:10_000])  # warm caches (encoder load) outside the timed runs
+
+    best = float("inf")
+    chunks: List[Dict] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        chunks = fn(text)
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mb = len(text.encode("utf-8")) / (1024 * 1024)
+    return {
+        "seconds": round(best, 4),
+        "chunks": len(chunks),
+        "chunks_per_s": round(len(chunks) / best, 1),
+        "mb_per_s": round(mb / best, 3),
+        "peak_mb": round(peak / (1024 * 1024), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mb", type=float, default=2.0, help="size of the synthetic text fixture")
+    parser.add_argument("--pdf", action="append", default=[], help="PDF fixture(s) to include")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fixtures = {f"synthetic_{args.mb}mb": synthetic_text(args.mb)}
+    for pdf in args.pdf:
+        fixtures[Path(pdf).name] = clean_text(load_pdf(Path(pdf)))
+
+    impls = {
+        "legacy": lambda t: legacy_chunk_text(t, "bench", "bench"),
+        "token_native": lambda t: chunk_text(t, "bench", "bench"),
+    }
+
+    report = {}
+    for name, text in fixtures.items():
+        report[name] = {impl: measure(fn, text, args.repeat) for impl, fn in impls.items()}
+        legacy, new = report[name]["legacy"], report[name]["token_native"]
+        report[name]["speedup"] = round(legacy["seconds"] / new["seconds"], 2) if new["seconds"] else None
+
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
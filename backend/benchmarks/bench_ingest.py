@@ -0,0 +1,183 @@
+"""
+Throughput of preprocessing and of `process_new_drive_files` over a
+synthetic corpus, with Drive, OpenAI and Pinecone replaced by local fakes.
+
+    python -m backend.benchmarks.bench_ingest --files 40 --kb 64 --out ingest.json
+
+Reports, as JSON:
+- preprocess: load / clean / chunk throughput measured separately, plus
+  `process_file_to_chunks` end to end;
+- ingest: wall time, files/s and chunks/s for a full Drive sync, busy time
+  and throughput per pipeline stage, and a second (no-change) poll.
+"""
+import argparse
+import json
+import platform
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from backend.benchmarks.fakes import FakeDrive, FakeOpenAI, FakePinecone, offline_env, write_corpus
+
+class StageTimer:
+    """Accumulates busy seconds and item counts per named stage across threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+
+    def wrap(self, stage: str, fn: Callable, count: Callable = lambda result: 1) -> Callable:
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                s = self.stages.setdefault(stage, {"calls": 0, "items": 0, "busy_s": 0.0})
+                s["calls"] += 1
+                s["items"] += count(result)
+                s["busy_s"] += elapsed
+            return result
+        return timed
+
+    def report(self) -> Dict[str, Dict]:
+        out = {}
+        for stage, s in self.stages.items():
+            out[stage] = {
+                "calls": s["calls"],
+                "items": s["items"],
+                "busy_s": round(s["busy_s"], 3),
+                "items_per_busy_s": round(s["items"] / s["busy_s"], 1) if s["busy_s"] else None,
+            }
+        return out
+
+def _rate(n: float, seconds: float) -> float | None:
+    return round(n / seconds, 2) if seconds else None
+
+def bench_preprocess(corpus: Path) -> Dict:
+    from backend.app.utils.universal_preprocess import (
+        TextCleaner, TokenChunker, get_encoder, iter_text, process_file_to_chunks,
+    )
+
+    get_encoder()  # load the BPE tables outside the timed stages
+    paths = sorted(p for p in corpus.iterdir() if p.is_file())
+    mb = sum(p.stat().st_size for p in paths) / (1024 * 1024)
+
+    t0 = time.perf_counter()
+    texts = {p: list(iter_text(p)) for p in paths}
+    load_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    cleaned = {}
+    for p, pieces in texts.items():
+        cleaner = TextCleaner()
+        cleaned[p] = [cleaner.feed(piece) for piece in pieces]
+    clean_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    n_chunks = 0
+    for p, pieces in cleaned.items():
+        chunker = TokenChunker(source=str(p), title=p.stem, doc_id=p.name)
+        for piece in pieces:
+            n_chunks += len(chunker.feed(piece))
+        n_chunks += len(chunker.close())
+    chunk_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    e2e_chunks = sum(len(process_file_to_chunks(str(p), doc_id=p.name)) for p in paths)
+    e2e_s = time.perf_counter() - t0
+
+    return {
+        "files": len(paths),
+        "mb": round(mb, 3),
+        "stages": {
+            "load": {"seconds": round(load_s, 3), "mb_per_s": _rate(mb, load_s)},
+            "clean": {"seconds": round(clean_s, 3), "mb_per_s": _rate(mb, clean_s)},
+            "chunk": {"seconds": round(chunk_s, 3), "mb_per_s": _rate(mb, chunk_s),
+                      "chunks": n_chunks, "chunks_per_s": _rate(n_chunks, chunk_s)},
+        },
+        "process_file_to_chunks": {"seconds": round(e2e_s, 3), "files_per_s": _rate(len(paths), e2e_s),
+                                   "chunks": e2e_chunks, "chunks_per_s": _rate(e2e_chunks, e2e_s),
+                                   "mb_per_s": _rate(mb, e2e_s)},
+    }
+
+def bench_ingest(drive: FakeDrive) -> Dict:
+    from backend.app.services import auto_ingest
+
+    drive.install(auto_ingest)
+    timer = StageTimer()
+    auto_ingest._download_stage = timer.wrap("download", auto_ingest._download_stage)
+    auto_ingest._index_stage = timer.wrap("index", auto_ingest._index_stage,
+                                          count=lambda diff: diff["embedded"] + diff["unchanged"])
+    auto_ingest._parse_stage = timer.wrap("parse", auto_ingest._parse_stage, count=len)
+
+    t0 = time.perf_counter()
+    summary = auto_ingest.process_new_drive_files()
+    wall = time.perf_counter() - t0
+    stages = timer.report()
+    chunks = stages.get("index", {}).get("items", 0)
+
+    t0 = time.perf_counter()
+    resync = auto_ingest.process_new_drive_files()
+    resync_s = time.perf_counter() - t0
+
+    return {
+        "summary": summary,
+        "seconds": round(wall, 3),
+        "files_per_s": _rate(summary["processed"] + summary["skipped"], wall),
+        "chunks_per_s": _rate(chunks, wall),
+        "stages": stages,
+        "resync": {"summary": resync, "seconds": round(resync_s, 3)},
+    }
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=40)
+    parser.add_argument("--kb", type=float, default=64.0, help="size of each synthetic document")
+    parser.add_argument("--parse-workers", type=int, default=0, help="INGEST_PARSE_WORKERS for the run")
+    parser.add_argument("--download-workers", type=int, default=4)
+    parser.add_argument("--index-workers", type=int, default=2)
+    parser.add_argument("--dim", type=int, default=256, help="fake embedding dimension")
+    parser.add_argument("--download-latency-ms", type=float, default=20.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=50.0)
+    parser.add_argument("--upsert-latency-ms", type=float, default=5.0)
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    openai = FakeOpenAI(dim=args.dim, embed_latency_ms=args.embed_latency_ms).start()
+    pinecone = FakePinecone(latency_ms=args.upsert_latency_ms).start()
+    out = Path(args.out).resolve() if args.out else None
+    with tempfile.TemporaryDirectory(prefix="bench_ingest_") as tmp:
+        offline_env(openai, pinecone, Path(tmp),
+                    INGEST_PARSE_WORKERS=str(args.parse_workers),
+                    INGEST_DOWNLOAD_WORKERS=str(args.download_workers),
+                    INGEST_INDEX_WORKERS=str(args.index_workers))
+        corpus = Path(tmp) / "drive"
+        write_corpus(corpus, args.files, args.kb)
+        drive = FakeDrive(corpus, latency_ms=args.download_latency_ms)
+        try:
+            results = {
+                "preprocess": bench_preprocess(corpus),
+                "ingest": bench_ingest(drive),
+            }
+        finally:
+            openai.stop()
+            pinecone.stop()
+
+    results["ingest"]["vectors"] = pinecone.count()
+    report = {
+        "benchmark": "ingest",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+        "fakes": {"openai": openai.counters, "pinecone": pinecone.counters, "drive_downloads": drive.downloads},
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if out:
+        out.write_text(text + "\n")
+
+if __name__ == "__main__":
+    main()
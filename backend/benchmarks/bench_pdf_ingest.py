@@ -0,0 +1,72 @@
+"""
+Compare whole-document PDF preprocessing (join every page, regex-clean the
+full string, chunk) with the streaming page -> clean -> chunk path.
+
+    python -m backend.benchmarks.bench_pdf_ingest --pdf big.pdf --workers 0 4
+
+Reports wall time and peak Python heap (tracemalloc, parent process only)
+per PDF as JSON.
+"""
+import argparse
+import json
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from backend.app.utils.universal_preprocess import TextCleaner, TokenChunker, chunk_text, iter_pdf_pages, load_pdf
+
+def legacy_clean_text(text: str) -> str:
+    """`clean_text` as it was before the single-pass cleaner."""
+    text = text.replace("\ufeff", "").replace("\u200b", "")
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    text = re.sub(r"[ \t]{2,}", " ", text)
+    lines = []
+    for line in text.splitlines():
+        if re.fullmatch(r"https?://\S+", line.strip()):
+            continue
+        if line.strip().lower() in {"share", "login", "sign in", "subscribe"}:
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+def whole_document(path: Path) -> List[Dict]:
+    return chunk_text(legacy_clean_text(load_pdf(path)), source=str(path), title=path.stem)
+
+def streaming(path: Path, workers: int) -> List[Dict]:
+    cleaner = TextCleaner()
+    chunker = TokenChunker(source=str(path), title=path.stem)
+    chunks: List[Dict] = []
+    for page in iter_pdf_pages(path, workers=workers):
+        chunks.extend(chunker.feed(cleaner.feed(page)))
+    return chunks + chunker.close()
+
+def measure(fn: Callable[[], List[Dict]]) -> Dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    chunks = fn()
+    seconds = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": round(seconds, 3), "chunks": len(chunks), "peak_mb": round(peak / 1e6, 2)}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", action="append", required=True, help="PDF file (repeatable)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[0], help="page worker counts to try")
+    args = parser.parse_args()
+
+    report = {}
+    for pdf in args.pdf:
+        path = Path(pdf)
+        whole_document(path)  # warm the page cache and encoder
+        results = {"whole_document": measure(lambda: whole_document(path))}
+        for workers in args.workers:
+            results[f"streaming_w{workers}"] = measure(lambda: streaming(path, workers))
+        report[path.name] = results
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Recall and cost of reduced-dimension and quantized index profiles.
+
+    python -m backend.benchmarks.bench_recall --from-store backend/data/cache/embeddings.sqlite --out recall.json
+    python -m backend.benchmarks.bench_recall --docs 5000 --dims 3072 1024 512 256
+
+Ground truth is exact cosine top-k over the full-size float32 vectors. Each
+profile (dimensions x dtype) truncates and re-normalises the same vectors,
+which is what the embeddings API's `dimensions` parameter returns for
+text-embedding-3 models, loads them into a LocalVectorStore of that dtype
+(the real quantization path) and reports recall@k against the ground truth,
+query latency and bytes per vector.
+
+--from-store uses real chunk embeddings from the embedding store, with
+held-out chunks as queries. Without it the vectors are synthetic, with
+variance concentrated in the leading dimensions like text-embedding-3's;
+they exercise the mechanics but only real vectors measure real recall.
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backend.benchmarks.bench_ask import summarize
+
+def _normalise(m: np.ndarray) -> np.ndarray:
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+def load_store_vectors(path: str, limit: int) -> np.ndarray:
+    """Full-size vectors from an embedding store (the most common length, i.e. the native one)."""
+    db = sqlite3.connect(path)
+    blobs = [row[0] for row in db.execute("SELECT vector FROM embeddings LIMIT ?", (limit * 4,))]
+    db.close()
+    if not blobs:
+        raise SystemExit(f"No embeddings in {path}")
+    sizes, counts = np.unique([len(b) for b in blobs], return_counts=True)
+    size = int(sizes[counts.argmax()])
+    rows = [np.frombuffer(b, dtype=np.float32) for b in blobs if len(b) == size][:limit]
+    return _normalise(np.stack(rows))
+
+def synthetic_vectors(n: int, dim: int, clusters: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    scale = (np.arange(dim) + 1.0) ** -0.5  # leading dimensions carry most of the variance
+    centres = rng.standard_normal((clusters, dim)) * scale
+    labels = rng.integers(0, clusters, n)
+    vecs = centres[labels] + 0.6 * rng.standard_normal((n, dim)) * scale
+    return _normalise(vecs.astype(np.float32))
+
+def split(vectors: np.ndarray, queries: int, seed: int = 11) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    return vectors[order[queries:]], vectors[order[:queries]]
+
+def exact_top_k(docs: np.ndarray, queries: np.ndarray, k: int) -> List[set]:
+    scores = queries @ docs.T
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return [set(row.tolist()) for row in top]
+
+def run_profile(docs: np.ndarray, queries: np.ndarray, truth: List[set], dims: int, dtype: str, k: int,
+                workdir: Path) -> Dict:
+    from backend.app.utils.vector_store import LocalVectorStore
+
+    d = _normalise(docs[:, :dims])
+    q = _normalise(queries[:, :dims])
+    store = LocalVectorStore(str(workdir / f"d{dims}-{dtype}"), dtype=dtype, metric="cosine")
+
+    t0 = time.perf_counter()
+    for i in range(0, len(d), 1000):
+        store.upsert([(str(j), d[j].tolist(), {}) for j in range(i, min(i + 1000, len(d)))])
+    upsert_s = time.perf_counter() - t0
+
+    hits, latencies = 0, []
+    for qi, vec in enumerate(q):
+        t = time.perf_counter()
+        matches = store.query(vec.tolist(), top_k=k, include_metadata=False)
+        latencies.append(time.perf_counter() - t)
+        hits += len(truth[qi] & {int(m["id"]) for m in matches})
+
+    itemsize = np.dtype(dtype).itemsize
+    return {
+        "dimensions": dims,
+        "dtype": dtype,
+        f"recall@{k}": round(hits / (k * len(q)), 4),
+        "bytes_per_vector": dims * itemsize,
+        "index_mb": round(len(d) * dims * itemsize / 2**20, 2),
+        "pinecone_bytes_per_vector": dims * 4,  # Pinecone stores float32 whatever the local dtype
+        "upsert_s": round(upsert_s, 3),
+        "query": summarize(latencies),
+    }
+
+def main(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-store", help="embedding store SQLite file with real chunk embeddings")
+    parser.add_argument("--docs", type=int, default=5000, help="vectors indexed (synthetic, or at most from the store)")
+    parser.add_argument("--queries", type=int, default=200, help="held-out vectors used as queries")
+    parser.add_argument("--native-dim", type=int, default=3072, help="synthetic vector size")
+    parser.add_argument("--clusters", type=int, default=100, help="synthetic topic clusters")
+    parser.add_argument("--dims", type=int, nargs="+", default=[3072, 1536, 1024, 512, 256])
+    parser.add_argument("--dtypes", nargs="+", default=["float32", "float16", "int8"])
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args(argv)
+
+    if args.from_store:
+        vectors = load_store_vectors(args.from_store, args.docs + args.queries)
+        source = f"embedding store ({args.from_store})"
+    else:
+        vectors = synthetic_vectors(args.docs + args.queries, args.native_dim, args.clusters)
+        source = "synthetic"
+    docs, queries = split(vectors, min(args.queries, len(vectors) // 5))
+    truth = exact_top_k(docs, queries, args.top_k)
+    native = vectors.shape[1]
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_recall_") as tmp:
+        for dims in sorted({d for d in args.dims if d <= native}, reverse=True):
+            for dtype in args.dtypes:
+                results.append(run_profile(docs, queries, truth, dims, dtype, args.top_k, Path(tmp)))
+
+    report = {
+        "benchmark": "recall",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "source": source,
+        "native_dimensions": native,
+        "docs": len(docs),
+        "queries": len(queries),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+
+if __name__ == "__main__":
+    main()
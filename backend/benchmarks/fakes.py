@@ -0,0 +1,496 @@
+"""
+Local stand-ins for the services the backend talks to, so benchmarks run
+offline and reproducibly:
+
+- FakeOpenAI: `/v1/embeddings` and `/v1/chat/completions` (plain and
+  streamed), with configurable latency. Point the SDK at it with
+  OPENAI_BASE_URL.
+- FakePinecone: the index data plane (upsert, query, delete, list,
+  describe_index_stats) over an in-memory NumPy matrix. Point the backend
+  at it with PINECONE_INDEX_HOST.
+- FakeDrive: the four Drive calls `auto_ingest` makes, backed by a local
+  folder.
+
+Each server is a FastAPI app run by uvicorn on a background thread.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import shutil
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# -------------------------------
+# 1) Serving helper
+# -------------------------------
+class _Server:
+    """Runs an ASGI app on 127.0.0.1 (free port) in a daemon thread."""
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self) -> "_Server":
+        config = uvicorn.Config(self.app, log_level="warning", access_log=False, lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, kwargs={"sockets": [self._sock]}, daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{type(self).__name__} did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join(timeout=5)
+            self._server = None
+
+# -------------------------------
+# 2) OpenAI
+# -------------------------------
+def fake_embedding(text: str, dim: int) -> np.ndarray:
+    """Deterministic unit vector for `text` (same text, same vector)."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vec = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+def _approx_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+class FakeOpenAI(_Server):
+    """
+    Embeddings are `fake_embedding` vectors of `dim` values. A chat answer is
+    `answer_tokens` words, sent one per `token_delay_ms` after `chat_latency_ms`
+    (streamed or not), so both paths take the same total time.
+    """
+
+    def __init__(
+        self,
+        dim: int = 256,
+        embed_latency_ms: float = 0.0,
+        chat_latency_ms: float = 0.0,
+        token_delay_ms: float = 0.0,
+        answer_tokens: int = 40,
+    ):
+        self.dim = dim
+        self.embed_latency_ms = embed_latency_ms
+        self.chat_latency_ms = chat_latency_ms
+        self.token_delay_ms = token_delay_ms
+        self.answer_tokens = answer_tokens
+        self.counters = {"embedding_requests": 0, "embedding_inputs": 0, "chat_requests": 0}
+        super().__init__(self._build_app())
+
+    def _answer_words(self) -> List[str]:
+        return [("Answer" if i == 0 else "word") + " " for i in range(self.answer_tokens)]
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/v1/embeddings")
+        async def embeddings(request: Request):
+            body = await request.json()
+            inputs = body["input"]
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            inputs = [t if isinstance(t, str) else json.dumps(t) for t in inputs]
+            dim = int(body.get("dimensions") or self.dim)
+
+            self.counters["embedding_requests"] += 1
+            self.counters["embedding_inputs"] += len(inputs)
+            if self.embed_latency_ms:
+                await asyncio.sleep(self.embed_latency_ms / 1000)
+
+            as_base64 = body.get("encoding_format") == "base64"
+            data = []
+            for i, text in enumerate(inputs):
+                vec = fake_embedding(text, dim)
+                value = base64.b64encode(vec.tobytes()).decode("ascii") if as_base64 else vec.tolist()
+                data.append({"object": "embedding", "index": i, "embedding": value})
+            tokens = sum(_approx_tokens(t) for t in inputs)
+            return {
+                "object": "list",
+                "data": data,
+                "model": body.get("model"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            }
+
+        @app.post("/v1/chat/completions")
+        async def chat(request: Request):
+            body = await request.json()
+            self.counters["chat_requests"] += 1
+            prompt_tokens = sum(_approx_tokens(m.get("content") or "") for m in body.get("messages", []))
+            usage = {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": self.answer_tokens,
+                "total_tokens": prompt_tokens + self.answer_tokens,
+            }
+            base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": body.get("model")}
+            words = self._answer_words()
+
+            if not body.get("stream"):
+                await asyncio.sleep((self.chat_latency_ms + self.token_delay_ms * len(words)) / 1000)
+                return {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(words)},
+                        "finish_reason": "stop",
+                    }],
+                    "usage": usage,
+                }
+
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+            async def events():
+                def chunk(choices, **extra):
+                    payload = {**base, "object": "chat.completion.chunk", "choices": choices, **extra}
+                    return f"data: {json.dumps(payload)}\n\n"
+
+                await asyncio.sleep(self.chat_latency_ms / 1000)
+                for word in words:
+                    yield chunk([{"index": 0, "delta": {"content": word}, "finish_reason": None}])
+                    if self.token_delay_ms:
+                        await asyncio.sleep(self.token_delay_ms / 1000)
+                yield chunk([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if include_usage:
+                    yield chunk([], usage=usage)
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        return app
+
+# -------------------------------
+# 3) Pinecone
+# -------------------------------
+class _Namespace:
+    def __init__(self):
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.values: List[np.ndarray] = []
+        self.metadata: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def upsert(self, vid: str, values: List[float], metadata: Dict[str, Any]) -> None:
+        vec = np.asarray(values, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        vec = vec / norm if norm else vec
+        row = self.rows.get(vid)
+        if row is None:
+            self.rows[vid] = len(self.ids)
+            self.ids.append(vid)
+            self.values.append(vec)
+            self.metadata.append(metadata)
+        else:
+            self.values[row] = vec
+            self.metadata[row] = metadata
+        self._matrix = None
+
+    def delete(self, ids) -> None:
+        doomed = {vid for vid in ids if vid in self.rows}
+        if not doomed:
+            return
+        keep = [i for i, vid in enumerate(self.ids) if vid not in doomed]
+        self.ids = [self.ids[i] for i in keep]
+        self.values = [self.values[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.rows = {vid: i for i, vid in enumerate(self.ids)}
+        self._matrix = None
+
+    def query(self, vector: List[float], top_k: int) -> List[Tuple[int, float]]:
+        if not self.ids:
+            return []
+        if self._matrix is None:
+            self._matrix = np.stack(self.values)
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        scores = self._matrix @ (q / norm if norm else q)
+        k = min(top_k, len(self.ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(r), float(scores[r])) for r in top]
+
+class FakePinecone(_Server):
+    """
+    One serverless-style index (deletes by metadata filter are rejected with
+    a 400, as serverless indexes do); every data-plane call sleeps
+    `latency_ms` first.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.namespaces: Dict[str, _Namespace] = {}
+        self.counters = {"queries": 0, "upserted": 0, "deleted": 0}
+        self._lock = threading.Lock()
+        super().__init__(self._build_app())
+
+    def _ns(self, name: Optional[str]) -> _Namespace:
+        return self.namespaces.setdefault(name or "", _Namespace())
+
+    def load(self, vectors: List[Tuple[str, List[float], Dict[str, Any]]], namespace: str = "") -> None:
+        """Seed the index in-process, without going through HTTP."""
+        with self._lock:
+            ns = self._ns(namespace)
+            for vid, values, metadata in vectors:
+                ns.upsert(vid, values, dict(metadata or {}))
+
+    def count(self, namespace: str = "") -> int:
+        with self._lock:
+            return len(self._ns(namespace).ids)
+
+    async def _delay(self) -> None:
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/vectors/upsert")
+        async def upsert(request: Request):
+            body = await request.json()
+            await self._delay()
+            vectors = body.get("vectors", [])
+            with self._lock:
+                ns = self._ns(body.get("namespace"))
+                for v in vectors:
+                    ns.upsert(v["id"], v["values"], v.get("metadata") or {})
+                self.counters["upserted"] += len(vectors)
+            return {"upsertedCount": len(vectors)}
+
+        @app.post("/query")
+        async def query(request: Request):
+            body = await request.json()
+            await self._delay()
+            include_metadata = body.get("includeMetadata", False)
+            with self._lock:
+                ns = self._ns(body.get("namespace"))
+                hits = ns.query(body["vector"], int(body.get("topK", 10)))
+                matches = [
+                    {
+                        "id": ns.ids[row],
+                        "score": score,
+                        "values": [],
+                        **({"metadata": ns.metadata[row]} if include_metadata else {}),
+                    }
+                    for row, score in hits
+                ]
+                self.counters["queries"] += 1
+            return {"matches": matches, "namespace": body.get("namespace", ""), "usage": {"readUnits": 1}}
+
+        @app.post("/vectors/delete")
+        async def delete(request: Request):
+            body = await request.json()
+            await self._delay()
+            if body.get("filter"):
+                return JSONResponse(status_code=400, content={
+                    "code": 3, "message": "Serverless and Starter indexes do not support deleting with metadata filtering"})
+            with self._lock:
+                ns = self._ns(body.get("namespace"))
+                ids = list(ns.ids) if body.get("deleteAll") else body.get("ids", [])
+                before = len(ns.ids)
+                ns.delete(ids)
+                self.counters["deleted"] += before - len(ns.ids)
+            return {}
+
+        @app.get("/vectors/list")
+        async def list_ids(prefix: str = "", namespace: str = "", limit: int = 100, paginationToken: str = ""):
+            await self._delay()
+            with self._lock:
+                ids = sorted(vid for vid in self._ns(namespace).ids if vid.startswith(prefix))
+            start = int(paginationToken or 0)
+            page = ids[start:start + limit]
+            body: Dict[str, Any] = {"vectors": [{"id": vid} for vid in page], "namespace": namespace,
+                                    "usage": {"readUnits": 1}}
+            if start + limit < len(ids):
+                body["pagination"] = {"next": str(start + limit)}
+            return body
+
+        @app.get("/vectors/fetch")
+        async def fetch(request: Request):
+            ids = request.query_params.getlist("ids")
+            namespace = request.query_params.get("namespace", "")
+            await self._delay()
+            with self._lock:
+                ns = self._ns(namespace)
+                vectors = {
+                    vid: {"id": vid, "values": ns.values[ns.rows[vid]].tolist(), "metadata": ns.metadata[ns.rows[vid]]}
+                    for vid in ids if vid in ns.rows
+                }
+            return {"vectors": vectors, "namespace": namespace, "usage": {"readUnits": 1}}
+
+        @app.post("/vectors/update")
+        async def update(request: Request):
+            body = await request.json()
+            await self._delay()
+            with self._lock:
+                ns = self._ns(body.get("namespace"))
+                row = ns.rows.get(body["id"])
+                if row is not None:
+                    ns.metadata[row] = {**ns.metadata[row], **(body.get("setMetadata") or {})}
+                    if body.get("values"):
+                        ns.upsert(body["id"], body["values"], ns.metadata[row])
+            return {}
+
+        @app.post("/describe_index_stats")
+        async def describe_index_stats():
+            await self._delay()
+            with self._lock:
+                namespaces = {name: {"vectorCount": len(ns.ids)} for name, ns in self.namespaces.items()}
+                dims = [len(ns.values[0]) for ns in self.namespaces.values() if ns.values]
+            return {
+                "namespaces": namespaces,
+                "dimension": dims[0] if dims else 0,
+                "indexFullness": 0.0,
+                "totalVectorCount": sum(ns["vectorCount"] for ns in namespaces.values()),
+            }
+
+        return app
+
+# -------------------------------
+# 4) Google Drive
+# -------------------------------
+class FakeDrive:
+    """
+    Serves the files of a local folder as one Drive folder. `install` swaps
+    the Drive functions `auto_ingest` imported for these methods.
+
+    The changes feed is derived from the folder: every call that reads it
+    first records a change for each file added, modified (mtime or bytes),
+    trashed or deleted since the previous look, and page tokens are
+    positions in that log. `trash(name)` marks a file trashed without
+    deleting it; downloads of names in `fail_downloads` raise.
+    """
+
+    def __init__(self, folder: Path, latency_ms: float = 0.0):
+        self.folder = Path(folder)
+        self.latency_ms = latency_ms
+        self.downloads = 0
+        self.fail_downloads: set = set()
+        self.trashed: set = set()
+        self.changes: List[Dict[str, Any]] = []
+        self._seen: Dict[str, Tuple] = {}
+        self._lock = threading.Lock()
+
+    def _describe(self, path: Path) -> Dict[str, Any]:
+        data = path.read_bytes()
+        mtime = path.stat().st_mtime
+        return {
+            "id": f"fake-{path.name}",
+            "name": path.name,
+            "mimeType": "text/markdown" if path.suffix == ".md" else "text/plain",
+            "modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(mtime)) + f".{int(mtime * 1000) % 1000:03d}Z",
+            "size": str(len(data)),
+            "md5Checksum": hashlib.md5(data).hexdigest(),
+            "parents": [os.getenv("GOOGLE_DRIVE_FOLDER_ID", "")],
+            "trashed": path.name in self.trashed,
+        }
+
+    def _scan(self) -> None:
+        with self._lock:
+            current = {f["id"]: f for f in (self._describe(p) for p in sorted(self.folder.iterdir()) if p.is_file())}
+            for fid, f in current.items():
+                version = (f["modifiedTime"], f["md5Checksum"], f["trashed"])
+                if self._seen.get(fid) != version:
+                    self._seen[fid] = version
+                    self.changes.append({"fileId": fid, "removed": False, "file": f})
+            for fid in [fid for fid in self._seen if fid not in current]:
+                del self._seen[fid]
+                self.changes.append({"fileId": fid, "removed": True})
+
+    def trash(self, name: str) -> None:
+        self.trashed.add(name)
+
+    def list_files_in_folder(self, folder_id: str) -> List[Dict]:
+        files = [self._describe(p) for p in sorted(self.folder.iterdir()) if p.is_file()]
+        return [f for f in files if not f["trashed"]]
+
+    def get_file(self, file_id: str) -> Optional[Dict]:
+        for p in self.folder.iterdir():
+            if p.is_file() and f"fake-{p.name}" == file_id:
+                return self._describe(p)
+        return None
+
+    def get_start_page_token(self) -> str:
+        self._scan()
+        return str(len(self.changes))
+
+    def list_changes(self, page_token: str) -> Tuple[List[Dict], str]:
+        self._scan()
+        return self.changes[int(page_token):], str(len(self.changes))
+
+    def download_file(self, file_id: str, name: str, mime_type: str, dest_path: str, size=None, md5=None) -> str:
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if name in self.fail_downloads:
+            raise IOError(f"Simulated download failure for {name}")
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        shutil.copyfile(self.folder / name, dest_path)
+        self.downloads += 1
+        return dest_path
+
+    def install(self, module) -> None:
+        for name in ("list_files_in_folder", "get_file", "get_start_page_token", "list_changes", "download_file"):
+            setattr(module, name, getattr(self, name))
+
+# -------------------------------
+# 5) Environment
+# -------------------------------
+def offline_env(openai: FakeOpenAI, pinecone: FakePinecone, workdir: Path, **overrides: str) -> None:
+    """
+    Point the backend's settings at the fakes and run from `workdir`, so its
+    relative `backend/data/...` paths stay out of the real data directory.
+    Must run before anything under `backend.app` is imported: settings are
+    read at import time.
+    """
+    env = {
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{openai.url}/v1",
+        "PINECONE_API_KEY": "bench",
+        "PINECONE_INDEX_NAME": "bench",
+        "PINECONE_INDEX_HOST": pinecone.url,
+        "VECTOR_STORE_BACKEND": "pinecone",
+        "GOOGLE_DRIVE_FOLDER_ID": "bench-folder",
+        "DRIVE_SYNC_MODE": "full",
+        "EMBED_STORE_PATH": "",
+        "QUERY_CACHE_PATH": "",
+    }
+    env.update(overrides)
+    os.environ.update(env)
+    workdir.mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+
+def write_corpus(folder: Path, files: int, kb_per_file: float, seed: int = 7) -> int:
+    """Synthetic .txt/.md documents; returns total bytes written."""
+    from backend.benchmarks.bench_chunker import synthetic_text
+
+    folder.mkdir(parents=True, exist_ok=True)
+    total = 0
+    for i in range(files):
+        text = synthetic_text(kb_per_file / 1024, seed=seed + i)
+        path = folder / f"doc_{i:04d}{'.md' if i % 4 == 3 else '.txt'}"
+        path.write_text(text, encoding="utf-8")
+        total += len(text.encode("utf-8"))
+    return total
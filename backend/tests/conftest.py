@@ -0,0 +1,18 @@
+import os
+
+# test_app.py queries the live OpenAI and Pinecone services; everything else runs offline
+collect_ignore = [] if os.getenv("OPENAI_API_KEY") and os.getenv("PINECONE_API_KEY") else ["test_app.py"]
+
+# Modules that build an OpenAI client at import time need a key, never a real one here
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import pytest
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    """The benchmarks' OpenAI stand-in: 16-d deterministic embeddings, instant answers."""
+    from backend.benchmarks.fakes import FakeOpenAI
+
+    server = FakeOpenAI(dim=16, answer_tokens=5).start()
+    yield server
+    server.stop()
@@ -0,0 +1,32 @@
+import numpy as np
+
+from backend.app.utils.answer_cache import SemanticAnswerCache
+
+def _vec(*values):
+    return list(np.asarray(values, dtype=np.float32))
+
+def test_a_close_question_hits_and_a_distant_one_misses():
+    cache = SemanticAnswerCache(max_entries=4, threshold=0.95)
+    cache.store(_vec(1, 0, 0), {"answer": "a"}, version=1)
+
+    assert cache.lookup(_vec(0.99, 0.05, 0), version=1) == {"answer": "a"}
+    assert cache.lookup(_vec(0, 1, 0), version=1) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+def test_a_newer_ingest_version_drops_every_entry():
+    cache = SemanticAnswerCache(max_entries=4, threshold=0.95)
+    cache.store(_vec(1, 0, 0), {"answer": "a"}, version=1)
+
+    assert cache.lookup(_vec(1, 0, 0), version=2) is None
+    assert cache.stats()["entries"] == 0
+
+def test_a_full_cache_evicts_the_least_recently_used_entry():
+    cache = SemanticAnswerCache(max_entries=2, threshold=0.99)
+    cache.store(_vec(1, 0, 0), {"answer": "x"}, version=1)
+    cache.store(_vec(0, 1, 0), {"answer": "y"}, version=1)
+    assert cache.lookup(_vec(1, 0, 0), version=1)  # x is now the fresher one
+
+    cache.store(_vec(0, 0, 1), {"answer": "z"}, version=1)
+    assert cache.lookup(_vec(1, 0, 0), version=1) == {"answer": "x"}
+    assert cache.lookup(_vec(0, 1, 0), version=1) is None
+    assert cache.lookup(_vec(0, 0, 1), version=1) == {"answer": "z"}
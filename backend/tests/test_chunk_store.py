@@ -0,0 +1,44 @@
+import json
+
+from backend.app.utils.chunk_store import ChunkStore, backfill, hydrate, rebuild
+
+def _chunk(file_id, i, text=None):
+    return {"id": f"{file_id}#{i}", "file_id": file_id, "title": file_id, "source": f"{file_id}.txt",
+            "text": text or f"{file_id} chunk {i}", "chunk_index": i}
+
+def test_put_get_and_delete_by_file(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))
+    store.put_many([_chunk("a", 0), _chunk("a", 1), _chunk("b", 0)])
+
+    found = store.get_many(["a#1", "b#0", "missing"])
+    assert set(found) == {"a#1", "b#0"}
+    assert found["a#1"] == {"title": "a", "source": "a.txt", "text": "a chunk 1", "file_id": "a", "chunk_index": 1}
+
+    store.delete_by_file("a")
+    assert store.count() == 1 and not store.get_many(["a#0", "a#1"])
+
+def test_hydrate_fills_metadata_and_reports_missing_ids(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))
+    store.put_many([_chunk("a", 0)])
+    matches = [{"id": "a#0", "score": 0.9, "metadata": {"file_id": "a"}}, {"id": "b#0", "score": 0.5}]
+
+    assert hydrate(store, matches) is False
+    assert matches[0]["metadata"]["text"] == "a chunk 0"
+    assert hydrate(store, matches[:1]) is True
+
+def test_backfill_copies_text_from_index_metadata(tmp_path):
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))
+    matches = [{"id": "a#0", "metadata": _chunk("a", 0)}, {"id": "a#1", "metadata": {"file_id": "a"}}]
+
+    backfill(store, matches)
+    assert list(store.get_many(["a#0", "a#1"])) == ["a#0"]  # no text, nothing to copy
+
+def test_rebuild_loads_per_file_chunks_only(tmp_path):
+    chunk_dir = tmp_path / "chunks"
+    chunk_dir.mkdir()
+    for name, chunks in {"a.jsonl": [_chunk("a", 0), _chunk("a", 1)], "all_chunks.jsonl": [_chunk("x", 0)]}.items():
+        (chunk_dir / name).write_text("".join(json.dumps(c) + "\n" for c in chunks), encoding="utf-8")
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))
+
+    assert rebuild(store, chunk_dir) == 2
+    assert store.count() == 2 and not store.get_many(["x#0"])
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+from backend.app.utils.universal_preprocess import RAW_DIR, TokenChunker, chunk_text, get_encoder, make_chunk_id, output_stem
+
+def _document(paragraphs=60):
+    return "\n\n".join(
+        f"Paragraph {i}. " + " ".join(f"Sentence {j} of paragraph {i} talks about topic {i % 7}." for j in range(6))
+        for i in range(paragraphs)
+    )
+
+def test_short_text_is_one_chunk():
+    chunks = chunk_text("A short note.", source="note.txt", title="note", doc_id="doc1")
+    assert len(chunks) == 1
+    ch = chunks[0]
+    assert ch["text"] == "A short note."
+    assert ch["id"].startswith("doc1#")
+    assert (ch["file_id"], ch["chunk_index"], ch["source"], ch["title"]) == ("doc1", 0, "note.txt", "note")
+
+def test_chunks_respect_the_token_budget():
+    enc = get_encoder()
+    chunks = chunk_text(_document(), source="doc.txt", title="doc", chunk_tokens=120, overlap=20)
+    assert len(chunks) > 5
+    assert [ch["chunk_index"] for ch in chunks] == list(range(len(chunks)))
+    for ch in chunks:
+        assert ch["tokens"] <= 120
+        assert len(enc.encode_ordinary(ch["text"])) <= 120
+
+def test_chunks_end_on_paragraph_boundaries():
+    chunks = chunk_text(_document(), source="doc.txt", title="doc", chunk_tokens=200, overlap=0)
+    for ch in chunks[:-1]:
+        assert ch["text"].endswith(".")
+
+def test_ids_are_content_derived():
+    doc = _document(20)
+    first = [ch["id"] for ch in chunk_text(doc, source="d", title="d", chunk_tokens=100, doc_id="f")]
+    again = [ch["id"] for ch in chunk_text(doc, source="d", title="d", chunk_tokens=100, doc_id="f")]
+    assert first == again
+    assert len(set(first)) == len(first)
+
+    # editing the start leaves the ids of untouched later chunks alone
+    edited = [ch["id"] for ch in chunk_text("New intro.\n\n" + doc, source="d", title="d", chunk_tokens=100, doc_id="f")]
+    assert set(first[-3:]) <= set(edited)
+
+def test_repeated_text_gets_distinct_ids():
+    assert make_chunk_id("f", "same") != make_chunk_id("f", "same", occurrence=1)
+    assert make_chunk_id("f", "same") == make_chunk_id("f", "same")
+
+def test_streaming_matches_one_shot():
+    doc = _document(200)
+    chunker = TokenChunker("doc.txt", "doc", chunk_tokens=150, overlap=30, doc_id="f")
+    streamed = []
+    for i in range(0, len(doc), 997):
+        streamed += chunker.feed(doc[i:i + 997])
+    streamed += chunker.close()
+    assert streamed == chunk_text(doc, "doc.txt", "doc", chunk_tokens=150, overlap=30, doc_id="f")
+
+def test_empty_text_has_no_chunks():
+    assert chunk_text("", source="e", title="e") == []
+
+def test_output_names_are_unique_per_raw_path():
+    a, b = output_stem(RAW_DIR / "a" / "notes.pdf"), output_stem(RAW_DIR / "b" / "notes.txt")
+    assert a.startswith("notes-") and b.startswith("notes-") and a != b
+    assert output_stem(RAW_DIR / "a" / "notes.pdf") == a
+
+def test_cli_keeps_drive_ids_for_synced_downloads(tmp_path, monkeypatch):
+    import json
+
+    from backend.app.utils import universal_preprocess as up
+
+    raw, chunks_dir = tmp_path / "raw", tmp_path / "chunks"
+    for d in (raw / "DRIVEFILE1", raw / "notes", tmp_path / "interim", chunks_dir):
+        d.mkdir(parents=True)
+    (raw / "DRIVEFILE1" / "notes.txt").write_text("Synced from Drive by auto_ingest.")
+    (raw / "notes" / "local.txt").write_text("Dropped into the raw folder by hand.")
+    monkeypatch.setattr(up, "RAW_DIR", raw)
+    monkeypatch.setattr(up, "INTERIM_DIR", tmp_path / "interim")
+    monkeypatch.setattr(up, "CHUNK_DIR", chunks_dir)
+    monkeypatch.setattr(up, "HASH_INDEX", chunks_dir / "_content_hashes.json")
+    monkeypatch.setattr(up, "AGGREGATE_FILE", chunks_dir / "all_chunks.jsonl")
+    monkeypatch.setattr(up, "known_file_ids", lambda: {"DRIVEFILE1"})
+
+    up.main([])
+    rows = [json.loads(line) for line in (chunks_dir / "all_chunks.jsonl").read_text().splitlines()]
+    by_source = {Path(r["source"]).name: r for r in rows}
+    assert by_source["notes.txt"]["id"].startswith("DRIVEFILE1#")
+    assert by_source["notes.txt"]["file_id"] == "DRIVEFILE1"
+    assert "file_id" not in by_source["local.txt"]  # "notes" is not a Drive file id
@@ -0,0 +1,130 @@
+import asyncio
+
+from backend.app.utils.coalesce import MicroBatcher, SingleFlight
+
+def test_single_flight_shares_one_call():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        flight = SingleFlight()
+        results = await asyncio.gather(*[flight.do("q", work) for _ in range(5)])
+        return flight, results
+
+    flight, results = asyncio.run(main())
+    assert len(calls) == 1
+    assert [r for r, _ in results] == ["answer"] * 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flight.stats() == {"inflight": 0, "started": 1, "joined": 4}
+
+def test_single_flight_keys_and_sequential_calls_do_not_share():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return len(calls)
+
+    async def main():
+        flight = SingleFlight()
+        together = await asyncio.gather(flight.do("a", work), flight.do("b", work))
+        later = await flight.do("a", work)
+        return together, later
+
+    together, later = asyncio.run(main())
+    assert len(calls) == 3
+    assert all(not shared for _, shared in together) and later == (3, False)
+
+def test_single_flight_error_reaches_every_caller():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        flight = SingleFlight()
+        return await asyncio.gather(*[flight.do("q", fail) for _ in range(3)], return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(main()))
+
+def test_single_flight_survives_a_cancelled_caller():
+    async def work():
+        await asyncio.sleep(0.02)
+        return 42
+
+    async def main():
+        flight = SingleFlight()
+        first = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == (42, True)
+
+def test_micro_batcher_gathers_one_window():
+    batches = []
+
+    async def double(items):
+        batches.append(list(items))
+        return [i * 2 for i in items]
+
+    async def main():
+        batcher = MicroBatcher(double, window=0.01, max_batch=64)
+        return batcher, await asyncio.gather(*[batcher.submit(i) for i in range(10)])
+
+    batcher, results = asyncio.run(main())
+    assert results == [i * 2 for i in range(10)]
+    assert batches == [list(range(10))]
+    assert batcher.stats() == {"batches": 1, "items": 10, "avg_batch": 10.0}
+
+def test_micro_batcher_splits_at_max_batch():
+    batches = []
+
+    async def echo(items):
+        batches.append(len(items))
+        return items
+
+    async def main():
+        batcher = MicroBatcher(echo, window=1.0, max_batch=4)
+        return await asyncio.wait_for(asyncio.gather(*[batcher.submit(i) for i in range(8)]), timeout=0.5)
+
+    assert asyncio.run(main()) == list(range(8))
+    assert batches == [4, 4]
+
+def test_micro_batcher_zero_window_is_unbatched():
+    batches = []
+
+    async def echo(items):
+        batches.append(len(items))
+        return items
+
+    async def main():
+        batcher = MicroBatcher(echo, window=0)
+        return await asyncio.gather(*[batcher.submit(i) for i in range(3)])
+
+    assert asyncio.run(main()) == [0, 1, 2]
+    assert batches == [1, 1, 1]
+
+def test_micro_batcher_error_fails_the_batch():
+    async def boom(items):
+        raise ValueError("bad batch")
+
+    async def main():
+        batcher = MicroBatcher(boom, window=0.005)
+        return await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+def test_micro_batcher_works_across_event_loops():
+    async def echo(items):
+        return items
+
+    batcher = MicroBatcher(echo, window=0.005)
+    assert asyncio.run(batcher.submit("a")) == "a"
+    assert asyncio.run(batcher.submit("b")) == "b"
@@ -0,0 +1,67 @@
+from backend.app.utils.context_packer import SEPARATOR, encoder_for, pack_context
+
+MODEL = "gpt-4"  # cl100k_base, available offline
+
+def _match(text, score, source="a.txt", idx=None):
+    md = {"text": text, "source": source, "title": source}
+    if idx is not None:
+        md["chunk_index"] = idx
+    return {"metadata": md, "score": score}
+
+def _label(md):
+    return md["title"]
+
+def test_adjacent_and_overlapping_chunks_merge():
+    matches = [
+        _match("The quick brown fox jumps over the lazy dog near the river bank today.", 0.9, idx=0),
+        _match("near the river bank today. Then it ran into the forest and hid.", 0.8, idx=1),
+        _match("A separate paragraph much later in the same file.", 0.7, idx=5),
+    ]
+    packed = pack_context(matches, 1000, _label, model=MODEL)
+    assert packed.merged == 1 and packed.segments == 2
+    assert "near the river bank today. Then it ran" in packed.text
+    assert packed.text.count("near the river bank today.") == 1
+
+def test_near_duplicates_from_other_sources_are_dropped():
+    text = " ".join(f"Fact number {i} about the deployment pipeline." for i in range(30))
+    matches = [_match(text, 0.9, "a.txt"), _match(text + " One extra line.", 0.8, "b.txt")]
+    packed = pack_context(matches, 2000, _label, model=MODEL)
+    assert packed.duplicates == 1
+    assert packed.sources == ["a.txt"]
+
+def test_short_distinct_segments_sharing_vocabulary_are_kept():
+    # the same tokens in a different order say different things
+    matches = [
+        _match("The cache stores the vector, not the text.", 0.9, "a.txt"),
+        _match("The text stores the cache, not the vector.", 0.8, "b.txt"),
+        _match("The vector stores the text, not the cache.", 0.7, "c.txt"),
+    ]
+    packed = pack_context(matches, 1000, _label, model=MODEL)
+    assert packed.duplicates == 0
+    assert packed.sources == ["a.txt", "b.txt", "c.txt"]
+
+def test_budget_is_respected_and_the_first_overflow_is_truncated():
+    enc = encoder_for(MODEL)
+    long_text = " ".join(f"Sentence {i} describes a distinct detail." for i in range(200))
+    matches = [_match("Short first segment.", 0.9, "a.txt"), _match(long_text, 0.8, "b.txt"),
+               _match("Another short one that no longer fits.", 0.7, "c.txt")]
+    packed = pack_context(matches, 300, _label, model=MODEL)
+    assert packed.truncated and packed.tokens <= 300
+    assert len(enc.encode(packed.text)) <= 300 + 2  # re-encoding across seams may differ slightly
+    assert packed.skipped == 1 and packed.sources == ["a.txt", "b.txt"]
+    assert packed.text.count(SEPARATOR) == 1
+
+def test_longer_superset_of_a_kept_segment_is_kept():
+    short = "The ingestion service retries failed downloads three times before giving up."
+    extra = " ".join(f"Step {i} of the runbook covers a different recovery action." for i in range(20))
+    matches = [_match(short, 0.9, "a.txt"), _match(short + " " + extra, 0.8, "b.txt")]
+    packed = pack_context(matches, 2000, _label, model=MODEL)
+    assert packed.duplicates == 0 and packed.segments == 2
+    assert "Step 19 of the runbook" in packed.text
+
+def test_subset_of_a_kept_segment_is_dropped():
+    long_text = " ".join(f"Fact number {i} about the deployment pipeline." for i in range(30))
+    subset = " ".join(f"Fact number {i} about the deployment pipeline." for i in range(10, 20))
+    matches = [_match(long_text, 0.9, "a.txt"), _match(subset, 0.8, "b.txt")]
+    packed = pack_context(matches, 2000, _label, model=MODEL)
+    assert packed.duplicates == 1 and packed.sources == ["a.txt"]
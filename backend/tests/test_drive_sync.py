@@ -0,0 +1,322 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend.benchmarks.fakes import FakeDrive, fake_embedding
+
+FOLDER = "test-folder"
+
+@pytest.fixture
+def sync(tmp_path, monkeypatch):
+    """
+    process_new_drive_files against a FakeDrive folder and a local vector
+    store, run from tmp_path so every backend/data path lands there.
+    Embeddings are deterministic hashes of the chunk text.
+    """
+    from backend.app.services import auto_ingest
+    from backend.app.utils import index_profile, state_store, vector_store
+
+    monkeypatch.chdir(tmp_path)
+    for sub in ("raw", "interim", "processed/chunks"):
+        (tmp_path / "backend/data" / sub).mkdir(parents=True)
+    monkeypatch.setenv("GOOGLE_DRIVE_FOLDER_ID", FOLDER)
+    monkeypatch.setattr(auto_ingest, "GOOGLE_DRIVE_FOLDER_ID", FOLDER)
+    monkeypatch.setattr(auto_ingest, "RAW_DIR", tmp_path / "backend/data/raw")
+    for name, value in {
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": str(tmp_path / "vectors"),
+        "DRIVE_SYNC_MODE": "changes",
+        "INGEST_PARSE_WORKERS": 0,
+        "CHUNK_STORE_PATH": "",
+        "OPENAI_EMBED_MODEL": "text-embedding-3-small",
+        "EMBED_DIMENSIONS": 16,  # the fake embeddings' size
+    }.items():
+        monkeypatch.setattr(auto_ingest.settings, name, value)
+    index_profile.get_index_profile.cache_clear()
+    monkeypatch.setattr(auto_ingest, "get_chunk_store", lambda: None)
+    monkeypatch.setattr(auto_ingest, "embed_batch",
+                        lambda texts, token_counts=None: [fake_embedding(t, 16).tolist() for t in texts])
+    monkeypatch.setattr(vector_store, "_stores", {})
+    monkeypatch.setattr(vector_store, "_pointer_cache", {"mtime": None, "pointer": None})
+    state_store._db.cache_clear()
+
+    folder = tmp_path / "drive"
+    folder.mkdir()
+    drive = FakeDrive(folder)
+    drive.install(auto_ingest)
+
+    def run():
+        return auto_ingest.process_new_drive_files()
+
+    run.drive = drive
+    run.folder = folder
+    run.store = lambda: vector_store.get_vector_store()
+    yield run
+    index_profile.get_index_profile.cache_clear()
+    state_store._db.cache_clear()
+
+def _write(folder, name, words=400, seed=0, bump=0):
+    rng = np.random.default_rng(seed)
+    vocab = ["alpha", "beta", "gamma", "delta", "drive", "sync", "token", "feed", "index", "chunk"]
+    path = folder / name
+    path.write_text(" ".join(rng.choice(vocab, words)) + ".\n", encoding="utf-8")
+    if bump:
+        st = path.stat()
+        os.utime(path, (st.st_atime, st.st_mtime + bump))
+    return path
+
+def _file_ids(store):
+    ids = store.list_ids()
+    return {vid.split("#")[0] for vid in ids}
+
+def test_first_sync_lists_folder_and_saves_token(sync):
+    from backend.app.utils.state_store import load_drive_token
+
+    for i in range(3):
+        _write(sync.folder, f"doc{i}.txt", seed=i)
+    result = sync()
+
+    assert (result["processed"], result["failed"]) == (3, 0)
+    assert _file_ids(sync.store()) == {"fake-doc0.txt", "fake-doc1.txt", "fake-doc2.txt"}
+    assert load_drive_token() == str(len(sync.drive.changes))
+
+def test_changes_feed_only_touches_changed_files(sync):
+    for i in range(3):
+        _write(sync.folder, f"doc{i}.txt", seed=i)
+    sync()
+    downloads = sync.drive.downloads
+
+    assert sync() == {"processed": 0, "skipped": 0, "unchanged": 0, "failed": 0, "removed": 0, "found": 0}
+    assert sync.drive.downloads == downloads
+
+    _write(sync.folder, "doc1.txt", seed=10, bump=10)
+    _write(sync.folder, "doc3.txt", seed=3)
+    result = sync()
+    assert (result["found"], result["processed"]) == (2, 2)
+    assert sync.drive.downloads == downloads + 2
+    assert _file_ids(sync.store()) == {"fake-doc0.txt", "fake-doc1.txt", "fake-doc2.txt", "fake-doc3.txt"}
+
+def test_touched_but_identical_file_is_not_reindexed(sync):
+    _write(sync.folder, "doc0.txt", seed=0)
+    sync()
+    before = sorted(sync.store().list_ids())
+
+    _write(sync.folder, "doc0.txt", seed=0, bump=10)  # new modifiedTime, same bytes
+    result = sync()
+    assert (result["found"], result["unchanged"], result["processed"]) == (1, 1, 0)
+    assert sorted(sync.store().list_ids()) == before
+
+def test_deleted_and_trashed_files_are_removed(sync):
+    from backend.app.utils.state_store import known_file_ids
+
+    for i in range(3):
+        _write(sync.folder, f"doc{i}.txt", seed=i)
+    sync()
+
+    (sync.folder / "doc0.txt").unlink()
+    sync.drive.trash("doc1.txt")
+    result = sync()
+
+    assert result["removed"] == 2
+    assert _file_ids(sync.store()) == {"fake-doc2.txt"}
+    assert known_file_ids() == {"fake-doc2.txt"}
+
+def test_token_advances_past_failures_and_they_are_retried(sync):
+    from backend.app.utils.state_store import load_drive_token, load_file_record
+
+    _write(sync.folder, "doc0.txt", seed=0)
+    sync()
+
+    _write(sync.folder, "doc1.txt", seed=1)
+    _write(sync.folder, "doc2.txt", seed=2)
+    sync.drive.fail_downloads.add("doc2.txt")
+    result = sync()
+    assert (result["processed"], result["failed"]) == (1, 1)
+    assert load_drive_token() == str(len(sync.drive.changes))  # not pinned by the failure
+    assert load_file_record("fake-doc2.txt")["status"] == "failed"
+
+    # still failing: retried from the state store, with no new changes to replay
+    result = sync()
+    assert (result["found"], result["failed"]) == (1, 1)
+
+    sync.drive.fail_downloads.clear()
+    result = sync()
+    assert (result["processed"], result["failed"]) == (1, 0)  # doc1 is already indexed
+    assert _file_ids(sync.store()) == {"fake-doc0.txt", "fake-doc1.txt", "fake-doc2.txt"}
+    assert sync()["found"] == 0
+
+def test_full_mode_detects_removals_without_a_token(sync, monkeypatch):
+    from backend.app.services import auto_ingest
+    from backend.app.utils.state_store import load_drive_token
+
+    monkeypatch.setattr(auto_ingest.settings, "DRIVE_SYNC_MODE", "full")
+    for i in range(2):
+        _write(sync.folder, f"doc{i}.txt", seed=i)
+    assert sync()["processed"] == 2
+    (sync.folder / "doc1.txt").unlink()
+    assert sync()["removed"] == 1
+    assert load_drive_token() is None
+
+# -------------------------------
+# Drive API pagination
+# -------------------------------
+class _Request:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+class _PagedResource:
+    """files() / changes() stand-in that serves `pages` keyed by pageToken."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def list(self, pageToken=None, **kwargs):
+        self.calls.append(pageToken)
+        return _Request(self.pages[pageToken])
+
+    def getStartPageToken(self):
+        return _Request({"startPageToken": "100"})
+
+class _Service:
+    def __init__(self, files=None, changes=None):
+        self._files, self._changes = files, changes
+
+    def files(self):
+        return self._files
+
+    def changes(self):
+        return self._changes
+
+def test_list_files_follows_every_page(monkeypatch):
+    from backend.app.utils import gdrive_service
+
+    files = _PagedResource({
+        None: {"files": [{"id": "a"}, {"id": "b"}], "nextPageToken": "p2"},
+        "p2": {"files": [{"id": "c"}], "nextPageToken": "p3"},
+        "p3": {"files": []},
+    })
+    monkeypatch.setattr(gdrive_service, "_get_drive_service", lambda: _Service(files=files))
+
+    assert [f["id"] for f in gdrive_service.list_files_in_folder(FOLDER)] == ["a", "b", "c"]
+    assert files.calls == [None, "p2", "p3"]
+
+def test_list_changes_pages_until_new_start_token(monkeypatch):
+    from backend.app.utils import gdrive_service
+
+    changes = _PagedResource({
+        "7": {"changes": [{"fileId": "a", "removed": False}], "nextPageToken": "8"},
+        "8": {"changes": [{"fileId": "b", "removed": True}], "nextPageToken": "9"},
+        "9": {"changes": [], "newStartPageToken": "10"},
+    })
+    monkeypatch.setattr(gdrive_service, "_get_drive_service", lambda: _Service(changes=changes))
+
+    found, token = gdrive_service.list_changes("7")
+    assert [c["fileId"] for c in found] == ["a", "b"]
+    assert token == "10"
+    assert changes.calls == ["7", "8", "9"]
+    assert gdrive_service.get_start_page_token() == "100"
+
+# -------------------------------
+# Streaming download with resume
+# -------------------------------
+class _MediaRequest:
+    def __init__(self, content, log):
+        self.content, self.log = content, log
+        self.headers = {}
+
+    def execute(self, num_retries=0):
+        start, end = (int(x) for x in self.headers["range"][len("bytes="):].split("-"))
+        self.log.append((start, end))
+        return self.content[start:end + 1]
+
+class _MediaFiles:
+    def __init__(self, content):
+        self.content = content
+        self.ranges = []
+
+    def get_media(self, fileId):
+        return _MediaRequest(self.content, self.ranges)
+
+def _serve(monkeypatch, content, chunk):
+    from backend.app.utils import gdrive_service
+
+    files = _MediaFiles(content)
+    monkeypatch.setattr(gdrive_service, "_get_drive_service", lambda: _Service(files=files))
+    monkeypatch.setattr(gdrive_service, "DOWNLOAD_CHUNK_BYTES", chunk)
+    return gdrive_service, files
+
+def test_download_streams_in_ranges_and_verifies(tmp_path, monkeypatch):
+    import hashlib
+
+    content = bytes(range(256)) * 40
+    gdrive_service, files = _serve(monkeypatch, content, chunk=1000)
+    dest = tmp_path / "f.bin"
+
+    gdrive_service.download_file("id", "f.bin", "application/octet-stream", str(dest),
+                                 size=len(content), md5=hashlib.md5(content).hexdigest())
+    assert dest.read_bytes() == content
+    assert files.ranges[0] == (0, 999) and files.ranges[-1] == (10000, 10999)
+    assert not (tmp_path / "f.bin.part").exists()
+
+    # already complete and matching: no request at all
+    files.ranges.clear()
+    gdrive_service.download_file("id", "f.bin", "application/octet-stream", str(dest),
+                                 size=len(content), md5=hashlib.md5(content).hexdigest())
+    assert files.ranges == []
+
+def test_download_resumes_a_matching_part_file(tmp_path, monkeypatch):
+    import hashlib
+
+    content = b"0123456789" * 350
+    md5 = hashlib.md5(content).hexdigest()
+    gdrive_service, files = _serve(monkeypatch, content, chunk=1000)
+    dest = tmp_path / "f.txt"
+    (tmp_path / "f.txt.part").write_bytes(content[:1500])
+    (tmp_path / "f.txt.part.md5").write_text(md5)
+
+    gdrive_service.download_file("id", "f.txt", "text/plain", str(dest), size=len(content), md5=md5)
+    assert dest.read_bytes() == content
+    assert files.ranges[0] == (1500, 2499)
+
+def test_download_discards_a_stale_part_file(tmp_path, monkeypatch):
+    import hashlib
+
+    content = b"fresh bytes " * 100
+    gdrive_service, files = _serve(monkeypatch, content, chunk=512)
+    dest = tmp_path / "f.txt"
+    (tmp_path / "f.txt.part").write_bytes(b"old content from another version")
+    (tmp_path / "f.txt.part.md5").write_text("not-the-same-md5")
+
+    gdrive_service.download_file("id", "f.txt", "text/plain", str(dest),
+                                 size=len(content), md5=hashlib.md5(content).hexdigest())
+    assert dest.read_bytes() == content
+    assert files.ranges[0] == (0, 511)
+
+def test_download_rejects_a_checksum_mismatch(tmp_path, monkeypatch):
+    gdrive_service, _ = _serve(monkeypatch, b"payload", chunk=512)
+    with pytest.raises(IOError):
+        gdrive_service.download_file("id", "f.txt", "text/plain", str(tmp_path / "f.txt"), size=7, md5="0" * 32)
+    assert not (tmp_path / "f.txt").exists() and not (tmp_path / "f.txt.part").exists()
+
+def test_delete_existing_empties_the_index_and_the_next_sync_refills_it(sync):
+    import runpy
+
+    from backend.app.utils.state_store import get_ingest_version, load_drive_token
+
+    for i in range(2):
+        _write(sync.folder, f"doc{i}.txt", seed=i)
+    sync()
+    version = get_ingest_version()
+
+    runpy.run_module("backend.app.utils.delete_existing", run_name="__main__")
+    assert sync.store().count() == 0
+    assert load_drive_token() is None and get_ingest_version() > version
+
+    result = sync()
+    assert result["processed"] == 2
+    assert _file_ids(sync.store()) == {"fake-doc0.txt", "fake-doc1.txt"}
@@ -0,0 +1,37 @@
+from backend.app.utils.embedding_store import EmbeddingStore, content_key
+
+def _last_used(store, text):
+    return store._db.execute(
+        "SELECT last_used FROM embeddings WHERE key = ?", (content_key("m", text),)
+    ).fetchone()[0]
+
+def test_round_trip_and_counters(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "e.sqlite"))
+    store.put_many("m", ["a", "b"], [[1.0, 2.0], None])
+    assert store.get_many("m", ["a", "b", "a"]) == [[1.0, 2.0], None, [1.0, 2.0]]
+    assert store.get_many("m", ["a"], dimensions=8) == [None]  # dimensions are part of the key
+    stats = store.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 2, 1)
+
+def test_hits_defer_recency_writes_until_flush(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "e.sqlite"))
+    store.put_many("m", ["a"], [[1.0]])
+    before = _last_used(store, "a")
+
+    store.get_many("m", ["a"])
+    assert store._db.in_transaction is False
+    assert _last_used(store, "a") == before
+
+    store.flush()
+    assert _last_used(store, "a") > before
+
+def test_eviction_keeps_recently_read_entries(tmp_path):
+    vec = [0.0] * 64  # 256 bytes each
+    store = EmbeddingStore(str(tmp_path / "e.sqlite"), max_bytes=256 * 4)
+    store.put_many("m", ["read", "b", "c"], [vec, vec, vec])
+    store.get_many("m", ["read"])  # only recorded in memory so far
+    store.put_many("m", ["d", "e"], [vec, vec])  # over the cap: evict to 90%
+
+    remaining = store.get_many("m", ["read", "b", "c", "d", "e"])
+    assert [v is not None for v in remaining] == [True, False, False, True, True]
+    assert store.evicted == 2
@@ -0,0 +1,17 @@
+import pytest
+
+from backend.app.utils.index_profile import make_profile
+
+def test_native_and_shortened_profiles():
+    assert make_profile("text-embedding-3-small").dimension == 1536
+    profile = make_profile("text-embedding-3-small", 256)
+    assert profile.request_dimensions == 256 and profile.cache_key == "text-embedding-3-small@256"
+    with pytest.raises(ValueError):
+        make_profile("text-embedding-ada-002", 256)
+
+def test_metric_must_be_supported_by_the_backend():
+    assert make_profile("text-embedding-3-small", metric="euclidean", backend="pinecone").metric == "euclidean"
+    with pytest.raises(ValueError, match="local"):
+        make_profile("text-embedding-3-small", metric="euclidean", backend="local")
+    with pytest.raises(ValueError):
+        make_profile("text-embedding-3-small", metric="manhattan")
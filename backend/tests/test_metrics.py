@@ -0,0 +1,32 @@
+from backend.app.utils import metrics
+from backend.app.utils.metrics import Counter, Histogram
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram("test_latency_seconds", "Test latency.", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        h.observe(value, stage="embed")
+
+    lines = h.render().splitlines()
+    assert lines[:2] == ["# HELP test_latency_seconds Test latency.", "# TYPE test_latency_seconds histogram"]
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{stage="embed",le="0.1"} 1',
+        'test_latency_seconds_bucket{stage="embed",le="1.0"} 3',
+        'test_latency_seconds_bucket{stage="embed",le="+Inf"} 4',
+        'test_latency_seconds_sum{stage="embed"} 4.05',
+        'test_latency_seconds_count{stage="embed"} 4',
+    ]
+    assert h.count(stage="embed") == 4 and h.count(stage="llm") == 0
+
+def test_counter_escapes_label_values():
+    c = Counter("test_events_total", "Test events.", ["kind"])
+    c.inc(kind='say "hi"\n')
+    c.inc(2, kind='say "hi"\n')
+
+    assert c.value(kind='say "hi"\n') == 3
+    assert c.render().splitlines()[-1] == 'test_events_total{kind="say \\"hi\\"\\n"} 3.0'
+
+def test_render_includes_every_registered_metric():
+    text = metrics.render()
+    for name in ("rag_stage_seconds", "rag_answer_seconds", "ingest_stage_seconds", "cache_lookups_total"):
+        assert f"# TYPE {name} " in text
+    assert text.endswith("\n")
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from backend.app.utils.query_cache import QueryEmbeddingCache, normalize_query
+
+def test_normalized_text_hits_and_model_is_part_of_the_key():
+    cache = QueryEmbeddingCache(max_entries=10)
+    cache.put("What is the sync interval?", "m", [1.0, 2.0])
+    assert cache.get("  what is the SYNC   interval ", "m") == [1.0, 2.0]
+    assert cache.get("What is the sync interval?", "other-model") is None
+    assert normalize_query("Hello   World?!") == "hello world"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_memory_tier_is_lru_bounded():
+    cache = QueryEmbeddingCache(max_entries=2)
+    cache.put("a", "m", [1.0])
+    cache.put("b", "m", [2.0])
+    cache.get("a", "m")  # a is now the most recent
+    cache.put("c", "m", [3.0])
+    assert cache.get("b", "m") is None and cache.get("a", "m") == [1.0]
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    cache = QueryEmbeddingCache(ttl_seconds=60)
+    cache.put("q", "m", [1.0])
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("q", "m") is None
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    QueryEmbeddingCache(disk_path=path).put("persisted question", "m", [0.5, 0.25])
+    reopened = QueryEmbeddingCache(disk_path=path)
+    assert reopened.get("persisted question", "m") == [0.5, 0.25]
+    assert reopened.stats()["disk_hits"] == 1
+    assert reopened.get("persisted question", "m") == [0.5, 0.25]  # promoted to memory
+    assert reopened.stats()["hits"] == 1
+
+def test_disk_tier_keeps_the_newest_entries_up_to_its_cap(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    cache = QueryEmbeddingCache(disk_path=path, max_disk_entries=3)
+    for i in range(5):
+        cache.put(f"q{i}", "m", [float(i)])
+        time.sleep(0.001)
+    reopened = QueryEmbeddingCache(disk_path=path, max_disk_entries=3)  # prunes on open
+    assert [reopened.get(f"q{i}", "m") for i in range(5)] == [None, None, [2.0], [3.0], [4.0]]
+
+def test_async_lookups_match_the_sync_api(tmp_path):
+    cache = QueryEmbeddingCache(disk_path=str(tmp_path / "q.sqlite"))
+
+    async def run():
+        await cache.aput_many({"a": [1.0], "b": [2.0]}, "m")
+        return await cache.aget("a", "m"), await cache.aget_many(["b", "missing", "a"], "m")
+
+    one, many = asyncio.run(run())
+    assert one == [1.0] and many == [[2.0], None, [1.0]]
@@ -0,0 +1,222 @@
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI, OpenAI
+
+from backend.app.utils.embed_batcher import MAX_TOKENS_PER_INPUT, count_tokens
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch, fake_openai):
+    """
+    rag_service against the fake OpenAI and a local vector store, run from
+    tmp_path so every backend/data path lands there; caches start empty.
+    """
+    from backend.app.services import rag_service
+    from backend.app.utils import index_profile, state_store, vector_store
+    from backend.app.utils.answer_cache import SemanticAnswerCache
+    from backend.app.utils.coalesce import MicroBatcher, SingleFlight
+    from backend.app.utils.query_cache import QueryEmbeddingCache
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "backend/data/processed").mkdir(parents=True)
+    for name, value in {
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": str(tmp_path / "vectors"),
+        "OPENAI_EMBED_MODEL": "text-embedding-3-small",
+        "EMBED_DIMENSIONS": 16,
+        "CHUNK_STORE_PATH": "",
+        "MIN_SCORE": 0.0,
+    }.items():
+        monkeypatch.setattr(rag_service.settings, name, value)
+    index_profile.get_index_profile.cache_clear()
+    monkeypatch.setattr(vector_store, "_stores", {})
+    monkeypatch.setattr(vector_store, "_pointer_cache", {"mtime": None, "pointer": None})
+    state_store._db.cache_clear()
+
+    base_url = f"{fake_openai.url}/v1"
+    monkeypatch.setattr(rag_service, "_oai", OpenAI(api_key="test", base_url=base_url))
+    monkeypatch.setattr(rag_service, "_aoai", AsyncOpenAI(api_key="test", base_url=base_url))
+    monkeypatch.setattr(rag_service, "get_chunk_store", lambda: None)
+    monkeypatch.setattr(rag_service, "_query_cache", QueryEmbeddingCache(max_entries=1000, ttl_seconds=3600))
+    monkeypatch.setattr(rag_service, "_answer_cache", SemanticAnswerCache(max_entries=100, threshold=0.97))
+    monkeypatch.setattr(rag_service, "_inflight_answers", SingleFlight())
+    monkeypatch.setattr(rag_service, "_query_embedder", MicroBatcher(rag_service._embed_many_async, window=0.02))
+    yield rag_service
+    index_profile.get_index_profile.cache_clear()
+    state_store._db.cache_clear()
+
+def test_an_oversized_question_does_not_fail_its_batching_window(rag, monkeypatch):
+    sent = []
+    real = rag._embed_request
+
+    async def recording(profile, texts):
+        sent.append([count_tokens(t) for t in texts])
+        return await real(profile, texts)
+
+    monkeypatch.setattr(rag, "_embed_request", recording)
+    monkeypatch.setattr(rag.settings, "EMBED_BATCH_MAX_INPUTS", 4)
+    questions = [f"What changed in release {i}?" for i in range(9)] + ["word " * (MAX_TOKENS_PER_INPUT + 500)]
+
+    async def ask_all():
+        return await asyncio.gather(*[rag._embed_async(q) for q in questions])
+
+    vecs = asyncio.run(ask_all())
+    assert len(vecs) == 10 and all(len(v) == 16 for v in vecs)
+    assert len(sent) == 3  # one window, split by EMBED_BATCH_MAX_INPUTS
+    assert all(len(r) <= 4 and max(r) <= MAX_TOKENS_PER_INPUT for r in sent)
+    assert rag._query_embedder.stats()["batches"] == 1
+
+def test_question_length_is_capped():
+    from pydantic import ValidationError
+
+    from backend.app.models.schema import MAX_QUESTION_CHARS, BatchQueryRequest, QueryRequest
+
+    QueryRequest(text="x" * MAX_QUESTION_CHARS)
+    with pytest.raises(ValidationError):
+        QueryRequest(text="x" * (MAX_QUESTION_CHARS + 1))
+    with pytest.raises(ValidationError):
+        BatchQueryRequest(questions=["ok", "x" * (MAX_QUESTION_CHARS + 1)])
+
+def _seed(texts):
+    from backend.app.utils.vector_store import get_vector_store
+    from backend.benchmarks.fakes import fake_embedding
+
+    store = get_vector_store()
+    store.reset(dimension=16, metric="cosine")
+    store.upsert([
+        (f"doc{i}#{i}", fake_embedding(t, 16).tolist(),
+         {"text": t, "title": f"doc{i}", "source": f"doc{i}.txt", "file_id": f"doc{i}", "chunk_index": 0})
+        for i, t in enumerate(texts)
+    ])
+
+def test_stream_closes_the_completion_when_the_reader_stops(rag, monkeypatch):
+    _seed(["The sync runs every five minutes.", "Reindexing switches the index pointer."])
+    streams = []
+    create = rag._aoai.chat.completions.create
+
+    async def recording_create(**kwargs):
+        stream = await create(**kwargs)
+        streams.append(stream)
+        return stream
+
+    monkeypatch.setattr(rag._aoai.chat.completions, "create", recording_create)
+
+    async def read_first_token():
+        answer = rag.stream_rag_answer("How often does the sync run?")
+        events = [await answer.__anext__(), await answer.__anext__()]
+        await answer.aclose()  # what the route does when the client disconnects
+        return events
+
+    events = asyncio.run(read_first_token())
+    assert [e for e, _ in events] == ["matches", "token"]
+    assert streams and streams[0].response.is_closed
+
+def test_chunk_store_and_version_reads_run_off_the_event_loop(rag, monkeypatch, tmp_path):
+    import threading
+
+    from backend.app.utils.chunk_store import ChunkStore
+
+    _seed(["Chunks keep their text in the chunk store.", "The index only holds vectors."])
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))  # empty: every match is backfilled
+    monkeypatch.setattr(rag, "get_chunk_store", lambda: store)
+    threads = {}
+
+    def spy(name):
+        real = getattr(rag, name)
+
+        def wrapper(*args):
+            threads.setdefault(name, set()).add(threading.get_ident())
+            return real(*args)
+        return wrapper
+
+    for name in ("_hydrate", "backfill", "get_ingest_version"):
+        monkeypatch.setattr(rag, name, spy(name))
+
+    async def ask():
+        loop_thread = threading.get_ident()
+        result = await rag.rag_answer_async("Where is the chunk text?")
+        return loop_thread, result
+
+    loop_thread, result = asyncio.run(ask())
+    assert result["matches"] and store.count() == 2
+    assert set(threads) == {"_hydrate", "backfill", "get_ingest_version"}
+    assert all(loop_thread not in idents for idents in threads.values())
+
+def test_repeated_question_is_embedded_once(rag, fake_openai):
+    async def ask_twice():
+        first = await rag._embed_async("How do I reindex?")
+        before = fake_openai.counters["embedding_requests"]
+        second = await rag._embed_async("how do i reindex")  # normalizes alike
+        return first, second, fake_openai.counters["embedding_requests"] - before
+
+    first, second, requests = asyncio.run(ask_twice())
+    assert first == second and requests == 0
+    assert rag.query_cache_stats()["hits"] == 1
+
+def test_an_ingest_version_bump_invalidates_cached_answers(rag, monkeypatch, fake_openai):
+    from backend.app.utils.state_store import bump_ingest_version
+
+    monkeypatch.setattr(rag.settings, "ANSWER_CACHE_ENABLED", True)
+    _seed(["The sync runs every five minutes.", "Reindexing switches the index pointer."])
+
+    def chats_for(question):
+        before = fake_openai.counters["chat_requests"]
+        result = asyncio.run(rag.rag_answer_async(question))
+        return result, fake_openai.counters["chat_requests"] - before
+
+    first, chats = chats_for("How often does the sync run?")
+    assert chats == 1
+    again, chats = chats_for("How often does the sync run?")
+    assert chats == 0 and again["answer"] == first["answer"]
+
+    bump_ingest_version()
+    _, chats = chats_for("How often does the sync run?")
+    assert chats == 1
+
+def test_batch_answers_keep_input_order_with_per_item_errors(rag, monkeypatch, capsys):
+    _seed(["The sync runs every five minutes.", "Reindexing switches the index pointer."])
+    monkeypatch.setattr(rag.settings, "ANSWER_CACHE_ENABLED", False)
+
+    async def answer(query, matches):
+        if "fail" in query:
+            raise RuntimeError("upstream said: invalid key sk-live-123")
+        await asyncio.sleep(0.05 if "slow" in query else 0)  # finishes after the others
+        return f"answer to {query}"
+
+    monkeypatch.setattr(rag, "answer_from_context_async", answer)
+    questions = ["slow: how often?", "   ", "fail: what switches?", "fast: what is reindexing?"]
+    results = asyncio.run(rag.rag_answer_batch(questions, concurrency=4))
+
+    assert [r["question"] for r in results] == questions
+    assert [r["answer"] for r in results] == ["answer to slow: how often?", None, None, "answer to fast: what is reindexing?"]
+    assert [r["error"] for r in results] == [None, "Query text is required.", "Could not answer this question.", None]
+    assert results[0]["matches"] and "llm_ms" in results[3]["timings"]
+    assert "sk-live-123" not in str(results) and "sk-live-123" in capsys.readouterr().out
+
+def test_an_answer_records_its_stage_timings(rag):
+    from backend.app.utils.metrics import RAG_ANSWER_SECONDS, RAG_STAGE_SECONDS
+
+    _seed(["The sync runs every five minutes.", "Reindexing switches the index pointer."])
+    stages = ("embed", "query", "context", "llm")
+    before = {s: RAG_STAGE_SECONDS.count(stage=s) for s in stages}
+    answers = RAG_ANSWER_SECONDS.count(endpoint="ask", cached="false")
+
+    asyncio.run(rag.rag_answer_async("How often does the sync run?"))
+    assert all(RAG_STAGE_SECONDS.count(stage=s) > before[s] for s in stages)
+    assert RAG_ANSWER_SECONDS.count(endpoint="ask", cached="false") == answers + 1
+
+def test_retrieval_reads_chunk_text_from_the_chunk_store(rag, monkeypatch, tmp_path):
+    from backend.app.utils.chunk_store import ChunkStore
+    from backend.app.utils.vector_store import get_vector_store
+    from backend.benchmarks.fakes import fake_embedding
+
+    text = "The sync runs every five minutes."
+    get_vector_store().reset(dimension=16, metric="cosine")
+    get_vector_store().upsert([("doc0#0", fake_embedding(text, 16).tolist(), {"file_id": "doc0", "chunk_index": 0})])
+    store = ChunkStore(str(tmp_path / "chunks.sqlite"))
+    store.put_many([{"id": "doc0#0", "text": text, "title": "doc0", "source": "doc0.txt", "chunk_index": 0}], "doc0")
+    monkeypatch.setattr(rag, "get_chunk_store", lambda: store)
+
+    matches = asyncio.run(rag.retrieve_async("How often does the sync run?"))
+    assert [m["metadata"]["text"] for m in matches] == [text]
+    assert matches[0]["metadata"]["title"] == "doc0"
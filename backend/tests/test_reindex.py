@@ -0,0 +1,108 @@
+import json
+import os
+
+import pytest
+from openai import OpenAI
+
+def _write_chunks(chunk_dir, file_id, texts, with_file_id=True):
+    with (chunk_dir / f"{file_id}.jsonl").open("w", encoding="utf-8") as f:
+        for i, text in enumerate(texts):
+            ch = {"id": f"{file_id}#{i}", "text": text, "title": file_id, "source": f"{file_id}.txt", "chunk_index": i}
+            if with_file_id:
+                ch["file_id"] = file_id
+            f.write(json.dumps(ch) + "\n")
+
+@pytest.fixture
+def reindex(tmp_path, monkeypatch, fake_openai):
+    """
+    The reindex CLI against the fake OpenAI and the local vector store, run
+    from tmp_path so every backend/data path lands there. Three Drive files
+    with two chunks each are processed and recorded as indexed.
+    """
+    from backend.app.utils import index_profile, reindex, state_store, vector_store
+
+    monkeypatch.chdir(tmp_path)
+    chunk_dir = tmp_path / "backend/data/processed/chunks"
+    chunk_dir.mkdir(parents=True)
+    monkeypatch.setattr(reindex, "CHUNK_DIR", chunk_dir)
+    monkeypatch.setattr(reindex, "AGGREGATE_FILE", chunk_dir / "all_chunks.jsonl")
+    for name, value in {
+        "VECTOR_STORE_BACKEND": "local",
+        "LOCAL_VECTOR_DIR": str(tmp_path / "vectors"),
+        "OPENAI_EMBED_MODEL": "text-embedding-3-small",
+        "EMBED_DIMENSIONS": 16,
+    }.items():
+        monkeypatch.setattr(reindex.settings, name, value)
+    index_profile.get_index_profile.cache_clear()
+    monkeypatch.setattr(reindex, "_oai", OpenAI(api_key="test", base_url=f"{fake_openai.url}/v1"))
+    monkeypatch.setattr(reindex, "get_embedding_store", lambda: None)
+    monkeypatch.setattr(reindex, "get_chunk_store", lambda: None)
+    monkeypatch.setattr(vector_store, "_stores", {})
+    monkeypatch.setattr(vector_store, "_pointer_cache", {"mtime": None, "pointer": None})
+    state_store._db.cache_clear()
+
+    for i in range(3):
+        file_id = f"doc{i}"
+        _write_chunks(chunk_dir, file_id, [f"Document {i} part {j} about the sync." for j in range(2)])
+        state_store.record_file(file_id, f"{file_id}.txt", "2024-01-01T00:00:00Z", "indexed", chunks=2)
+    yield reindex
+    index_profile.get_index_profile.cache_clear()
+    state_store._db.cache_clear()
+
+def _run(reindex, **kwargs):
+    return reindex.run_reindex(batch_size=1, verify_timeout=0, gc_delay=0, **kwargs)
+
+def test_reindex_switches_the_pointer_and_drops_the_old_generation(reindex, tmp_path):
+    from backend.app.utils.state_store import get_ingest_version, load_reindex_checkpoint
+    from backend.app.utils.vector_store import get_vector_store, live_pointer
+
+    first = _run(reindex)
+    assert first["target"] == str(tmp_path / "vectors-g1")
+    assert live_pointer()["target"] == first["target"]
+    assert get_vector_store().count() == 6
+
+    version = get_ingest_version()
+    second = _run(reindex)
+    assert (second["generation"], second["previous"]) == (2, first["target"])
+    assert live_pointer()["target"] == second["target"] and get_vector_store().count() == 6
+    assert not os.path.exists(first["target"])
+    assert get_ingest_version() == version + 1
+    assert load_reindex_checkpoint() is None
+
+def test_an_interrupted_reindex_resumes_from_its_checkpoint(reindex, monkeypatch):
+    from backend.app.utils.state_store import load_reindex_checkpoint
+    from backend.app.utils.vector_store import live_pointer
+
+    embedded = []
+    real = reindex.embed_texts
+
+    def failing_after_first_batch(client, model, texts, **kwargs):
+        if embedded:
+            raise RuntimeError("embeddings API went away")
+        embedded.append(list(texts))
+        return real(client, model, texts, **kwargs)
+
+    monkeypatch.setattr(reindex, "embed_texts", failing_after_first_batch)
+    with pytest.raises(RuntimeError, match="went away"):
+        _run(reindex)
+    cp = load_reindex_checkpoint()
+    assert list(cp["files"]) == [str(reindex.CHUNK_DIR / "doc0.jsonl")]
+    assert live_pointer()["generation"] == 0  # queries never saw the half-built index
+
+    def recording(client, model, texts, **kwargs):
+        embedded.append(list(texts))
+        return real(client, model, texts, **kwargs)
+
+    monkeypatch.setattr(reindex, "embed_texts", recording)
+    result = _run(reindex)
+    assert result["vectors"] == 6 and live_pointer()["target"] == cp["target"]
+    resumed = [t for batch in embedded[1:] for t in batch]
+    assert not any(t.startswith("Document 0") for t in resumed)
+
+def test_chunks_without_a_file_id_are_skipped(reindex):
+    from backend.app.utils.vector_store import get_vector_store
+
+    _write_chunks(reindex.CHUNK_DIR, "manual", ["Dropped in by hand."], with_file_id=False)
+    _run(reindex)
+    assert not any(vid.startswith("manual#") for vid in get_vector_store().list_ids())
+    assert get_vector_store().count() == 6
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+@pytest.fixture
+def client():
+    from backend.app.api.routes import router
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    return TestClient(app)
+
+def test_stream_errors_do_not_leak_upstream_text(client, monkeypatch, capsys):
+    from backend.app.api import routes
+
+    closed = []
+
+    async def failing(query):
+        try:
+            yield "matches", {"matches": []}
+            raise RuntimeError("upstream said: invalid key sk-live-123")
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(routes, "stream_rag_answer", failing)
+    body = client.post("/api/ask/stream", json={"text": "hi"}).text
+    assert "event: error" in body and "Could not answer this question." in body
+    assert "sk-live-123" not in body
+    assert "sk-live-123" in capsys.readouterr().out  # logged server-side
+    assert closed == [True]
+
+def test_batch_route_reports_items_in_order_and_counts_errors(client, monkeypatch):
+    from backend.app.api import routes
+
+    async def fake_batch(questions, concurrency=None):
+        return [
+            {"question": q, "answer": None if "bad" in q else q.upper(), "matches": [], "cached": False,
+             "error": "Could not answer this question." if "bad" in q else None, "timings": {}}
+            for q in questions
+        ]
+
+    monkeypatch.setattr(routes, "rag_answer_batch", fake_batch)
+    body = client.post("/api/ask/batch", json={"questions": ["one", "bad two", "three"]}).json()
+    assert [r["question"] for r in body["results"]] == ["one", "bad two", "three"]
+    assert [r["answer"] for r in body["results"]] == ["ONE", None, "THREE"]
+    assert body["errors"] == 1
+    assert client.post("/api/ask/batch", json={"questions": []}).status_code == 400
+
+def test_ask_returns_a_trace_only_when_asked(client, monkeypatch):
+    from backend.app.api import routes
+    from backend.app.utils.tracing import span
+
+    async def fake_answer(query):
+        with span("llm"):
+            return {"answer": "ok", "matches": []}
+
+    monkeypatch.setattr(routes, "rag_answer_async", fake_answer)
+    monkeypatch.setattr(routes.settings, "DEBUG_TRACE_ENABLED", True)
+    assert "trace" not in client.post("/api/ask", json={"text": "hi"}).json()
+
+    body = client.post("/api/ask", json={"text": "hi"}, headers={"X-Debug-Trace": "1"}).json()
+    assert body["answer"] == "ok"
+    assert [c["name"] for c in body["trace"]["spans"]["children"]] == ["llm"]
@@ -0,0 +1,83 @@
+import os
+import time
+
+from backend.app.utils.state_store import FileLock
+
+def test_leader_lock_is_exclusive_and_reports_the_holder(tmp_path):
+    path = str(tmp_path / "ingest.lock")
+    first, second = FileLock(path), FileLock(path)
+    assert first.try_acquire() and first.held
+    assert second.holder() == os.getpid()
+
+    t0 = time.monotonic()
+    assert not second.acquire(0.6)
+    assert time.monotonic() - t0 >= 0.5
+
+    first.release()
+    assert second.acquire(0.6) and second.held
+    second.release()
+
+def test_concurrent_legacy_imports_do_not_collide(tmp_path, monkeypatch):
+    import json
+    import sqlite3
+
+    from backend.app.utils import state_store
+
+    (tmp_path / "processed_files.json").write_text(json.dumps({"f1": "2024-01-01T00:00:00Z"}))
+    monkeypatch.setattr(state_store, "STATE_PATH", str(tmp_path / "processed_files.json"))
+    monkeypatch.setattr(state_store, "MANIFEST_DIR", str(tmp_path / "manifests"))
+
+    def connect():
+        db = sqlite3.connect(str(tmp_path / "state.sqlite"))
+        db.execute("CREATE TABLE IF NOT EXISTS files (file_id TEXT PRIMARY KEY, name TEXT, modified_time TEXT,"
+                   " status TEXT NOT NULL, content_hash TEXT, chunk_ids TEXT, chunks INTEGER, error TEXT,"
+                   " timings TEXT, updated_at REAL)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        return db
+
+    class _CheckedBeforeTheOtherWorker:
+        """A worker that ran its 'already imported?' check before the other one committed."""
+
+        def __init__(self, db):
+            self.db = db
+
+        def execute(self, sql, *args):
+            if sql.startswith("SELECT 1 FROM meta"):
+                return self.db.execute("SELECT 1 WHERE 0")
+            return self.db.execute(sql, *args)
+
+        def __getattr__(self, name):
+            return getattr(self.db, name)
+
+        def __enter__(self):
+            return self.db.__enter__()
+
+        def __exit__(self, *exc):
+            return self.db.__exit__(*exc)
+
+    first, second = connect(), connect()
+    state_store._import_legacy(first)
+    state_store._import_legacy(_CheckedBeforeTheOtherWorker(second))  # raised IntegrityError before
+    assert second.execute("SELECT file_id, status FROM files").fetchall() == [("f1", "indexed")]
+    assert second.execute("SELECT COUNT(*) FROM meta WHERE key = 'legacy_imported'").fetchone()[0] == 1
+
+def test_cli_can_take_the_write_lock_between_leader_syncs(tmp_path, monkeypatch):
+    from backend.app.services import ingest_worker
+
+    syncs = []
+    monkeypatch.setattr(ingest_worker, "process_new_drive_files", lambda on_progress=None: syncs.append(1) or {})
+    monkeypatch.setattr(ingest_worker, "save_ingest_status", lambda status: None)
+    worker = ingest_worker.IngestWorker(1, lock_path=str(tmp_path / "ingest.lock"),
+                                        write_lock_path=str(tmp_path / "ingest_write.lock"))
+
+    worker.tick()
+    assert syncs == [1] and worker.lock.held and not worker.write_lock.held
+
+    cli = FileLock(str(tmp_path / "ingest_write.lock"))  # e.g. reindex, between two polls
+    assert cli.acquire(0)
+    worker.tick()
+    assert syncs == [1]  # the leader skips its poll while the CLI writes
+    cli.release()
+
+    worker.tick()
+    assert syncs == [1, 1]
@@ -0,0 +1,50 @@
+import json
+import time
+
+from backend.app.utils import tracing
+from backend.app.utils.tracing import capture, span, store_trace, trace_options
+
+def test_spans_nest_under_the_captured_trace():
+    with capture("ask", question_chars=5) as trace:
+        with span("embed", chars=5) as sp:
+            sp.set(cached=False)
+        with span("query", top_k=3):
+            with span("hydrate"):
+                pass
+
+    spans = trace.to_dict()["spans"]
+    assert spans["name"] == "ask" and spans["attrs"] == {"question_chars": 5}
+    assert [c["name"] for c in spans["children"]] == ["embed", "query"]
+    assert spans["children"][0]["attrs"] == {"chars": 5, "cached": False}
+    assert spans["children"][1]["children"][0]["name"] == "hydrate"
+
+def test_span_outside_a_trace_records_nothing():
+    with span("embed") as sp:
+        sp.set(chars=5)
+    assert tracing._current.get() is None
+
+def test_trace_options_need_the_setting_and_the_header(monkeypatch):
+    settings = tracing.get_settings()
+    monkeypatch.setattr(settings, "DEBUG_TRACE_ENABLED", False)
+    assert trace_options("profile") is None
+
+    monkeypatch.setattr(settings, "DEBUG_TRACE_ENABLED", True)
+    assert trace_options(None) is None
+    assert trace_options("1") == tracing.TraceOptions(profile=False, store=False)
+    assert trace_options("Profile, store") == tracing.TraceOptions(profile=True, store=True)
+
+def test_profiled_trace_samples_this_thread_and_can_be_stored(tmp_path, monkeypatch):
+    settings = tracing.get_settings()
+    monkeypatch.setattr(settings, "TRACE_PROFILE_INTERVAL_MS", 1)
+    monkeypatch.setattr(settings, "TRACE_DIR", str(tmp_path / "traces"))
+
+    with capture("ask", profile=True) as trace:
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+
+    profile = trace.to_dict()["profile"]
+    assert profile["samples"] > 0
+    assert any("test_tracing.py:test_profiled_trace" in s["stack"] for s in profile["stacks"])
+    with open(store_trace(trace)) as f:
+        assert json.load(f)["id"] == trace.id
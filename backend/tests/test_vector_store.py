@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from backend.app.utils.vector_store import LocalVectorStore, VectorStore
+
+DIM = 16
+
+def _vectors(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((n, DIM)).astype(np.float32)
+
+def _fill(store, vecs, file_id="f1"):
+    store.upsert([(f"{file_id}#{i}", v.tolist(), {"file_id": file_id, "text": f"chunk {i}"}) for i, v in enumerate(vecs)])
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        VectorStore()
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_query_returns_nearest_first(tmp_path, dtype):
+    store = LocalVectorStore(str(tmp_path), dtype=dtype)
+    vecs = _vectors(50)
+    _fill(store, vecs)
+
+    for i in (0, 17, 49):
+        matches = store.query(vecs[i].tolist(), top_k=3)
+        assert matches[0]["id"] == f"f1#{i}"
+        assert matches[0]["score"] == pytest.approx(1.0, abs=0.02)
+        assert matches[0]["metadata"] == {"file_id": "f1", "text": f"chunk {i}"}
+        assert [m["score"] for m in matches] == sorted((m["score"] for m in matches), reverse=True)
+    assert store.count() == 50
+    assert store.describe() == {"dimension": DIM, "metric": "cosine", "dtype": dtype}
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_rows_survive_reopen(tmp_path, dtype):
+    vecs = _vectors(10)
+    _fill(LocalVectorStore(str(tmp_path), dtype=dtype), vecs)
+
+    reopened = LocalVectorStore(str(tmp_path), dtype="float32")  # the header's dtype wins
+    assert reopened.dtype == dtype
+    assert reopened.count() == 10
+    assert reopened.query(vecs[3].tolist(), top_k=1)[0]["id"] == "f1#3"
+
+def test_upsert_replaces_existing_id(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    a, b = _vectors(2)
+    store.upsert([("x", a.tolist(), {"v": 1})])
+    store.upsert([("x", b.tolist(), {"v": 2})])
+
+    assert store.count() == 1
+    match = store.query(b.tolist(), top_k=5)[0]
+    assert (match["id"], match["metadata"]) == ("x", {"v": 2})
+    assert match["score"] == pytest.approx(1.0, abs=1e-5)
+
+def test_query_without_metadata(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    vecs = _vectors(3)
+    _fill(store, vecs)
+    assert store.query(vecs[0].tolist(), top_k=1, include_metadata=False)[0]["metadata"] == {}
+
+def test_delete_and_delete_by_file(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store, _vectors(5, seed=1), file_id="a")
+    _fill(store, _vectors(4, seed=2), file_id="b")
+
+    store.delete(["a#0", "missing"])
+    assert store.count() == 8
+    store.delete_by_file("b")
+    assert store.count() == 4
+    assert {m["id"] for m in store.query(_vectors(1, seed=3)[0].tolist(), top_k=10)} == {"a#1", "a#2", "a#3", "a#4"}
+
+    # freed rows are reused rather than growing the matrix
+    capacity = store.capacity
+    _fill(store, _vectors(4, seed=4), file_id="c")
+    assert store.capacity == capacity and store.count() == 8
+
+def test_dimension_mismatch_is_rejected(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store, _vectors(2))
+    with pytest.raises(ValueError):
+        store.upsert([("y", [0.1] * (DIM + 1), {})])
+
+def test_int8_requires_cosine(tmp_path):
+    with pytest.raises(ValueError):
+        LocalVectorStore(str(tmp_path), dtype="int8", metric="dotproduct")
+
+def test_reset_and_drop(tmp_path):
+    store = LocalVectorStore(str(tmp_path / "idx"))
+    _fill(store, _vectors(3))
+    store.reset(dimension=8)
+    assert store.count() == 0
+    assert store.describe()["dimension"] == 8
+    store.drop()
+    assert store.describe() is None
+    assert not (tmp_path / "idx").exists()
+
+def test_list_fetch_and_update_metadata(tmp_path):
+    store = LocalVectorStore(str(tmp_path))
+    _fill(store, _vectors(3, seed=5), file_id="a")
+    store.upsert([("legacy-uuid", _vectors(1, seed=6)[0].tolist(), {"file_id": "a"})])
+
+    assert sorted(store.list_ids(prefix="a#")) == ["a#0", "a#1", "a#2"]
+    assert len(list(store.list_ids())) == 4
+    assert store.fetch_metadata(["a#1", "gone"]) == {"a#1": {"file_id": "a", "text": "chunk 1"}}
+
+    store.update_metadata({"a#1": {"chunk_index": 7}, "gone": {"chunk_index": 1}})
+    expected = {"file_id": "a", "text": "chunk 1", "chunk_index": 7}
+    assert store.fetch_metadata(["a#1"])["a#1"] == expected
+    assert LocalVectorStore(str(tmp_path)).fetch_metadata(["a#1"])["a#1"] == expected